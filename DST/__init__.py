@@ -34,10 +34,15 @@ from geom_dst import GeomDST
 from gsas_dst import GsasDST
 from mdw_dst import MdwDST
 from nexus_dst import NeXusDST
+from nexus_meta_dst import NeXusMetaDST
 from numinfo_dst import NumInfoDST
 from param_map import ParameterMap
 from rednxs_dst import RedNxsDST
+from run_catalog import RunCatalog
+from run_sum import sumRuns
+from som_cache import SomCache
 from spe_dst import SpeDST
+from tree_cache import TreeCache
 from par_dst import ParDST
 from phx_dst import PhxDST
 
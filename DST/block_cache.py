@@ -0,0 +1,301 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+class BlockCache(object):
+    """
+    This class holds the raw data blocks read from a file within a budget of
+    bytes. When a new block does not fit, the least recently used blocks are
+    thrown away first. A pinned block is never thrown away, so the budget can
+    be passed while blocks are pinned. A block that was thrown away has to be
+    read again by its user. The cache can be shared between threads.
+
+    @cvar DEFAULT_MAX_BYTES: The default budget in bytes
+    @type DEFAULT_MAX_BYTES: C{int}
+
+    @ivar __blocks: The blocks and their sizes in least to most recently used
+                    order
+    @type __blocks: C{collections.OrderedDict}
+
+    @ivar __pins: The number of pins held on each pinned block
+    @type __pins: C{dict}
+
+    @ivar __max_bytes: The budget in bytes or I{None} for no limit
+    @type __max_bytes: C{int}
+
+    @ivar __bytes: The number of bytes held
+    @type __bytes: C{int}
+
+    @ivar __stats: The number of hits, misses and evictions
+    @type __stats: C{dict}
+
+    @ivar __lock: Guards the cache against changes from several threads
+    @type __lock: C{threading.RLock}
+    """
+
+    DEFAULT_MAX_BYTES = 256 << 20
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Object constructor
+
+        @param max_bytes: (OPTIONAL) The budget in bytes. I{None} keeps every
+                          block. The default is L{DEFAULT_MAX_BYTES}.
+        @type max_bytes: C{int}
+
+
+        @raise ValueError: If the budget is negative
+        """
+        import collections
+        import threading
+
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("The block cache budget cannot be negative, not "
+                             "%d" % max_bytes)
+
+        self.__blocks = collections.OrderedDict()
+        self.__pins = {}
+        self.__max_bytes = max_bytes
+        self.__bytes = 0
+        self.__stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.__lock = threading.RLock()
+
+    def __contains__(self, key):
+        return key in self.__blocks
+
+    def __len__(self):
+        return len(self.__blocks)
+
+    def get(self, key):
+        """
+        This method returns a block and marks it as the most recently used.
+
+        @param key: The key of the block
+        @type key: C{object}
+
+
+        @return: The block or I{None} if it is not held
+        @rtype: C{object}
+        """
+        self.__lock.acquire()
+        try:
+            try:
+                (block, size) = self.__blocks.pop(key)
+            except KeyError:
+                self.__stats["misses"] += 1
+                return None
+
+            self.__blocks[key] = (block, size)
+            self.__stats["hits"] += 1
+            return block
+        finally:
+            self.__lock.release()
+
+    def put(self, key, block, size):
+        """
+        This method adds a block and throws away the least recently used
+        unpinned blocks until the budget is met. The new block itself is
+        kept until the next change to the cache, even if it is larger than
+        the whole budget, so it can be used right away.
+
+        @param key: The key of the block
+        @type key: C{object}
+
+        @param block: The block
+        @type block: C{object}
+
+        @param size: The size of the block in bytes
+        @type size: C{int}
+        """
+        self.__lock.acquire()
+        try:
+            self.remove(key)
+            self.__blocks[key] = (block, size)
+            self.__bytes += size
+            self.__evict(key)
+        finally:
+            self.__lock.release()
+
+    def remove(self, key):
+        """
+        This method throws away a block whether or not it is pinned.
+
+        @param key: The key of the block
+        @type key: C{object}
+        """
+        self.__lock.acquire()
+        try:
+            try:
+                (block, size) = self.__blocks.pop(key)
+            except KeyError:
+                return
+            self.__bytes -= size
+        finally:
+            self.__lock.release()
+
+    def clear(self):
+        """
+        This method throws away all of the blocks and pins. A later
+        L{unpin} of a pin that was thrown away is ignored.
+        """
+        self.__lock.acquire()
+        try:
+            self.__blocks.clear()
+            self.__pins.clear()
+            self.__bytes = 0
+        finally:
+            self.__lock.release()
+
+    def pin(self, key):
+        """
+        This method keeps a block from being thrown away until it is
+        unpinned. Pins are counted, so each pin needs its own L{unpin}. A key
+        can be pinned before its block is added.
+
+        @param key: The key of the block
+        @type key: C{object}
+        """
+        self.__lock.acquire()
+        try:
+            self.__pins[key] = self.__pins.get(key, 0) + 1
+        finally:
+            self.__lock.release()
+
+    def unpin(self, key):
+        """
+        This method removes a pin from a block. Once the last pin is removed
+        the block can be thrown away again. A block that is not pinned, for
+        instance after a L{clear}, is left alone.
+
+        @param key: The key of the block
+        @type key: C{object}
+        """
+        self.__lock.acquire()
+        try:
+            if key not in self.__pins:
+                return
+            count = self.__pins[key] - 1
+            if count > 0:
+                self.__pins[key] = count
+            else:
+                del self.__pins[key]
+                self.__evict()
+        finally:
+            self.__lock.release()
+
+    def isPinned(self, key):
+        """
+        This method tells if a block is pinned.
+
+        @param key: The key of the block
+        @type key: C{object}
+
+
+        @return: I{True} if the block is pinned, I{False} if not
+        @rtype: C{boolean}
+        """
+        return key in self.__pins
+
+    def getMaxBytes(self):
+        """
+        This method returns the budget of the cache.
+
+        @return: The budget in bytes or I{None} for no limit
+        @rtype: C{int}
+        """
+        return self.__max_bytes
+
+    def setMaxBytes(self, max_bytes):
+        """
+        This method changes the budget of the cache and throws away blocks
+        to meet it.
+
+        @param max_bytes: The budget in bytes. I{None} keeps every block.
+        @type max_bytes: C{int}
+
+
+        @raise ValueError: If the budget is negative
+        """
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("The block cache budget cannot be negative, not "
+                             "%d" % max_bytes)
+        self.__lock.acquire()
+        try:
+            self.__max_bytes = max_bytes
+            self.__evict()
+        finally:
+            self.__lock.release()
+
+    def getStats(self):
+        """
+        This method returns the usage of the cache.
+
+        @return: The number of I{hits}, I{misses} and I{evictions}, the
+                 number of I{blocks} and I{bytes} held and the number of
+                 I{pinned} blocks
+        @rtype: C{dict}
+        """
+        self.__lock.acquire()
+        try:
+            stats = dict(self.__stats)
+            stats["blocks"] = len(self.__blocks)
+            stats["bytes"] = self.__bytes
+            stats["pinned"] = len([key for key in self.__pins
+                                   if key in self.__blocks])
+            return stats
+        finally:
+            self.__lock.release()
+
+    def __evict(self, keep=None):
+        # Throws away unpinned blocks, oldest first, until the budget is met
+        if self.__max_bytes is None or self.__bytes <= self.__max_bytes:
+            return
+
+        for key in self.__blocks.keys():
+            if self.__bytes <= self.__max_bytes:
+                break
+            if key in self.__pins or key == keep:
+                continue
+            self.remove(key)
+            self.__stats["evictions"] += 1
+
+def get_size(block):
+    """
+    This function works out the number of bytes in a raw data block.
+
+    @param block: The block. It is either an array with I{nbytes}, a list of
+                  doubles or a C{tuple} of those. I{None} has no size.
+    @type block: C{numpy.ndarray}, C{nessi_list.NessiList} or C{tuple}
+
+
+    @return: The size in bytes
+    @rtype: C{int}
+    """
+    if block is None:
+        return 0
+    if isinstance(block, tuple):
+        return sum([get_size(item) for item in block])
+    try:
+        return int(block.nbytes)
+    except AttributeError:
+        return 8 * len(block)
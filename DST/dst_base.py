@@ -99,6 +99,7 @@ def getInstance(mime_type, resource, *args, **kwargs):
        - text/Spec
        - text/Dave2d
        - application/x-NeXus
+       - application/x-NeXusMeta
        - application/x-NxsGeom
        - application/x-RedNxs
        - text/rmd
@@ -138,6 +139,7 @@ def getInstance(mime_type, resource, *args, **kwargs):
     import gsas_dst
     import mdw_dst
     import nexus_dst
+    import nexus_meta_dst
     import numinfo_dst
     import rednxs_dst
     import spe_dst
@@ -147,6 +149,8 @@ def getInstance(mime_type, resource, *args, **kwargs):
     # do the factory stuff
     if mime_type == nexus_dst.NeXusDST.MIME_TYPE:
         return nexus_dst.NeXusDST(*my_args, **kwargs)
+    elif mime_type == nexus_meta_dst.NeXusMetaDST.MIME_TYPE:
+        return nexus_meta_dst.NeXusMetaDST(*my_args, **kwargs)
     elif mime_type == ascii3col_dst.Ascii3ColDST.MIME_TYPE:
         return ascii3col_dst.Ascii3ColDST(*my_args, **kwargs)
     elif mime_type == dave2d_dst.Dave2dDST.MIME_TYPE:
@@ -46,6 +46,141 @@ def make_ISO8601(now=None):
     else:
         return datetime.datetime(2006,1,1).now(Local).isoformat()
 
+def make_nessi_list(values, type="f"):
+    """
+    This function copies the values of an array into a C{NessiList}. The
+    list is made at its full length and filled through the C{numpy.ndarray}
+    view of its buffer, so the values do not pass through Python objects.
+
+    @param values: The values to copy
+    @type values: C{numpy.ndarray}
+
+    @param type: (OPTIONAL) The type of list to make: I{f} for floats or I{i}
+                 for integers. The default is I{f}.
+    @type type: C{string}
+
+
+    @return: The values as a flat list
+    @rtype: C{nessi_list.NessiList}
+    """
+    return make_nessi_lists(values.reshape(1, -1), type)[0]
+
+def make_nessi_lists(values, type="f"):
+    """
+    This function copies each row of a 2-D array into its own C{NessiList}.
+    The array is converted once for all of the rows, which are then copied
+    into lists made at their full length like in L{make_nessi_list}.
+
+    @param values: The rows to copy
+    @type values: C{numpy.ndarray}
+
+    @param type: (OPTIONAL) The type of lists to make: I{f} for floats or
+                 I{i} for integers. The default is I{f}.
+    @type type: C{string}
+
+
+    @return: One list for each row
+    @rtype: C{list} of C{nessi_list.NessiList}s
+    """
+    import nessi_list
+    import numpy
+
+    if type == "i":
+        (list_type, dtype) = ("int", int)
+    else:
+        (list_type, dtype) = ("double", float)
+    values = numpy.asarray(values)
+
+    result = []
+    if __has_buffer_view__(list_type):
+        values = numpy.asarray(values, dtype=dtype)
+        for row in values:
+            item = nessi_list.NessiList(len(row), type=list_type)
+            if len(row):
+                item.toNumPy()[:] = row
+            result.append(item)
+    else:
+        # NessiLists that copy their values in toNumPy are filled one item
+        # at a time
+        for row in values.astype(dtype).tolist():
+            item = nessi_list.NessiList(type=list_type)
+            item.extend(*row)
+            result.append(item)
+
+    return result
+
+__buffer_views__ = {}
+
+def __has_buffer_view__(list_type):
+    # Checks once per type of list whether writing to the array from toNumPy
+    # changes the list
+    if not __buffer_views__.has_key(list_type):
+        import nessi_list
+
+        probe = nessi_list.NessiList(1, type=list_type)
+        try:
+            probe.toNumPy()[0] = 1
+        except (AttributeError, TypeError, ValueError):
+            pass
+        __buffer_views__[list_type] = probe[0] == 1
+
+    return __buffer_views__[list_type]
+
+def make_bin_edges(start, stop, width, log=False):
+    """
+    This function creates the bin edges for histogramming from a range and a
+    bin width. The last bin is cut short at the end of the range if the
+    width does not fit evenly.
+
+    @param start: The lower edge of the first bin
+    @type start: C{float}
+
+    @param stop: The upper edge of the last bin
+    @type stop: C{float}
+
+    @param width: The width of the bins. For logarithmic bins this is the
+                  relative width M{dt/t}.
+    @type width: C{float}
+
+    @param log: (OPTIONAL) Flag for logarithmic bins. The default is
+                I{False}.
+    @type log: C{boolean}
+
+
+    @return: The bin edges
+    @rtype: C{numpy.ndarray}
+
+
+    @raise ValueError: The range or the width are not usable
+    """
+    import math
+    import numpy
+
+    if width <= 0:
+        raise ValueError("The bin width must be positive, not %s" % width)
+    if stop <= start:
+        raise ValueError("The end of the range (%s) must be past the start "
+                         "(%s)" % (stop, start))
+
+    if log:
+        if start <= 0:
+            raise ValueError("Logarithmic bins must start above zero, not "
+                             "%s" % start)
+        num_bins = math.log(float(stop) / start) / math.log1p(width)
+    else:
+        num_bins = (stop - start) / float(width)
+
+    # Rounding keeps an exact fit from gaining a sliver of a bin
+    num_bins = int(math.ceil(round(num_bins, 9)))
+    if log:
+        edges = start * (1.0 + width) ** numpy.arange(num_bins + 1)
+    else:
+        edges = start + width * numpy.arange(num_bins + 1, dtype=float)
+
+    edges[-1] = stop
+
+    return edges
+
 def make_magic_key():
     """
     This function creates a unique key for SNS created files.
@@ -25,6 +25,7 @@
 import dst_base
 import nexus_dst
 import nexus_file
+import nexus_tree
 import SOM
 
 class GeomDST(dst_base.DST_BASE):
@@ -42,7 +43,7 @@ class GeomDST(dst_base.DST_BASE):
 
     @ivar __tree: A list of key-value pairs from the file structure of the
                   NeXus geometry file.
-    @type __tree: C{dict}
+    @type __tree: L{nexus_tree.NeXusTree}
 
     @ivar __inst_info: Instrument geometry information
     @type __inst_info: C{dict} of C{NeXusInstrument}s
@@ -63,9 +64,16 @@ class GeomDST(dst_base.DST_BASE):
         @param args: Argument objects that the class accepts (UNUSED)
 
         @param kwargs: A list of keyword arguments that the class accepts:
+
+        @keyword backend: The library used to read the file: I{napi} for the
+                          NeXus API or I{hdf5} to read HDF5 based files
+                          directly. The default is I{napi}.
+        @type backend: C{string}
         """
-        self.__nexus = nexus_file.NeXusFile(resource)
-        self.__tree = self.__build_tree()
+        self.__nexus = nexus_file.NeXusFile(resource,
+                                            backend=kwargs.get("backend"))
+        self.__tree = nexus_tree.NeXusTree(self.__build_tree())
+        self.__nexus.prime(self.__tree)
 
         self.__inst_info = nexus_dst.NeXusInstrument(self.__nexus,
                                                      self.__tree,
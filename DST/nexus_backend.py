@@ -0,0 +1,456 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+"""
+This module contains the backends that L{nexus_file.NeXusFile} uses to talk
+to a file. A backend provides the calls of the NeXus API on an open file:
+group and data navigation, directory and attribute iteration and data
+access. The result types for reading data follow C{sns_napi}: I{f} gives a
+C{NessiList} of floats, I{i} a C{NessiList} of integers, I{p} Python values
+and I{n} a C{numpy.ndarray} of the native type.
+"""
+
+import dst_utils
+
+class NapiBackend(object):
+    """
+    This class reads and writes NeXus files through the NeXus API extension
+    C{sns_napi}. All of the NeXus file formats are supported.
+
+    @cvar RANDOM_ACCESS: Flag for opening a full path in one call
+    @type RANDOM_ACCESS: C{boolean}
+
+    @ivar __handle: The handle to the open file
+    @type __handle: C{PyCObject}
+    """
+
+    RANDOM_ACCESS = False
+
+    def __init__(self, filename, access=None):
+        """
+        Object constructor
+
+        @param filename: The name of the NeXus file
+        @type filename: C{string}
+
+        @param access: (OPTIONAL) The access mode. The default is read only.
+        @type access: C{int}
+
+
+        @raise SystemError: The file cannot be opened
+        """
+        import sns_napi
+
+        if access is None:
+            access = sns_napi.ACC_READ
+
+        self.__napi = sns_napi
+        self.__handle = sns_napi.open(filename, access)
+        if self.__handle is None:
+            raise SystemError("Failed to read file: %s" % filename)
+
+    def flush(self):
+        return self.__napi.flush(self.__handle)
+
+    def makegroup(self, name, type):
+        return self.__napi.makegroup(self.__handle, name, type)
+
+    def opengroup(self, name, type):
+        return self.__napi.opengroup(self.__handle, name, type)
+
+    def closegroup(self):
+        return self.__napi.closegroup(self.__handle)
+
+    def makedata(self, name, type, dims):
+        return self.__napi.makedata(self.__handle, name, type, dims)
+
+    def compmakedata(self, name, type, dims):
+        return self.__napi.compmakedata(self.__handle, name, type, dims)
+
+    def compress(self, compression):
+        return self.__napi.compress(self.__handle, compression)
+
+    def opendata(self, name):
+        return self.__napi.opendata(self.__handle, name)
+
+    def closedata(self):
+        return self.__napi.closedata(self.__handle)
+
+    def putdata(self, c_ptr):
+        return self.__napi.putdata(self.__handle, c_ptr)
+
+    def putslab(self, c_ptr, dims):
+        return self.__napi.putslab(self.__handle, c_ptr, dims)
+
+    def getdata(self, type="f"):
+        return self.__napi.getdata(self.__handle, type)
+
+    def getslab(self, start, size, type="f"):
+        return self.__napi.getslab(self.__handle, start, size, type)
+
+    def putattr(self, name, c_ptr, type):
+        return self.__napi.putattr(self.__handle, name, c_ptr, type)
+
+    def getdataID(self):
+        return self.__napi.getdataID(self.__handle)
+
+    def makelink(self, link):
+        return self.__napi.makelink(self.__handle, link)
+
+    def opensourcegroup(self):
+        return self.__napi.opensourcegroup(self.__handle)
+
+    def getinfo(self):
+        return self.__napi.getinfo(self.__handle)
+
+    def getnextentry(self):
+        return self.__napi.getnextentry(self.__handle)
+
+    def getnextattr(self):
+        return self.__napi.getnextattr(self.__handle)
+
+    def getattr(self, name):
+        return self.__napi.getattr(self.__handle, name)
+
+    def getgroupID(self):
+        return self.__napi.getgroupID(self.__handle)
+
+    def initgroupdir(self):
+        return self.__napi.initgroupdir(self.__handle)
+
+    def initattrdir(self):
+        return self.__napi.initattrdir(self.__handle)
+
+class Hdf5Backend(object):
+    """
+    This class reads HDF5 based NeXus files directly through C{h5py} without
+    the NeXus API. Any path can be opened in one call. Contiguous,
+    uncompressed data read as I{n} is given as a read-only memory map of the
+    file. Files can only be read.
+
+    @cvar RANDOM_ACCESS: Flag for opening a full path in one call
+    @type RANDOM_ACCESS: C{boolean}
+
+    @cvar TYPES: The NeXus type names keyed by the size and kind of the
+                 numbers in a dataset
+    @type TYPES: C{dict}
+
+    @ivar __filename: The name of the open file
+    @type __filename: C{string}
+
+    @ivar __file: The open file
+    @type __file: C{h5py.File}
+
+    @ivar __groups: The open groups starting with the root
+    @type __groups: C{list} of C{h5py.Group}s
+
+    @ivar __entries: The directory iterators for each open group
+    @type __entries: C{list}
+
+    @ivar __data: The open data or I{None}
+    @type __data: C{h5py.Dataset}
+
+    @ivar __attrs: The iterator over the attributes of the open node
+    @type __attrs: C{iterator}
+    """
+
+    RANDOM_ACCESS = True
+
+    TYPES = {"f4": "FLOAT32", "f8": "FLOAT64", "i1": "INT8", "u1": "UINT8",
+             "i2": "INT16", "u2": "UINT16", "i4": "INT32", "u4": "UINT32",
+             "i8": "INT64", "u8": "UINT64"}
+
+    def __init__(self, filename, access=None):
+        """
+        Object constructor
+
+        @param filename: The name of the NeXus file
+        @type filename: C{string}
+
+        @param access: (OPTIONAL) The access mode. Only read access is
+                       supported.
+        @type access: C{int}
+
+
+        @raise NotImplementedError: A mode other than read access is asked
+                                    for
+
+        @raise SystemError: The file cannot be opened
+        """
+        import h5py
+
+        # Same value as NXACC_READ
+        if access is not None and access != 1:
+            raise NotImplementedError("The HDF5 backend can only read files")
+
+        self.__filename = filename
+        try:
+            self.__file = h5py.File(filename, "r")
+        except IOError:
+            raise SystemError("Failed to read file: %s" % filename)
+        self.__groups = [self.__file]
+        self.__entries = [None]
+        self.__data = None
+        self.__attrs = None
+
+    # ----- navigation
+    def opengroup(self, name, type):
+        try:
+            group = self.__groups[-1][name]
+        except KeyError:
+            raise IOError("Failed to open group %s" % name)
+        self.__groups.append(group)
+        self.__entries.append(None)
+        self.__attrs = None
+
+    def closegroup(self):
+        self.__groups.pop()
+        self.__entries.pop()
+        self.__attrs = None
+
+    def opendata(self, name):
+        try:
+            self.__data = self.__groups[-1][name]
+        except KeyError:
+            raise IOError("Failed to open data %s" % name)
+        self.__attrs = None
+
+    def closedata(self):
+        self.__data = None
+        self.__attrs = None
+
+    def openpath(self, names, opendata=True):
+        """
+        This method opens a node from its full path in one step.
+
+        @param names: The names of the nodes along the path from the root
+        @type names: C{list} of C{string}s
+
+        @param opendata: (OPTIONAL) Flag for opening data at the end of the
+                         path. The default is I{True}.
+        @type opendata: C{boolean}
+
+
+        @return: I{True} if the path ends at data, I{False} if it ends at a
+                 group
+        @rtype: C{boolean}
+
+
+        @raise IOError: The path does not exist or ends at data when data is
+                        not to be opened
+        """
+        import h5py
+
+        groups = [self.__file]
+        data = None
+        for (i, name) in enumerate(names):
+            try:
+                node = groups[-1][name]
+            except KeyError:
+                raise IOError("Failed to find entry with name \"%s\"" % name)
+            if isinstance(node, h5py.Dataset):
+                if i != len(names) - 1 or not opendata:
+                    raise IOError("node %s not in %s" % (name,
+                                                         groups[-1].name))
+                data = node
+            else:
+                groups.append(node)
+
+        self.__groups = groups
+        self.__entries = [None] * len(groups)
+        self.__data = data
+        self.__attrs = None
+
+        return data is not None
+
+    # ----- directories
+    def initgroupdir(self):
+        self.__entries[-1] = iter(self.__groups[-1].keys())
+
+    def getnextentry(self):
+        import h5py
+
+        if self.__entries[-1] is None:
+            self.initgroupdir()
+
+        try:
+            name = self.__entries[-1].next()
+        except StopIteration:
+            self.__entries[-1] = None
+            return (None, None, -1)
+
+        node = self.__groups[-1].get(name)
+        if isinstance(node, h5py.Dataset):
+            return (str(name), "SDS", 0)
+        elif node is None:
+            # Dangling link
+            return (str(name), "", 0)
+        else:
+            return (str(name), str(node.attrs.get("NX_class", "")), 0)
+
+    def initattrdir(self):
+        names = [name for name in self.__get_node().attrs.keys()
+                 if name != "NX_class"]
+        self.__attrs = iter(names)
+
+    def getnextattr(self):
+        if self.__attrs is None:
+            self.initattrdir()
+
+        try:
+            name = self.__attrs.next()
+        except StopIteration:
+            self.__attrs = None
+            return (None, None)
+
+        return (str(name), self.__convert(self.__get_node().attrs[name], "p"))
+
+    def getattr(self, name):
+        try:
+            value = self.__get_node().attrs[name]
+        except KeyError:
+            raise RuntimeError("Could not find attribute")
+        return self.__convert(value, "p")
+
+    # ----- data
+    def getinfo(self):
+        dset = self.__data
+        if dset.dtype.kind in "SOU":
+            return ((len(self.__convert(dset[()], "p")),), "CHAR")
+
+        dims = dset.shape
+        if dims == ():
+            dims = (1,)
+        return (tuple(dims), self.TYPES.get(dset.dtype.str[1:]))
+
+    def getdata(self, type="f"):
+        if type == "n":
+            mapped = self.__map_data()
+            if mapped is not None:
+                return mapped
+        return self.__convert(self.__data[()], type)
+
+    def getslab(self, start, size, type="f"):
+        region = tuple([slice(first, first + length)
+                        for (first, length) in zip(start, size)])
+        if type == "n":
+            mapped = self.__map_data()
+            if mapped is not None:
+                return mapped[region]
+        return self.__convert(self.__data[region], type)
+
+    # ----- writing
+    def __read_only(self, *args):
+        raise NotImplementedError("The HDF5 backend can only read files")
+
+    flush = __read_only
+    makegroup = __read_only
+    makedata = __read_only
+    compmakedata = __read_only
+    compress = __read_only
+    putdata = __read_only
+    putslab = __read_only
+    putattr = __read_only
+    makelink = __read_only
+    getdataID = __read_only
+    getgroupID = __read_only
+    opensourcegroup = __read_only
+
+    # ----- helpers
+    def __get_node(self):
+        # The open data, or the open group if no data is open
+        if self.__data is not None:
+            return self.__data
+        return self.__groups[-1]
+
+    def __map_data(self):
+        # Contiguous, uncompressed numeric data is mapped from the file
+        import numpy
+
+        dset = self.__data
+        if dset.chunks is not None or dset.dtype.kind not in "fiu":
+            return None
+
+        offset = dset.id.get_offset()
+        if offset is None:
+            return None
+
+        shape = dset.shape
+        if shape == ():
+            shape = (1,)
+        return numpy.memmap(self.__filename, dtype=dset.dtype, mode="r",
+                            offset=offset, shape=shape)
+
+    def __convert(self, value, type):
+        # Gives values the same types as sns_napi
+        import numpy
+
+        if isinstance(value, basestring):
+            return str(value)
+
+        value = numpy.asarray(value)
+        if value.dtype.kind in "SOU":
+            return "".join([str(item) for item in value.ravel()])
+
+        if type == "n":
+            return numpy.atleast_1d(value)
+
+        if value.size == 0:
+            return None
+
+        if type == "p":
+            if value.size == 1:
+                return value.ravel()[0].item()
+            return value.ravel().tolist()
+
+        if type == "i" and value.dtype.kind == "f":
+            raise AttributeError("Will not convert float to int")
+
+        return dst_utils.make_nessi_list(value, type)
+
+BACKENDS = {"napi": NapiBackend, "hdf5": Hdf5Backend}
+
+def get_backend(name=None):
+    """
+    This function returns the backend class for a name.
+
+    @param name: (OPTIONAL) The name of the backend: I{napi} or I{hdf5}. The
+                 default is I{napi}.
+    @type name: C{string}
+
+
+    @return: The backend class
+    @rtype: C{class}
+
+
+    @raise ValueError: The name is not a known backend
+    """
+    if name is None:
+        name = "napi"
+
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError("Unknown NeXus backend %s. Choose from %s" \
+                         % (name, ", ".join(sorted(BACKENDS.keys()))))
@@ -23,43 +23,102 @@
 # $Id$
 
 import dst_base
+import block_cache
+import dst_utils
 import nexus_file
+import nexus_tree
 import param_map
+import pixel_filter
 import SOM
+import tree_cache
 
 class NeXusDST(dst_base.DST_BASE):
+    """
+    This class reads spectra, geometry and run information from NeXus files.
+
+    Several threads can read from one object at once, for example different
+    pixels or data groups. Each thread reads through its own handle to the
+    file from a L{nexus_file.NeXusFilePool} and picks its independent axis
+    on its own. Neither L{refresh} nor L{set_data} may overlap any other
+    read.
+    """
     MIME_TYPE = "application/x-NeXus"
 
     ########## DST_BASE function
     def __init__(self, resource, data_group_path=None, signal=1,
                  so_axis="time_of_flight", *args, **kwargs):
+        """
+        Object constructor
+
+        @param resource: The name of the NeXus file to read
+        @type resource: C{string}
+
+        @param data_group_path: (UNUSED)
+
+        @param signal: (UNUSED)
+
+        @param so_axis: The name of the independent axis for the spectra
+        @type so_axis: C{string}
+
+        @param args: Argument objects that the class accepts (UNUSED)
+
+        @param kwargs: A list of keyword arguments that the class accepts:
+
+        @keyword tree_cache: Reuse the directory tree of the file from an
+                             on-disk cache instead of walking the file. A
+                             value of I{True} uses the default cache directory
+                             (see L{TreeCache}), a C{string} is taken as the
+                             cache directory. The default is I{False}.
+        @type tree_cache: C{boolean} or C{string}
+
+        @keyword prefetch: Read the attributes and dimensions of every SDS
+                           while walking the file so that they do not need to
+                           be read again later. The default is I{False}.
+        @type prefetch: C{boolean}
+
+        @keyword backend: The library used to read the file: I{napi} for the
+                          NeXus API or I{hdf5} to read HDF5 based files
+                          directly. The default is I{napi}.
+        @type backend: C{string}
+
+        @keyword block_cache_size: The number of bytes of raw data blocks
+                                   kept in memory across all data groups. A
+                                   value of I{None} keeps every block. The
+                                   default is
+                                   L{block_cache.BlockCache.DEFAULT_MAX_BYTES}.
+        @type block_cache_size: C{int}
+        """
+        import threading
 
         # allocate places for everything
-        self.__nexus = nexus_file.NeXusFile(resource)
-        self.__tree = self.__build_tree2()
+        self.__nexus = nexus_file.NeXusFilePool(resource,
+                                                backend=kwargs.get("backend"))
+        self.__lock = threading.RLock()
+        self.__stamp = self.__get_stamp()
+        self.__layouts = {}
+        self.__tree_cache = kwargs.get("tree_cache", False)
+        self.__tree = self.__load_tree(self.__tree_cache,
+                                       kwargs.get("prefetch", False))
+        self.__nexus.prime(self.__tree)
         self.__data_group = []
         self.__data_signal = []
         self.__so_axis = None
+        self.__data_types = {}
         self.__avail_data = {}
         self.__inst_info = None
+        self.__sns_info = None
+        self.__sample_info = None
         self.__extra_params = param_map.ParameterMap()
+        self.__blocks = block_cache.BlockCache(
+            kwargs.get("block_cache_size",
+                       block_cache.BlockCache.DEFAULT_MAX_BYTES))
 
-        # create the data list
-        som_ids = self.__generate_SOM_ids()
-        for (location, signal) in som_ids:
-            data = NeXusData(self.__nexus,self.__tree, location, signal)
-            self.__avail_data[(location, signal)] = data
-
-        self.__inst_info = NeXusInstrument(self.__nexus, self.__tree)
-        self.__sns_info = SnsInformation(self.__nexus, self.__tree,
-                                         self.__inst_info.getName())
-        self.__sample_info = SampleInformation(self.__nexus, self.__tree,
-                                               self.__inst_info.getName())
+        # create the data list, the data objects are made on first use
+        event_ids = self.__list_data_types()
 
         # set the data group to be all NXdata
         if data_group_path is None:
-            nxdata_ids = self.__generate_SOM_ids(type="NXdata")
-            for (location, signal) in nxdata_ids:
+            for (location, signal) in self.__list_default_groups(event_ids):
                 self.__data_group.append(location)
                 self.__data_signal.append(signal)
 
@@ -77,78 +136,482 @@ class NeXusDST(dst_base.DST_BASE):
         @returns: The instrument geometry information for the detector
         @rtype: C{SOM.Instrument}
         """
-        return self.__inst_info.getInstrument(SOM_id)
+        with self.__nexus.handle():
+            return self.__get_inst_info().getInstrument(SOM_id)
+
+    def refresh(self, som=None, som_id=None, so_axis=None, **kwds):
+        """
+        This method catches up with changes made to the file since it was
+        opened or last refreshed, like a file that is still being written.
+        The file is only read again if its modification time or size
+        changed. Then it is opened again and its directory tree
+        is read with the SDS dimensions and attributes. The tree is compared
+        group by group with the one in use:
+
+          - Data groups that were added, removed or whose SDS dimensions or
+            attributes changed are made again on first use. The others keep
+            their axes.
+          - The geometry of detector, monitor and moderator groups that
+            changed is read again the next time it is asked for.
+          - The run and sample information is read again.
+          - All raw data blocks are thrown away, because counts can change
+            without the dimensions changing.
+
+        Groups are only compared precisely when the tree in use has the SDS
+        information, so open the file with I{prefetch} to avoid a full
+        reread on the first refresh.
+
+        If a C{SOM} is given, it is updated in place so references to it stay
+        valid. Nothing is read if it is already up to date with the file.
+        Otherwise the counts and axes of its data groups are read as blocks
+        and compared with its spectra. Only the spectra of the data groups
+        that differ are made again and replace the old ones, the others are
+        kept as they are. The metadata is always taken from the new file
+        state. A L{SOM.LazySOM} throws away its created spectra and creates
+        them from the new file state. The arguments must be the same as the
+        ones the dataset was first read with.
+
+        @param som: (OPTIONAL) A dataset read from this DST to update in
+                    place
+        @type som: L{SOM.SOM} or L{SOM.LazySOM}
+
+        @param som_id: (OPTIONAL) The data group(s) the dataset was read from
+        @type som_id: C{tuple} or C{list} of C{tuple}s
+
+        @param so_axis: (OPTIONAL) The independent axis the dataset was read
+                        with
+        @type so_axis: C{string}
+
+        @param kwds: The keywords the dataset was read with, see L{getSOM}
+
+
+        @return: The data groups that were added, removed or changed layout.
+                 The list is empty if the file did not change since the last
+                 refresh.
+        @rtype: C{list} of C{tuple}s
+        """
+        stamp = self.__get_stamp()
+        with self.__nexus.handle():
+            if stamp == self.__stamp:
+                changed = []
+            else:
+                changed = self.__reload(stamp)
+
+            if som is not None and self.__get_layout(som)[0] != self.__stamp:
+                self.__update_SOM(som, som_id, so_axis, **kwds)
+
+        return changed
+
+    def __update_SOM(self, som, som_id, so_axis, **kwds):
+        # Brings a dataset from __read_SOM up to date with the file. The data
+        # groups are read again as blocks, or lazily for a lazy SOM, and only
+        # the groups whose spectra differ from the blocks are replaced.
+        lazy = isinstance(som, SOM.LazySOM)
+        probe_kwds = dict(kwds)
+        if not lazy:
+            probe_kwds["columnar"] = True
+        probe = self.__read_SOM(som_id, so_axis, **probe_kwds)
+
+        som.setTitle(probe.getTitle())
+        som.setDataSetType(probe.getDataSetType())
+        som.setAllAxisLabels(probe.getAllAxisLabels())
+        som.setAllAxisUnits(probe.getAllAxisUnits())
+        som.setYLabel(probe.getYLabel())
+        som.setYUnits(probe.getYUnits())
+        som.attr_list = probe.attr_list
+
+        (stamp, new_groups) = self.__get_layout(probe)
+        if lazy:
+            # Creating the spectra again is cheap, nothing has been read yet
+            som.replaceLazy(probe)
+            self.__keep_layout(som, new_groups)
+            return
+
+        (stamp, old_groups) = self.__get_layout(som)
+        old_runs = {}
+        if old_groups is not None:
+            start = 0
+            for (group, count) in old_groups:
+                old_runs[group] = (start, start + count)
+                start += count
+        old_blocks = __get_block_starts__(som)
+        new_blocks = __get_block_starts__(probe)
+
+        # The spectra and blocks of each data group, None to keep the spectra
+        parts = []
+        start = 0
+        for (index, (group, count)) in enumerate(new_groups):
+            block = new_blocks.get(start)
+            (old_start, old_stop) = old_runs.get(group, (0, 0))
+            if group in old_runs and block is not None and \
+                   __same_spectra__(som[old_start:old_stop], block):
+                old_block = old_blocks.get(old_start)
+                if old_block is not None and len(old_block) == count:
+                    parts.append((group, None, [old_block]))
+                else:
+                    parts.append((group, None, []))
+            elif kwds.get("columnar", False):
+                parts.append((group, probe[start:start + count],
+                              [block]))
+            else:
+                group_som = self.__read_SOM(group, so_axis,
+                                            **__get_group_kwds__(kwds, index,
+                                                                 new_groups))
+                parts.append((group, list(group_som), []))
+            start += count
+
+        if old_groups is not None and \
+               [group for (group, count) in old_groups] == \
+               [group for (group, count, blocks) in parts]:
+            # Replaced from the back so the positions of the others hold
+            for (group, spectra, blocks) in reversed(parts):
+                if spectra is not None:
+                    (old_start, old_stop) = old_runs[group]
+                    som[old_start:old_stop] = spectra
+        else:
+            spectra = []
+            for (group, group_spectra, blocks) in parts:
+                if group_spectra is None:
+                    (old_start, old_stop) = old_runs[group]
+                    group_spectra = som[old_start:old_stop]
+                spectra.extend(group_spectra)
+            som[:] = spectra
+
+        som.__blocks__ = []
+        for (group, spectra, blocks) in parts:
+            som.__blocks__.extend(blocks)
+
+        self.__keep_layout(som, new_groups)
+
+    def __keep_layout(self, som, groups):
+        # Remembers the file state a dataset was read at and its data groups
+        # with their number of spectra, for refresh
+        import weakref
+
+        self.__lock.acquire()
+        try:
+            for (key, (ref, stamp, old_groups)) in self.__layouts.items():
+                if ref() is None:
+                    del self.__layouts[key]
+            self.__layouts[id(som)] = (weakref.ref(som), self.__stamp,
+                                       groups)
+        finally:
+            self.__lock.release()
+
+    def __get_layout(self, som):
+        # The file state and data groups of a dataset read by this object,
+        # (None, None) if it was not or spectra were added or removed since
+        self.__lock.acquire()
+        try:
+            (ref, stamp, groups) = self.__layouts.get(id(som),
+                                                      (None, None, None))
+        finally:
+            self.__lock.release()
+
+        if ref is None or ref() is not som or \
+               sum([count for (group, count) in groups]) != len(som):
+            return (None, None)
+        return (stamp, groups)
+
+    def __reload(self, stamp):
+        # Opens the file again and keeps what did not change, returns the
+        # data groups that changed
+        old_tree = self.__tree
+        old_types = self.__data_types
+        old_defaults = self.__list_default_groups()
+
+        self.__nexus.reopen()
+        self.__stamp = stamp
+        self.__tree = self.__load_tree(self.__tree_cache, True)
+        self.__nexus.prime(self.__tree)
+        self.__blocks.clear()
+
+        # keep the data objects of the groups that did not change
+        self.__data_types = {}
+        event_ids = self.__list_data_types()
+        changed = []
+        for som_id in old_types.keys() + self.__data_types.keys():
+            if som_id in changed:
+                continue
+            if old_types.get(som_id) != self.__data_types.get(som_id) or \
+                   __get_signature__(old_tree, som_id[0]) != \
+                   __get_signature__(self.__tree, som_id[0]):
+                changed.append(som_id)
+                self.__avail_data.pop(som_id, None)
+        changed.sort()
+
+        # keep the data groups that were asked for if they are still there
+        groups = self.__create_loc_sig_list()
+        if groups == old_defaults:
+            groups = self.__list_default_groups(event_ids)
+        self.__data_group = []
+        self.__data_signal = []
+        for (location, signal) in groups:
+            if self.__data_types.has_key((location, signal)):
+                self.__data_group.append(location)
+                self.__data_signal.append(signal)
+
+        if self.__inst_info is not None:
+            locations = []
+            for nxclass in ("NXdetector", "NXmonitor", "NXmoderator"):
+                for location in old_tree.list_type(nxclass) + \
+                        self.__tree.list_type(nxclass):
+                    if __get_signature__(old_tree, location) != \
+                           __get_signature__(self.__tree, location):
+                        locations.append(location)
+            self.__inst_info.reset(self.__tree, locations)
+        self.__sns_info = None
+        self.__sample_info = None
+
+        return changed
+
+    def __get_stamp(self):
+        # The modification time and size of the file
+        import os
+        stat = os.stat(self.__nexus.filename())
+        return (stat.st_mtime, stat.st_size)
+
+    def __get_data(self, som_id):
+        # Makes the data object of a data group the first time it is used,
+        # raises KeyError for an unknown data group
+        try:
+            return self.__avail_data[som_id]
+        except KeyError:
+            pass
+
+        self.__lock.acquire()
+        try:
+            if self.__avail_data.has_key(som_id):
+                return self.__avail_data[som_id]
+            data_type = self.__data_types[som_id]
+            if data_type is NeXusEventData:
+                data = NeXusEventData(self.__nexus, self.__tree, som_id[0])
+            else:
+                data = NeXusData(self.__nexus, self.__tree, som_id[0],
+                                 som_id[1], blocks=self.__blocks)
+            self.__avail_data[som_id] = data
+            return data
+        finally:
+            self.__lock.release()
+
+    def __get_inst_info(self):
+        # Makes the instrument geometry reader on first use
+        self.__lock.acquire()
+        try:
+            if self.__inst_info is None:
+                self.__inst_info = NeXusInstrument(self.__nexus, self.__tree)
+            return self.__inst_info
+        finally:
+            self.__lock.release()
+
+    def __get_sns_info(self):
+        # Makes the run information reader on first use
+        self.__lock.acquire()
+        try:
+            if self.__sns_info is None:
+                inst_name = self.__get_inst_info().getName()
+                self.__sns_info = SnsInformation(self.__nexus, self.__tree,
+                                                 inst_name)
+            return self.__sns_info
+        finally:
+            self.__lock.release()
+
+    def __get_sample_info(self):
+        # Makes the sample information reader on first use
+        self.__lock.acquire()
+        try:
+            if self.__sample_info is None:
+                inst_name = self.__get_inst_info().getName()
+                self.__sample_info = SampleInformation(self.__nexus,
+                                                       self.__tree, inst_name)
+            return self.__sample_info
+        finally:
+            self.__lock.release()
 
     def getResource(self):
         """
         This method returns the resource handle.
 
-        @return: The current resource handle.
-        @rtype: L{DST.NeXusFile}
+        @return: The current resource handle. It passes each call to the
+                 handle of the calling thread.
+        @rtype: L{nexus_file.NeXusFilePool}
         """
         return self.__nexus
 
     def getParameter(self, name):
-        entry_locations = self.list_type("NXentry")
+        return self.getParameters([name])[name]
 
-        (tag, type) = self.__extra_params.getPathAndType(name)
+    def getParameters(self, names):
+        """
+        This method reads several parameters of the L{getParameterMap} from
+        the first C{NXentry} in one pass through the file.
 
-        path = entry_locations[0] + "/" + tag
+        @param names: The names of the parameters
+        @type names: C{list} of C{string}s
 
-        try:
-            self.__nexus.openpath(path)
-        except IOError:
-            return None
 
-        try:
-            units = self.__nexus.getattr("units", "s")
-        except RuntimeError:
-            units = None
+        @return: The value and units of each parameter keyed by name, I{None}
+                 for a parameter that is not in the file
+        @rtype: C{dict}
 
-        if type == "float":
-            return (float(self.__nexus.getdata()[0]), units)
-        elif type == "int":
-            return (int(self.__nexus.getdata()[0]), units)
-        elif type == "string":
-            return (str(self.__nexus.getdata()[0]), units)
-        else:
-            raise RuntimeError("Do not understand type %s" % type)
+
+        @raise KeyError: A name is not in the parameter map
+        """
+        entry_locations = self.list_type("NXentry")
+        with self.__nexus.handle():
+            return read_parameters(self.__nexus, self.__extra_params,
+                                   entry_locations[0], names)
+
+    def getParameterMap(self):
+        """
+        This method returns the mapping used by L{getParameters}. More
+        parameters can be added to it.
+
+        @return: The parameter map
+        @rtype: L{param_map.ParameterMap}
+        """
+        return self.__extra_params
 
     def get_SO_ids(self, SOM_id=None, so_axis=None):
         id_list = []
-        if(SOM_id is not None):
-            data = self.__avail_data[SOM_id]
-            id_list = data.get_ids()
-        else:
-            som_id_list = self.__create_loc_sig_list()
-            for som_id in som_id_list:
-                data = self.__avail_data[som_id]
-                id_list.extend(data.get_ids())
+        with self.__nexus.handle():
+            if(SOM_id is not None):
+                data = self.__get_data(SOM_id)
+                id_list = data.get_ids()
+            else:
+                som_id_list = self.__create_loc_sig_list()
+                for som_id in som_id_list:
+                    data = self.__get_data(som_id)
+                    id_list.extend(data.get_ids())
 
         return id_list
 
     def get_SOM_ids(self):
-        return self.__avail_data.keys()
+        return self.__data_types.keys()
+
+    def get_data_groups(self):
+        """
+        This method returns the data groups that L{getSOM} reads when no
+        group is requested.
+
+        @return: The NeXus paths and signals of the data groups
+        @rtype: C{list} of C{tuple}s
+        """
+        return self.__create_loc_sig_list()
 
     def getSO(self, som_id, so_id, so_axis=None):
-        if so_axis is None:
-            return self.__avail_data[som_id].get_so(so_id)
+        with self.__nexus.handle():
+            if so_axis is None:
+                return self.__get_data(som_id).get_so(so_id)
 
-        data = self.__avail_data[som_id]
-        orig_axis = data.variable
+            data = self.__get_data(som_id)
+            orig_axis = data.variable
 
-        if orig_axis.label == so_axis or orig_axis.location == so_axis:
-            return data.get_so(so_id)
-        data.set_so_axis(so_axis)
-        result = data.get_so(so_id)
-        data.set_so_axis(orig_axis.label)
-        return result
+            if orig_axis.label == so_axis or orig_axis.location == so_axis:
+                return data.get_so(so_id)
+            data.set_so_axis(so_axis)
+            result = data.get_so(so_id)
+            data.set_so_axis(orig_axis.label)
+            return result
 
     def getSOM(self, som_id=None, so_axis=None, **kwds):
-        """Available keywords are start_id,end_id which provide a way
-        to carve out the data to retrieve"""
+        """
+        This method retrieves the data for the requested NeXus data groups.
+
+        @param som_id: The NeXus data group(s) to retrieve. If not provided,
+                       all NXdata groups are retrieved.
+        @type som_id: C{tuple} or C{list} of C{tuple}s
+
+        @param so_axis: The name of the independent axis for the spectra. The
+                        default is I{time_of_flight}.
+        @type so_axis: C{string}
+
+        @param kwds: A list of keyword arguments that the method accepts:
+
+        @keyword start_id: The starting pixel ID to carve out of the data
+        @type start_id: C{tuple} or C{list} of C{tuple}s
+
+        @keyword end_id: The ending pixel ID to carve out of the data
+        @type end_id: C{tuple} or C{list} of C{tuple}s
+
+        @keyword mask_file: The name of a file containing pixel IDs to remove
+        @type mask_file: C{string}
+
+        @keyword roi_file: The name of a file containing the pixel IDs to
+                           keep
+        @type roi_file: C{string}
+
+        @keyword tof_offset: An offset to add to the independent axis
+        @type tof_offset: C{float}
+
+        @keyword columnar: A flag that stores each data group as one
+                           contiguous L{SOM.SOBlock} with the L{SOM.SO}s as
+                           row views. The default is I{False}.
+        @type columnar: C{boolean}
+
+        @keyword lazy: A flag that returns a L{SOM.LazySOM}. The spectra are
+                       read from the file the first time they are accessed.
+                       The DST must not be released while the returned
+                       object is in use. The default is I{False}.
+        @type lazy: C{boolean}
+
+        @keyword cache_size: The maximum number of spectra that a lazy
+                             C{SOM} keeps in memory
+        @type cache_size: C{int}
+
+        @keyword workers: The number of processes that read the data groups
+                          in parallel. Each process opens its own handle to
+                          the file. The data is stored as for I{columnar}. It
+                          is not used for a lazy C{SOM}.
+        @type workers: C{int}
+
+        @keyword bin_edges: The time-of-flight bin edges for histogramming
+                            event data
+        @type bin_edges: C{list} or C{numpy.ndarray}
+
+        @keyword bin_params: The start, stop and width of the time-of-flight
+                             bins for histogramming event data when
+                             I{bin_edges} is not given
+        @type bin_params: C{tuple}
+
+        @keyword log_bins: A flag that makes the width in I{bin_params} the
+                           relative width M{dt/t}. The default is I{False}.
+        @type log_bins: C{boolean}
+
+        @keyword pulse_window: Only histogram the events from pulses with a
+                               time in [start, stop). The times are in the
+                               units of I{event_time_zero}.
+        @type pulse_window: C{tuple}
+
+        @keyword pulses_per_chunk: The number of pulses of event data read at
+                                   a time. See
+                                   L{NeXusEventData.DEFAULT_PULSES_PER_CHUNK}.
+        @type pulses_per_chunk: C{int}
+
+        @keyword geometry: A flag that reads the instrument geometry and the
+                           run information for the C{SOM}. Turning it off
+                           leaves them unset. The default is I{True}.
+        @type geometry: C{boolean}
+
+
+        @return: The requested data
+        @rtype: L{SOM.SOM} or L{SOM.LazySOM}
+        """
+        with self.__nexus.handle():
+            return self.__read_SOM(som_id, so_axis, **kwds)
 
+    def __read_SOM(self, som_id, so_axis, **kwds):
+        # Reads the data groups for getSOM with the handle of the thread
         tof_offset = kwds.get("tof_offset")
+        columnar = kwds.get("columnar", False)
+        lazy = kwds.get("lazy", False)
+        workers = kwds.get("workers")
+        geometry = kwds.get("geometry", True)
+
+        if workers is not None and workers > 1 and not lazy:
+            pending = []
+        else:
+            pending = None
 
         # Get the entry point
         if som_id is not None:
@@ -198,31 +661,15 @@ class NeXusDST(dst_base.DST_BASE):
         else:
             id_list = self.__create_loc_sig_list()
 
-        result = SOM.SOM()
-        result.attr_list["filename"] = self.__nexus.filename()
-        result.attr_list["instrument_name"] = self.__inst_info.getName()
-        result.attr_list["beamline"] = self.__inst_info.getBeamline()
-        if mask_file is not None:
-            result.attr_list["mask_file"] = mask_file
-        else:
-            pass
-
-        if roi_file is not None:
-            result.attr_list["roi_file"] = roi_file
+        if lazy:
+            result = SOM.LazySOM(kwds.get("cache_size",
+                                          SOM.LazySOM.DEFAULT_CACHE_SIZE))
         else:
-            pass
-
-        entry_locations = self.list_type("NXentry")
-        path = entry_locations[0] + "/title"
-        try:
-            result.setTitle(self.__get_val_as_str(path))
-        except IOError:
-            result.setTitle("")
+            result = SOM.SOM()
+        self.__start_SOM(result, mask_file, roi_file)
 
         inst_keys = []
 
-        result.attr_list.sample = self.__sample_info.getSample()
-
         # If there is only one ID in the list, expect that starting and
         # ending ids are a single tuple each
         if len(id_list) == 1:
@@ -230,17 +677,28 @@ class NeXusDST(dst_base.DST_BASE):
         else:
             len_id_1 = False
         
+        groups = []
         count = 0
         for id in id_list:
-            bank_id = id[0].split('/')[-1]
+            data = self.__get_data(id)
+            if isinstance(data, NeXusEventData):
+                # the geometry is kept under the name of the bank
+                bank_id = data.bank
+                inst_path = "/".join(id[0].split('/')[:2] + [bank_id])
+            else:
+                bank_id = id[0].split('/')[-1]
+                inst_path = id[0]
             inst_keys.append(bank_id)
-            try:
-                inst_keys.append(self.__inst_info.getInstrument(id[0]))
-            except IOError:
-                # Geometry information doesn't exist
+            if not geometry:
                 inst_keys.append(None)
+            else:
+                inst_info = self.__get_inst_info()
+                try:
+                    inst_keys.append(inst_info.getInstrument(inst_path))
+                except IOError:
+                    # Geometry information doesn't exist
+                    inst_keys.append(None)
 
-            data = self.__avail_data[id]
             # Construct keywords if necessary
             kwargs = {}
             if start_id is not None:
@@ -270,20 +728,160 @@ class NeXusDST(dst_base.DST_BASE):
                 pass
 
             kwargs["tof_offset"] = tof_offset
-
-            self.__construct_SOM(result, data, so_axis, bank_id, **kwargs)
+            kwargs["columnar"] = columnar
+            kwargs["lazy"] = lazy
+            for key in ("bin_edges", "bin_params", "log_bins",
+                        "pulse_window", "pulses_per_chunk"):
+                if kwds.has_key(key):
+                    kwargs[key] = kwds[key]
+
+            groups.append((id, self.__construct_SOM(result, data, so_axis,
+                                                    bank_id, pending,
+                                                    **kwargs)))
             count += 1
 
+        if pending:
+            self.__read_parallel(result, pending, workers)
+
+        if geometry:
+            self.__finish_SOM(result, inst_keys, entry_pt)
+
+        self.__keep_layout(result, groups)
+        return result
+
+    def iterSOM(self, som_id, pixels_per_chunk=1024, so_axis=None, **kwds):
+        """
+        This method reads the data for a single NeXus data group in chunks of
+        consecutive pixels. Each chunk is read with a hyperslab, so the memory
+        needed is set by the chunk size and not by the size of the data group.
+        All of the chunks carry the same metadata, instrument and independent
+        axis.
+
+        @param som_id: The NeXus path and signal of the data group
+        @type som_id: C{tuple}
+
+        @param pixels_per_chunk: (OPTIONAL) The maximum number of pixels in
+                                 each chunk. The default is I{1024}.
+        @type pixels_per_chunk: C{int}
+
+        @param so_axis: (OPTIONAL) The name of the independent axis. The
+                        default is I{time_of_flight}.
+        @type so_axis: C{string}
+
+        @param kwds: A list of keyword arguments that the method accepts:
+
+        @keyword start_id: The starting pixel ID to carve out of the data
+        @type start_id: C{tuple}
+
+        @keyword end_id: The ending pixel ID to carve out of the data
+        @type end_id: C{tuple}
+
+        @keyword mask_file: The name of a file containing pixel IDs to remove
+        @type mask_file: C{string}
+
+        @keyword roi_file: The name of a file containing the pixel IDs to
+                           keep
+        @type roi_file: C{string}
+
+        @keyword tof_offset: An offset to add to the independent axis
+        @type tof_offset: C{float}
+
+
+        @return: The requested data, one chunk at a time
+        @rtype: generator of L{SOM.SOM}s
+
+        @raise ValueError: The chunk size is not positive
+
+        @raise RuntimeError: The data group holds events
+        """
+        if isinstance(self.__get_data(som_id), NeXusEventData):
+            raise RuntimeError("Event data in %s cannot be read in chunks of "
+                               "pixels" % som_id[0])
+        if pixels_per_chunk < 1:
+            raise ValueError("The number of pixels per chunk must be "
+                             "positive, not %d" % pixels_per_chunk)
+
+        if so_axis is None:
+            so_axis = "time_of_flight"
+
+        entry_pt = som_id[0].split('/')[1]
+        bank_id = som_id[0].split('/')[-1]
+        data = self.__get_data(som_id)
+        tof_offset = kwds.get("tof_offset")
+
+        template = SOM.SOM()
+        inst_keys = [bank_id]
+        with self.__nexus.handle():
+            self.__start_SOM(template, kwds.get("mask_file"),
+                             kwds.get("roi_file"))
+            inst_info = self.__get_inst_info()
+            try:
+                inst_keys.append(inst_info.getInstrument(som_id[0]))
+            except IOError:
+                # Geometry information doesn't exist
+                inst_keys.append(None)
+
+            (ids, num_tof_chan, num_y_pix, orig_axis) = \
+                  self.__prepare_SOM(template, data, so_axis, bank_id, **kwds)
+            self.__finish_SOM(template, inst_keys, entry_pt)
+
+        try:
+            for i in xrange(0, len(ids), pixels_per_chunk):
+                chunk_ids = ids[i:i + pixels_per_chunk]
+                result = SOM.SOM()
+                result.copyAttributes(template)
+                # the handle is not held while the chunk is in use
+                with self.__nexus.handle():
+                    block = data.get_region_block(chunk_ids, num_tof_chan,
+                                                  num_y_pix, tof_offset)
+                result.appendBlock(block)
+                yield result
+        finally:
+            if orig_axis is not None:
+                data.set_so_axis(orig_axis.location)
+
+    def writeSO(self):
+        pass
+
+    def writeSOM(self):
+        pass
+
+    def __start_SOM(self, result, mask_file, roi_file):
+        # Sets the file level metadata on a new SOM
+        result.attr_list["filename"] = self.__nexus.filename()
+        result.attr_list["instrument_name"] = self.__get_inst_info().getName()
+        result.attr_list["beamline"] = self.__get_inst_info().getBeamline()
+        if mask_file is not None:
+            result.attr_list["mask_file"] = mask_file
+        else:
+            pass
+
+        if roi_file is not None:
+            result.attr_list["roi_file"] = roi_file
+        else:
+            pass
+
+        entry_locations = self.list_type("NXentry")
+        path = entry_locations[0] + "/title"
+        try:
+            result.setTitle(self.__get_val_as_str(path))
+        except IOError:
+            result.setTitle("")
+
+        result.attr_list.sample = self.__get_sample_info().getSample()
+
+    def __finish_SOM(self, result, inst_keys, entry_pt):
+        # Sets the instrument and run information on a SOM
         if len(inst_keys) > 2:
             inst = SOM.CompositeInstrument(pairs=inst_keys)
             result.attr_list.instrument = inst
         else:
             result.attr_list.instrument = inst_keys[1]
 
-        info_keys = self.__sns_info.getKeys()
+        info_keys = self.__get_sns_info().getKeys()
         for key in info_keys:
             if key is not None and entry_pt in key:
-                pair_list = self.__sns_info.getInformation(key)
+                pair_list = self.__get_sns_info().getInformation(key)
                 if pair_list[1] is None:
                     info = None
                 else:
@@ -296,15 +894,99 @@ class NeXusDST(dst_base.DST_BASE):
                 key = key.replace("-"+entry_pt, "")
                 result.attr_list[key] = info
 
-        return result
+    def __construct_SOM(self, result, data, so_axis, bank_id, pending=None,
+                        **kwargs):
+        # Adds the spectra of a data group, returns the number of spectra
 
-    def writeSO(self):
-        pass
+        if isinstance(data, NeXusEventData):
+            return self.__construct_event_SOM(result, data, bank_id, **kwargs)
 
-    def writeSOM(self):
-        pass
+        tof_offset = kwargs.get("tof_offset")
+        columnar = kwargs.get("columnar", False)
+        lazy = kwargs.get("lazy", False)
+
+        (ids, num_tof_chan, num_y_pix, orig_axis) = \
+              self.__prepare_SOM(result, data, so_axis, bank_id, **kwargs)
+
+        if pending is not None:
+            pending.append((ids, data.get_block_request(ids, num_tof_chan,
+                                                        num_y_pix),
+                            data.get_axis_value(tof_offset)))
+        elif lazy:
+            def factory(so_id):
+                return self.__get_lazy_so(data, so_axis, so_id, num_tof_chan,
+                                          tof_offset)
+            result.appendLazy(ids, factory)
+        elif columnar:
+            result.appendBlock(data.get_region_block(ids, num_tof_chan,
+                                                     num_y_pix, tof_offset))
+        else:
+            # the raw data only has to stay while the spectra are built
+            key = data.cache_region(ids, num_tof_chan, num_y_pix)
+            self.__blocks.pin(key)
+            try:
+                for item in ids:
+                    #so = data.get_so(item)
+                    so = data.get_so2(item, num_tof_chan, num_y_pix,
+                                      tof_offset=tof_offset)
+                    result.append(so)
+            finally:
+                self.__blocks.unpin(key)
 
-    def __construct_SOM(self, result, data, so_axis, bank_id, **kwargs):
+        if orig_axis is not None:
+            data.set_so_axis(orig_axis.location)
+
+        return len(ids)
+
+    def __construct_event_SOM(self, result, data, bank_id, **kwargs):
+        # Histograms an event group into one block and returns the number of
+        # spectra. Events are always read right away, even for a lazy SOM.
+        edges = kwargs.get("bin_edges")
+        if edges is None:
+            try:
+                (start, stop, width) = kwargs["bin_params"]
+            except KeyError:
+                raise RuntimeError("Event data in %s needs bin_edges or "
+                                   "bin_params to be histogrammed" \
+                                   % data.location)
+            edges = dst_utils.make_bin_edges(start, stop, width,
+                                             kwargs.get("log_bins", False))
+
+        result.setAxisLabel(0, data.TOF_AXIS)
+        result.setAxisUnits(0, data.tof_units)
+        result.setYLabel("Counts")
+        result.setYUnits("counts")
+        result.setDataSetType("histogram")
+
+        attrs = self.__get_attr_list(data.location)
+        for key in attrs:
+            result.attr_list[key] = attrs[key]
+
+        min_id = data.get_id_min()
+        max_id = data.get_id_max()
+
+        start_id = kwargs.get("start_id")
+        if start_id is None or min_id > start_id:
+            start_id = min_id
+
+        end_id = kwargs.get("end_id")
+        if end_id is None or max_id < end_id:
+            end_id = max_id
+
+        ids = self.__select_pixels(start_id, end_id, max_id, data.bank,
+                                   bank_id, kwargs.get("mask_file"),
+                                   kwargs.get("roi_file"))
+
+        result.appendBlock(data.histogram(ids, edges,
+                                          kwargs.get("tof_offset"),
+                                          kwargs.get("pulse_window"),
+                                          kwargs.get("pulses_per_chunk")))
+        return len(ids)
+
+    def __prepare_SOM(self, result, data, so_axis, bank_id, **kwargs):
+        # Sets up the SOM labels and metadata for a data group and works out
+        # the pixel IDs and data layout. The data group is left on the
+        # requested axis, the original axis (or None) is returned to restore.
 
         if kwargs.has_key("start_id"):
             start_id = kwargs["start_id"]
@@ -325,8 +1007,6 @@ class NeXusDST(dst_base.DST_BASE):
         except KeyError:
             roi_file = None
 
-        tof_offset = kwargs.get("tof_offset")
-
         orig_axis = data.variable
         if orig_axis.label == so_axis or orig_axis.location == so_axis:
             orig_axis = None
@@ -353,17 +1033,8 @@ class NeXusDST(dst_base.DST_BASE):
         if end_id is None or max_id < end_id:
             end_id = max_id
 
-        ids = self.__generate_ids(start_id, end_id, data.location)
-
-        if mask_file is not None:
-            ids = self.__mask_pixels(ids, mask_file)
-        else:
-            pass
-
-        if roi_file is not None:
-            ids = self.__filter_pixels(ids, bank_id, roi_file)
-        else:
-            pass
+        ids = self.__select_pixels(start_id, end_id, max_id, data.location,
+                                   bank_id, mask_file, roi_file)
 
         num_axis3 = data.get_axis_length(2)
         num_tof_chan = data.get_variable_length()
@@ -380,16 +1051,39 @@ class NeXusDST(dst_base.DST_BASE):
             num_y_pix = max_id[1]
         except TypeError:
             num_y_pix = 1
-            
-        for item in ids:
-            #so = data.get_so(item)
-            so = data.get_so2(item, num_tof_chan, num_y_pix,
-                              tof_offset=tof_offset)
-            result.append(so)
 
-        if orig_axis is not None:
+        return (ids, num_tof_chan, num_y_pix, orig_axis)
+
+    def __get_lazy_so(self, data, so_axis, so_id, tof_chan, tof_offset):
+        # Reads a single spectrum for a lazy SOM. The axis is switched only
+        # for the duration of the read.
+        orig_axis = data.variable
+        if so_axis is not None and data.has_axis(so_axis):
+            data.set_so_axis(so_axis)
+        try:
+            return data.get_so(so_id, tof_offset=tof_offset, tof_chan=tof_chan)
+        finally:
             data.set_so_axis(orig_axis.location)
 
+    def __read_parallel(self, result, pending, workers):
+        # Reads the data blocks with a pool of worker processes and adds them
+        # to the SOM in the original data group order
+        import multiprocessing
+
+        filename = self.__nexus.filename()
+        backend = self.__nexus.getbackend()
+        pool = multiprocessing.Pool(min(workers, len(pending)))
+        try:
+            blocks = pool.map(__read_block_worker__,
+                              [(filename, backend, item[1])
+                               for item in pending], chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        for ((ids, request, axis), (y, var_y)) in zip(pending, blocks):
+            result.appendBlock(SOM.SOBlock(y, var_y, ids, [axis]))
+
     def __create_loc_sig_list(self):
         id_list = []
         for (location, signal) in map(None, self.__data_group,
@@ -399,16 +1093,30 @@ class NeXusDST(dst_base.DST_BASE):
         return id_list
 
     def release_resource(self):
+        self.__blocks.clear()
         del self.__nexus
         del self.__tree
         del self.__data_group
         del self.__data_signal
         del self.__so_axis
+        del self.__data_types
         del self.__avail_data
 
     def delete_blocks(self):
-        del self.__avail_data
-        self.__avail_data = None
+        # the data objects are made again if they are used after this
+        self.__avail_data.clear()
+        self.__blocks.clear()
+
+    def getBlockCache(self):
+        """
+        This method returns the cache holding the raw data blocks of all of
+        the data groups. It can be used to change the budget, pin blocks or
+        look at the statistics.
+
+        @return: The block cache
+        @rtype: L{block_cache.BlockCache}
+        """
+        return self.__blocks
 
     ########## special functions
     def __generate_ids(self, start, stop, location):
@@ -429,124 +1137,87 @@ class NeXusDST(dst_base.DST_BASE):
         except TypeError,e: #assume it is a scalar
             return range(start,stop)
 
-    def __mask_pixels(self, id_list, mask_filename):
+    def __select_pixels(self, start, stop, max_id, location, bank_id,
+                        mask_file, roi_file):
+        # Works out the pixel IDs in the requested range that are not masked
+        # and are in the region of interest. For a grid of pixels this is
+        # done with boolean arrays over the whole bank.
+        mask = self.__load_pixel_filter(mask_file, "mask")
+        roi = self.__load_pixel_filter(roi_file, "roi")
 
         try:
-            mask_file = open(mask_filename, "r")
-        except IOError:
-            raise RuntimeError("Cannot open mask file %s" % mask_filename)
-
-        for pixel_id_line in mask_file:
-            if pixel_id_line.startswith("#"):
-                continue
-            
-            pixel_id = self.__generate_pixel_id(pixel_id_line.rstrip())
-
-            try:
-                id_list.remove(pixel_id)
-            except ValueError:
-                pass
-
-        mask_file.close()
-
-        return id_list
+            is_grid = start != stop and len(start) == 2
+        except TypeError:
+            is_grid = False
+
+        if not is_grid:
+            ids = self.__generate_ids(start, stop, location)
+            if mask is not None:
+                masked = set(mask.getPixels(bank_id))
+                ids = [pixel_id for pixel_id in ids if pixel_id not in masked]
+            if roi is not None:
+                keep = set(roi.getPixels(bank_id))
+                ids = [pixel_id for pixel_id in ids if pixel_id in keep]
+            return ids
+
+        import numpy
+
+        keep = numpy.zeros(max_id, dtype=bool)
+        keep[start[0]:stop[0], start[1]:stop[1]] = True
+        if mask is not None:
+            keep &= ~mask.getGrid(bank_id, max_id)
+        if roi is not None:
+            keep &= roi.getGrid(bank_id, max_id)
+
+        from os.path import basename
+        loc = basename(location)
+        (i_index, j_index) = keep.nonzero()
+
+        return [(loc, pixel) for pixel in zip(i_index.tolist(),
+                                              j_index.tolist())]
+
+    def __load_pixel_filter(self, filename, kind):
+        if filename is None:
+            return None
 
-    def __filter_pixels(self, id_list, bank_id, roi_filename):
         try:
-            roi_file = open(roi_filename, "r")
+            return pixel_filter.load(filename)
         except IOError:
-            raise RuntimeError("Cannot open roi file %s" % roi_filename)
-
-        roi_id_list = []
-
-        for pixel_id_line in roi_file:
-            if pixel_id_line.startswith("#"):
-                continue
-            
-            pixel_id = self.__generate_pixel_id(pixel_id_line.rstrip())
-
-            # if bank IDs are not the same, move on
-            if pixel_id[0] != bank_id:
-                continue
-
-            roi_id_list.append(pixel_id)
-            
-            #try:
-            #    index = id_list.index(pixel_id)
-            #    roi_id_list.append(id_list.pop(index))
-            #except ValueError:
-            #    pass
-
-        roi_file.close()
-
-        return roi_id_list
-
-    def __generate_pixel_id(self, pixel_id_str):
-        parts = pixel_id_str.split('_')
-        return (parts[0], (int(parts[1]), int(parts[2])))        
+            raise RuntimeError("Cannot open %s file %s" % (kind, filename))
         
     def __get_attr_list(self, data_path):
-        # prefix of what attributes to use
-        data_path = "/" + data_path.split("/")[1]
-
-        # generate the full list of attributes to use
-        possible_list = self.list_type("SDS")
-        attr_list = []
-        for item in possible_list:
-            if item.startswith(data_path):
-                if len(item.split("/")) == 3:
-                    attr_list.append(item)
-
-        # Getting top level attributes
-        attrs = {}
-        for path in attr_list:
-            key = path.split("/")[-1]
-            units = None
-            if key == "run_number":
-                val = self.__get_val_as_type(path, "s")
-            else:
-                try:
-                    val = self.__get_val_as_type(path, "f")
-                except ValueError:
-                    val = self.__get_val_as_type(path, "s")
-                    
-            try:
-                units = self.__get_attr_as_str(path, "units")
-            except RuntimeError:
-                pass
-
-            if key == "proton_charge" and units == "microAmp*hour":
-                val *= 36.0e8
-                units = "picoCoulomb"
-            else:
-                pass
-
-            attrs[key] = SOM.NxParameter(val, units)
-
-        return attrs
-
-    def __get_attr_as_str(self, path, attr):
-        self.__nexus.openpath(path)
-        return self.__nexus.getattr(attr, "s")
+        # The attributes are the SDSs of the NXentry holding the data
+        return read_attributes(self.__nexus, self.__tree,
+                               "/" + data_path.split("/")[1])
 
-    def __get_val_as_type(self, path, type):
-        self.__nexus.openpath(path)
-        value = self.__strip_string(str(self.__nexus.getdata()))
-        if type == "f":
-            return float(value)
-        elif type == "i":
-            return int(value)
-        elif type == "s":
-            return value
-        else:
-            raise RuntimeError("Do not know how to interpret type: %s" % type)
-    
     def __get_val_as_str(self, path):
         self.__nexus.openpath(path)
         return str(self.__nexus.getdata())
 
-    def __strip_string(self, string):
-        return string.lstrip('[').rstrip(']')
+    def __list_data_types(self):
+        # Fills in the kind of data object for every data group and returns
+        # the event groups
+        som_ids = self.__generate_SOM_ids()
+        for som_id in som_ids:
+            self.__data_types[som_id] = NeXusData
+
+        # event groups are histogrammed when they are read
+        event_ids = []
+        for location in self.__list_event_groups():
+            self.__data_types[(location, 1)] = NeXusEventData
+            event_ids.append((location, 1))
+        return event_ids
+
+    def __list_default_groups(self, event_ids=None):
+        # The data groups read when none are asked for: all NXdata
+        nxdata_ids = self.__generate_SOM_ids(type="NXdata")
+        if len(nxdata_ids) == 0:
+            # a file with only events
+            if event_ids is None:
+                event_ids = [(location, 1)
+                             for location in self.__list_event_groups()]
+            nxdata_ids = event_ids
+        return nxdata_ids
 
     def __generate_SOM_ids(self, **kwargs):
         try:
@@ -568,6 +1239,14 @@ class NeXusDST(dst_base.DST_BASE):
                 SOM_list.append((path, it))
         return SOM_list
 
+    def __list_event_groups(self):
+        # NXevent_data groups and NXdata groups that hold events
+        path_list = []
+        for path in self.list_type("NXevent_data") + self.list_type("NXdata"):
+            if path + "/event_id" in self.__tree and path not in path_list:
+                path_list.append(path)
+        return path_list
+
     def __list_level(self):
         listing = {}
         self.__nexus.initgroupdir()
@@ -584,8 +1263,9 @@ class NeXusDST(dst_base.DST_BASE):
             my_list[("%s/%s" % (parent, key))] = listing[key]
         return my_list
 
-    def __parse_class(self, nodename, classname, path):
+    def __parse_class(self, nodename, classname, path, info=None):
         listing = {}
+        sds_names = []
         name = "rubbish"
         self.__nexus.opengroup(nodename, classname)
         #if (classname is not (None)):
@@ -597,13 +1277,61 @@ class NeXusDST(dst_base.DST_BASE):
             if (name is not None) and (type != "CDF0.0"):
                 #print path+"/"+nodename+"/"+name, classname
                 listing[("%s%s" % (path, name))] = classname
+                if classname == "SDS":
+                    sds_names.append(name)
             if (classname is not None) and (classname.startswith("NX")):
                 listing.update(self.__parse_class(name, classname,
-                                                  path+name+"/"))
+                                                  path+name+"/", info))
+        if info is not None:
+            for name in sds_names:
+                info[path + name] = self.__read_sds_info(name)
         self.__nexus.closegroup()
         return listing
 
-    def __build_tree2(self, listing={}):
+    def __read_sds_info(self, name):
+        # Reads the attributes and dimensions of an SDS in the open group
+        self.__nexus.opendata(name)
+        dims = self.__nexus.getdims()
+        attrs = {}
+        self.__nexus.initattrdir()
+        while True:
+            (attr_name, value) = self.__nexus.getnextattr()
+            if attr_name is None:
+                break
+            attrs[attr_name] = value
+        self.__nexus.closedata()
+        return (attrs, dims)
+
+    def __load_tree(self, cache_dir, prefetch):
+        # Use the cached tree if there is one, else walk the file and cache
+        # the result
+        if not cache_dir:
+            return self.__walk_tree(prefetch)
+
+        if cache_dir is True:
+            cache = tree_cache.TreeCache()
+        else:
+            cache = tree_cache.TreeCache(cache_dir)
+
+        filename = self.__nexus.filename()
+        tree = cache.get(filename)
+        if not isinstance(tree, nexus_tree.NeXusTree) and tree is not None:
+            tree = nexus_tree.NeXusTree(tree)
+
+        if tree is None or (prefetch and not tree.hasInfo()):
+            tree = self.__walk_tree(prefetch)
+            cache.put(filename, tree)
+
+        return tree
+
+    def __walk_tree(self, prefetch):
+        if prefetch:
+            info = {}
+        else:
+            info = None
+        return nexus_tree.NeXusTree(self.__build_tree2(info=info), info)
+
+    def __build_tree2(self, listing={}, info=None):
         # set up result
         my_listing = listing.copy()
         #print "using __build_tree2()"
@@ -613,10 +1341,10 @@ class NeXusDST(dst_base.DST_BASE):
             name, classname = self.__nexus.getnextentry()
             #print "(%s) %s" %(classname, name) 
             if (classname is not None) and (classname.startswith("NX")):
-                listing[("/%s" % name)] = classname
-                my_listing.update(listing)
+                my_listing[("/%s" % name)] = classname
                 path = "/"+name+"/"
-                my_listing.update(self.__parse_class(name, classname, path))
+                my_listing.update(self.__parse_class(name, classname, path,
+                                                     info))
         return my_listing
 
     def __build_tree(self, listing={}):
@@ -649,20 +1377,11 @@ class NeXusDST(dst_base.DST_BASE):
         if data_group is None:
             return {}
 
-        path, id = data_group.split('/')[1:]
-        id = id + "/"
-        # get the list of SDS in the data group
-        SDS_list = []
-        for key in self.__tree:
-            if self.__tree[key] == "SDS":
-                # Need the instrument on to stop double counting links
-                if path in key and id in key and "instrument" not in key:
-                    SDS_list.append(key)
-
-        # create the list of children with attributes
+        # create the list of SDS in the data group with attributes
         data_children = {}
-        for sds in SDS_list:
-            data_children[sds] = __get_sds_attr__(self.__nexus, sds)
+        for sds in self.__tree.children(data_group, "SDS"):
+            data_children[sds] = __get_sds_attr__(self.__nexus, sds,
+                                                  self.__tree)
 
         return data_children
 
@@ -679,30 +1398,29 @@ class NeXusDST(dst_base.DST_BASE):
         return signal_list
 
     def list_type(self, type):
-        my_list = []
-        for key in self.__tree:
-            if self.__tree[key] == type:
-                my_list.append(key)
-        return my_list
+        return self.__tree.list_type(type)
 
     def set_SO_axis(self, so_axis):
         som_id_list = self.__create_loc_sig_list()
         for som_id in som_id_list:
-            data = self.__avail_data[som_id]
+            data = self.__get_data(som_id)
             if data.has_axis(so_axis):
                 self.__so_axis = so_axis
             else:
                 raise ValueError("Invalid axis specified (%s)" % so_axis)
 
     def set_data(self, path, signal=1):
-        if self.__avail_data.has_key((path, signal)):
+        if self.__data_types.has_key((path, signal)):
             self.__data_group.append(path)
             self.__data_signal.append(signal)
         else:
             raise ValueError("Invalid data specified (%s,%d)" % (path, signal))
 
-class NeXusData:
-    def __init__(self, filehandle, tree, path, signal, tof_offset=None):
+class NeXusData(object):
+    def __init__(self, filehandle, tree, path, signal, tof_offset=None,
+                 blocks=None):
+        import threading
+
         # do the easy part
         self.location = path
         self.__nexus = filehandle
@@ -713,10 +1431,14 @@ class NeXusData:
         self.data_label = ""
         self.data_units = ""
         self.axes = []
-        self.variable = ""
-        self.__data_cptr = None # replace with getslab stuff
-        self.__data_var_cptr = None # replace with getslab stuff
-        self.__is_cached = False
+        self.__variable = None # the axis of threads that did not pick one
+        # the axis picked by each thread and the (i, j) corner and size of
+        # the last region it cached
+        self.__local = threading.local()
+        if blocks is None:
+            blocks = block_cache.BlockCache()
+        self.__blocks = blocks # raw data shared with the other groups
+        self.__axis_cache = {}
 
         # now start pushing through attributes
         children = self.__get_data_children(tree, path)
@@ -730,14 +1452,16 @@ class NeXusData:
                         self.__data = child
                         self.data_label = child.split("/")[-1]
                 elif key == "axis": # look for the axis to label themselves
-                    axis = NeXusAxis(self.__nexus, child)
+                    axis = NeXusAxis(self.__nexus, child, tree)
                     if axis.primary is not None and axis.primary == 1:
                         axes[value] = axis
         if self.signal is None:
             raise ValueError("Could not find signal=%d" % int(signal))
 
-        self.__nexus.openpath(self.__data)
-        self.__data_dims = self.__nexus.getdims()
+        self.__data_dims = tree.getDims(self.__data)
+        if self.__data_dims is None:
+            self.__nexus.openpath(self.__data)
+            self.__data_dims = self.__nexus.getdims()
 
         # look for the axes as an attribute to the signal data
         # also find the units
@@ -746,7 +1470,7 @@ class NeXusData:
             if key == "axes":
                 inner_list = (counts_attrlist[key]).split(",")
                 for i in range(len(inner_list)):
-                    axes[i+1] = NeXusAxis(self.__nexus, inner_list[i])
+                    axes[i+1] = NeXusAxis(self.__nexus, inner_list[i], tree)
             if key == "units":
                 self.units = counts_attrlist[key]
 
@@ -755,13 +1479,23 @@ class NeXusData:
             self.axes = []
         for i in range(len(axes)):
             self.axes.append(axes[i+1])
-        self.variable = self.axes[0]
+        self.__variable = self.axes[0]
+
+    def __get_variable(self):
+        return getattr(self.__local, "variable", self.__variable)
+
+    def __set_variable(self, axis):
+        self.__local.variable = axis
+
+    # the independent axis, set_so_axis only changes it for the calling
+    # thread so that threads reading with different axes do not interfere
+    variable = property(__get_variable, __set_variable)
 
     def get_variable_length(self):
         return len(self.variable.value)
 
     def get_block_length(self):
-        return len(self.__data_cptr)
+        return len(self.__cache_block()[0])
 
     def get_axis_length(self, loc):
         try:
@@ -805,7 +1539,7 @@ class NeXusData:
 
         raise RuntimeError("Do not know how to deal with %dd data" % num_axes)
 
-    def __get_slice(self, location, start_dim=None):
+    def __get_slice(self, location, start_dim=None, num_points=None):
         self.__nexus.openpath(location)
 
         if start_dim is None: # assume that it is 1d
@@ -814,90 +1548,341 @@ class NeXusData:
             
         #print "---------> %dd <-" % len(start_dim)
         # the number of values in the independent axis direction
-        num_points = len(self.variable) - 1 # assume histogram
+        if num_points is None:
+            num_points = len(self.variable) - 1 # assume histogram
+
+        # set up the arguments for getting the slab
+        end_dim = []
+        for item in start_dim:
+            end_dim.append(1)
+        var_index = self.axes.index(self.variable)
+        end_dim[var_index] = num_points
+
+        # get the value
+        return self.__nexus.getslab(start_dim,end_dim)
+
+    def get_so(self, so_id, tof_offset=None, tof_chan=None):
+        #print "retrieving",so_id # remove
+        # create a spectrum object
+        spectrum = SOM.SO()
+
+        # give it the id specified
+        spectrum.id = so_id
+
+        # give it the appropriate independent variable
+        spectrum.axis[0].share(self.get_axis_value(tof_offset))
+
+        # locate the data slice
+        start_dim = self.__id_to_index(so_id)
+
+        # set the data
+        spectrum.y = self.__get_slice(self.__data, start_dim, tof_chan)
+
+        # the variance is the data if no location is specified
+        if self.__data_var is None:
+            spectrum.shareVariance()
+        else:
+            spectrum.var_y = self.__get_slice(self.__data_var, start_dim,
+                                              tof_chan)
+
+        return spectrum
+
+    def get_so2(self, so_id, tof_chan, num_y, tof_offset=None):
+        # Use the cached region if it holds the pixel. If not, read in the
+        # whole block.
+        (data_cptr, data_var_cptr, start_index) = \
+                    self.__locate_so(so_id, tof_chan, num_y)
+
+        # create a spectrum object
+        spectrum = SOM.SO()
+
+        # give it the id specified
+        spectrum.id = so_id
+
+        #print "A:",so_id
+        # give it the appropriate independent variable
+        spectrum.axis[0].share(self.get_axis_value(tof_offset))
+            
+        # calculate 1D indicies
+        end_index = tof_chan + start_index
+
+        spectrum.y = data_cptr[start_index:end_index]
+
+        # set the data, the variance is the data if there is no variance
+        if self.__data_var is None:
+            spectrum.shareVariance()
+        else:
+            spectrum.var_y = data_var_cptr[start_index:end_index]
+
+        return spectrum
+
+    def cache_region(self, so_ids, tof_chan, num_y):
+        """
+        This method reads the smallest rectangle of pixels that holds the
+        requested pixel IDs with a hyperslab. Later calls to L{get_so2} for
+        those pixels take their data from the rectangle. The whole data set
+        is read instead when the rectangle covers the whole bank or the
+        layout does not allow a hyperslab.
+
+        @param so_ids: The pixel IDs that will be requested
+        @type so_ids: C{list}
+
+        @param tof_chan: The number of channels in each spectrum
+        @type tof_chan: C{int}
+
+        @param num_y: The number of pixels in the y direction of the bank
+        @type num_y: C{int}
+
+
+        @return: The key of the data in the block cache, for pinning
+        @rtype: C{tuple}
+        """
+        box = self.__get_box(so_ids, num_y)
+        if box is None:
+            self.__local.region = None
+            self.__cache_block()
+            return (self.__data, None)
+
+        self.__local.region = box
+        self.__cache_box(box, tof_chan)
+        return (self.__data, box)
+
+    def __locate_so(self, so_id, tof_chan, num_y):
+        # Finds the cached data holding a pixel and the pixel's flat index
+        region = getattr(self.__local, "region", None)
+        if region is not None:
+            (i0, j0, num_i, num_j) = region
+            index = self.__id_to_index(so_id)
+            i = index[0] - i0
+            j = index[1] - j0
+            if 0 <= i < num_i and 0 <= j < num_j:
+                (data_cptr, data_var_cptr) = \
+                            self.__cache_box(region, tof_chan)
+                return (data_cptr, data_var_cptr, tof_chan * (i * num_j + j))
+
+        (data_cptr, data_var_cptr) = self.__cache_block()
+        return (data_cptr, data_var_cptr,
+                self.__get_start_index(so_id, tof_chan, num_y))
+
+    def __get_box(self, so_ids, num_y):
+        # The (i, j) corner and size of the smallest rectangle of pixels
+        # holding the pixel IDs. None is given if the rectangle is the whole
+        # bank or the data cannot be read with a hyperslab.
+        var_index = self.axes.index(self.variable)
+        dims = self.__data_dims[0]
+        if len(so_ids) == 0 or len(dims) != 3 or var_index != 2:
+            return None
+
+        indices = [self.__id_to_index(so_id) for so_id in so_ids]
+        i_index = [index[0] for index in indices]
+        j_index = [index[1] for index in indices]
+        box = (min(i_index), min(j_index), max(i_index) - min(i_index) + 1,
+               max(j_index) - min(j_index) + 1)
+
+        if box == (0, 0, dims[0], num_y):
+            return None
+
+        return box
+
+    def __get_box_slab(self, box, tof_chan):
+        (i0, j0, num_i, num_j) = box
+        return ([i0, j0, 0], [num_i, num_j, tof_chan])
+
+    def get_block(self, so_ids, tof_chan, num_y, tof_offset=None):
+        """
+        This method creates a contiguous block holding the spectra for the
+        requested pixel IDs. The data is taken from the cached data block, so
+        the file is only read on the first call.
+
+        @param so_ids: The pixel IDs to place in the block
+        @type so_ids: C{list}
+
+        @param tof_chan: The number of channels in each spectrum
+        @type tof_chan: C{int}
+
+        @param num_y: The number of pixels in the y direction of the bank
+        @type num_y: C{int}
+
+        @param tof_offset: (OPTIONAL) An offset to add to the independent axis
+        @type tof_offset: C{float}
+
+
+        @return: The spectra for the requested pixel IDs
+        @rtype: L{SOM.SOBlock}
+        """
+        import numpy
+        
+        (data_cptr, data_var_cptr) = self.__cache_block()
+
+        rows = self.__get_rows(so_ids, tof_chan, num_y)
+
+        y = data_cptr.toNumPy().reshape(-1, tof_chan)
+        if rows == range(y.shape[0]):
+            y = numpy.array(y)
+        else:
+            y = y.take(rows, axis=0)
+
+        if self.__data_var is None:
+            var_y = None
+        else:
+            var_y = data_var_cptr.toNumPy().reshape(-1, tof_chan)
+            var_y = var_y.take(rows, axis=0)
+
+        return SOM.SOBlock(y, var_y, so_ids,
+                           [self.get_axis_value(tof_offset)])
+
+    def get_block_request(self, so_ids, tof_chan, num_y):
+        """
+        This method describes the read needed to create a block for the
+        requested pixel IDs without reading anything. The description can be
+        given to L{read_block} in another process.
+
+        @param so_ids: The pixel IDs to place in the block
+        @type so_ids: C{list}
 
-        # set up the arguments for getting the slab
-        end_dim = []
-        for item in start_dim:
-            end_dim.append(1)
-        var_index = self.axes.index(self.variable)
-        end_dim[var_index] = num_points
+        @param tof_chan: The number of channels in each spectrum
+        @type tof_chan: C{int}
 
-        # get the value
-        return self.__nexus.getslab(start_dim,end_dim)
+        @param num_y: The number of pixels in the y direction of the bank
+        @type num_y: C{int}
 
-    def get_so(self, so_id):
-        import copy
-        #print "retrieving",so_id # remove
-        # create a spectrum object
-        spectrum = SOM.SO()
 
-        # give it the id specified
-        spectrum.id = so_id
+        @return: The data path, variance path (or I{None}), number of
+                 channels and rows to read
+        @rtype: C{tuple}
+        """
+        return (self.__data, self.__data_var, tof_chan,
+                self.__get_rows(so_ids, tof_chan, num_y))
 
-        # give it the appropriate independent variable
-        spectrum.axis[0].val = copy.deepcopy(self.variable.value)
+    def get_region_block(self, so_ids, tof_chan, num_y, tof_offset=None):
+        """
+        This method creates a block of spectra for the requested pixel IDs
+        by reading only the smallest rectangle of pixels that holds them. The
+        whole data set is read instead when the rectangle covers the whole
+        bank or the layout does not allow a hyperslab.
 
-        # locate the data slice
-        start_dim = self.__id_to_index(so_id)
+        @param so_ids: The pixel IDs to place in the block
+        @type so_ids: C{list}
 
-        # set the data
-        spectrum.y = self.__get_slice(self.__data, start_dim)
+        @param tof_chan: The number of channels in each spectrum
+        @type tof_chan: C{int}
+
+        @param num_y: The number of pixels in the y direction of the bank
+        @type num_y: C{int}
 
-        # set the variance to be the data if no location is specified
+        @param tof_offset: (OPTIONAL) An offset to add to the independent
+                           axis
+        @type tof_offset: C{float}
+
+
+        @return: The spectra for the requested pixels
+        @rtype: L{SOM.SOBlock}
+        """
+        box = self.__get_box(so_ids, num_y)
+        if box is None:
+            return self.get_block(so_ids, tof_chan, num_y, tof_offset)
+
+        # Rows of the spectra in the rectangle
+        (i0, j0, num_i, num_j) = box
+        rows = []
+        for so_id in so_ids:
+            index = self.__id_to_index(so_id)
+            rows.append((index[0] - i0) * num_j + index[1] - j0)
+
+        (start, size) = self.__get_box_slab(box, tof_chan)
+        y = self.__get_region(self.__data, start, size, rows, tof_chan)
         if self.__data_var is None:
-            spectrum.var_y = copy.deepcopy(spectrum.y)
+            var_y = None
         else:
-            spectrum.var_y = self.__get_slice(self.__data_var, start_dim)
+            var_y = self.__get_region(self.__data_var, start, size, rows,
+                                      tof_chan)
 
-        return spectrum
+        return SOM.SOBlock(y, var_y, so_ids,
+                           [self.get_axis_value(tof_offset)])
 
-    def get_so2(self, so_id, tof_chan, num_y, tof_offset=None):
-        # Determine if data block is cached. If not, read in the block and
-        # set the flag True
-        if not self.__is_cached:
-            self.__data_cptr = self.__get_slice(self.__data)
+    def __get_region(self, location, start, size, rows, tof_chan):
+        import numpy
+
+        self.__nexus.openpath(location)
+        region = self.__nexus.getslab(start, size, "n")
+        region = numpy.asarray(region, dtype=numpy.float64)
+        return region.reshape(-1, tof_chan).take(rows, axis=0)
+
+    def __get_rows(self, so_ids, tof_chan, num_y):
+        return [self.__get_start_index(so_id, tof_chan, num_y) / tof_chan
+                for so_id in so_ids]
+
+    def __cache_block(self):
+        # The whole data set, read again if it was thrown out of the cache
+        key = (self.__data, None)
+        block = self.__blocks.get(key)
+        if block is None:
+            data_cptr = self.__get_slice(self.__data)
             if self.__data_var is not None:
-                self.__data_var_cptr = self.__get_slice(self.__data_var)
-            self.__is_cached = True
-        
-        import copy
-        # create a spectrum object
-        spectrum = SOM.SO()
+                data_var_cptr = self.__get_slice(self.__data_var)
+            else:
+                data_var_cptr = None
+            block = (data_cptr, data_var_cptr)
+            self.__blocks.put(key, block, block_cache.get_size(block))
+        return block
+
+    def __cache_box(self, box, tof_chan):
+        # A rectangle of pixels, read again if it was thrown out of the cache
+        key = (self.__data, box)
+        block = self.__blocks.get(key)
+        if block is None:
+            (start, size) = self.__get_box_slab(box, tof_chan)
+            self.__nexus.openpath(self.__data)
+            data_cptr = self.__nexus.getslab(start, size)
+            if self.__data_var is not None:
+                self.__nexus.openpath(self.__data_var)
+                data_var_cptr = self.__nexus.getslab(start, size)
+            else:
+                data_var_cptr = None
+            block = (data_cptr, data_var_cptr)
+            self.__blocks.put(key, block, block_cache.get_size(block))
+        return block
 
-        # give it the id specified
-        spectrum.id = so_id
+    def get_axis_value(self, tof_offset=None):
+        """
+        This method returns the values of the current independent axis. One
+        array per independent axis and offset is created and it is shared by
+        all of the spectra. Changing the axis of one spectrum copies it.
+
+        @param tof_offset: (OPTIONAL) An offset to add to the axis values
+        @type tof_offset: C{float}
+
+
+        @return: The independent axis values
+        @rtype: C{nessi_list.NessiList}
+        """
+        key = (self.variable.location, tof_offset)
+        try:
+            return self.__axis_cache[key]
+        except KeyError:
+            pass
 
-        #print "A:",so_id
-        # give it the appropriate independent variable
         if tof_offset is None:
-            spectrum.axis[0].val = copy.deepcopy(self.variable.value)
+            value = self.variable.value
         else:
             import array_manip
             new_tof = array_manip.add_ncerr(self.variable.value,
                                             self.variable.value,
                                             tof_offset, 0.0)
-            spectrum.axis[0].val = copy.deepcopy(new_tof[0])
-            
+            value = new_tof[0]
+
+        self.__axis_cache[key] = value
+        return value
+
+    def __get_start_index(self, so_id, tof_chan, num_y):
         # locate the data slice
         start_dim = self.__id_to_index(so_id)
 
         # calculate 1D indicies
         try:
-            start_index = tof_chan * (start_dim[1] + (start_dim[0] * num_y))
+            return tof_chan * (start_dim[1] + (start_dim[0] * num_y))
         except TypeError:
-            start_index = 0
-        end_index = tof_chan + start_index
-
-        spectrum.y = self.__data_cptr[start_index:end_index]
-
-        # set the data
-        if self.__data_var is None:
-            spectrum.var_y = copy.deepcopy(spectrum.y)
-        else:
-            spectrum.var_y = self.__data_var_cptr[start_index:end_index]
-
-        return spectrum
+            return 0
 
     def get_ids(self, var_axis=None):
         if var_axis is None:
@@ -988,37 +1973,519 @@ class NeXusData:
         if data_group is None:
             return {}
 
-        path, id = data_group.split('/')[1:]
-        id = id + "/"
-        # get the list of SDS in the data group
-        SDS_list = []
-        for key in tree:
-            if tree[key] == "SDS":
-                # Need the instrument on to stop double counting links
-                if path in key and id in key and "instrument" not in key:
-                    SDS_list.append(key)
-
-        # create the list of children with attributes
+        # create the list of SDS in the data group with attributes
         data_children = {}
-        for sds in SDS_list:
-            data_children[sds] = __get_sds_attr__(self.__nexus, sds)
+        for sds in tree.children(data_group, "SDS"):
+            data_children[sds] = __get_sds_attr__(self.__nexus, sds, tree)
 
         return data_children
 
+class NeXusEventData:
+    """
+    This class reads a group of neutron events (C{NXevent_data}, or an
+    C{NXdata} group holding I{event_id}) and histograms them into spectra.
+    Each event has a pixel ID (I{event_id}) and a time-of-flight
+    (I{event_time_offset}); I{event_index} gives the first event of every
+    pulse and I{event_time_zero} the time of the pulse. The events are read
+    a range of pulses at a time, so the memory needed is set by the number
+    of pulses per chunk and not by the size of the file.
+
+    The pixel layout is taken from the C{NXdetector} of the bank: its
+    I{pixel_id} grid, or the lengths of I{x_pixel_offset} and
+    I{y_pixel_offset} with the pixel IDs counting up along I{y} first.
+
+    @cvar DEFAULT_PULSES_PER_CHUNK: The number of pulses read at a time
+    @type DEFAULT_PULSES_PER_CHUNK: C{int}
+
+    @cvar TOF_AXIS: The name of the independent axis of the spectra
+    @type TOF_AXIS: C{string}
+
+    @ivar location: The path of the event group
+    @type location: C{string}
+
+    @ivar bank: The name of the detector bank the events belong to
+    @type bank: C{string}
+
+    @ivar signal: The signal number used to look up the group. It is always
+                  I{1}.
+    @type signal: C{int}
+
+    @ivar tof_units: The units of the event time-of-flight values
+    @type tof_units: C{string}
+
+    @ivar __shape: The number of pixels in each direction of the bank or
+                   I{None} if the layout is not known
+    @type __shape: C{tuple}
+
+    @ivar __id_min: The smallest pixel ID of the bank
+    @type __id_min: C{int}
+
+    @ivar __pixels: The position of each pixel in the bank (I{i * ny + j})
+                    indexed by the pixel ID less I{__id_min}. Unused IDs are
+                    I{-1}.
+    @type __pixels: C{numpy.ndarray}
+    """
+
+    DEFAULT_PULSES_PER_CHUNK = 1000
+
+    TOF_AXIS = "time_of_flight"
+
+    def __init__(self, filehandle, tree, path):
+        """
+        Object constructor
+
+        @param filehandle: The handle to the NeXus file
+        @type filehandle: L{nexus_file.NeXusFile}
+
+        @param tree: The directory tree of the file
+        @type tree: L{nexus_tree.NeXusTree}
+
+        @param path: The path of the event group
+        @type path: C{string}
+        """
+        self.location = path
+        self.signal = 1
+        self.__nexus = filehandle
+        self.__tree = tree
+
+        parent = nexus_tree.get_parent(path)
+        if tree.get(parent) == "NXdetector":
+            # Events stored inside of the detector
+            detector = parent
+            self.bank = parent.split("/")[-1]
+        else:
+            self.bank = path.split("/")[-1]
+            if self.bank.endswith("_events"):
+                self.bank = self.bank[:-len("_events")]
+            detector = None
+            entry = "/" + path.split("/")[1] + "/"
+            for location in tree.list_type("NXdetector"):
+                if location.startswith(entry) and \
+                       location.split("/")[-1] == self.bank:
+                    detector = location
+                    break
+
+        attrs = __get_sds_attr__(filehandle, path + "/event_time_offset",
+                                 tree)
+        self.tof_units = attrs.get("units", "microsecond")
+
+        (self.__shape, self.__id_min, self.__pixels) = \
+                       self.__get_layout(detector)
+
+    def __get_layout(self, detector):
+        # Works out the bank shape and the lookup from pixel ID to position
+        import numpy
+
+        if detector is None:
+            return (None, 0, None)
+
+        shape = None
+        x_path = detector + "/x_pixel_offset"
+        y_path = detector + "/y_pixel_offset"
+        if x_path in self.__tree and y_path in self.__tree:
+            shape = (self.__get_length(x_path), self.__get_length(y_path))
+
+        id_path = detector + "/pixel_id"
+        if id_path in self.__tree:
+            self.__nexus.openpath(id_path)
+            pixel_ids = numpy.asarray(self.__nexus.getdata("n"))
+            if pixel_ids.ndim == 2:
+                shape = pixel_ids.shape
+            elif shape is None or pixel_ids.size != shape[0] * shape[1]:
+                return (None, 0, None)
+            pixel_ids = pixel_ids.ravel().astype(numpy.intp)
+        elif shape is not None:
+            pixel_ids = numpy.arange(shape[0] * shape[1])
+        else:
+            return (None, 0, None)
+
+        id_min = int(pixel_ids.min())
+        pixels = numpy.empty(int(pixel_ids.max()) - id_min + 1,
+                             dtype=numpy.intp)
+        pixels.fill(-1)
+        pixels[pixel_ids - id_min] = numpy.arange(pixel_ids.size)
+
+        return (tuple(shape), id_min, pixels)
+
+    def __get_length(self, path):
+        dims = self.__tree.getDims(path)
+        if dims is None:
+            self.__nexus.openpath(path)
+            dims = self.__nexus.getdims()
+        return dims[0][0]
+
+    def get_id_min(self):
+        return (0, 0)
+
+    def get_id_max(self):
+        """
+        This method returns the number of pixels in each direction of the
+        bank.
+
+        @return: The size of the bank
+        @rtype: C{tuple}
+
+
+        @raise RuntimeError: The pixel layout of the bank is not known
+        """
+        if self.__shape is None:
+            raise RuntimeError("Cannot find the pixel layout of the detector "
+                               "for %s" % self.location)
+        return self.__shape
+
+    def get_ids(self, var_axis=None):
+        (num_x, num_y) = self.get_id_max()
+        return [(self.bank, (i, j)) for i in xrange(num_x)
+                for j in xrange(num_y)]
+
+    def has_axis(self, axis):
+        return axis == self.TOF_AXIS or \
+               axis == self.location + "/event_time_offset"
+
+    def histogram(self, so_ids, edges, tof_offset=None, pulse_window=None,
+                  pulses_per_chunk=None):
+        """
+        This method histograms the events of the requested pixels in
+        time-of-flight. The events are binned with a vectorized search of the
+        bin edges and counted with a single pass over each chunk of pulses.
+        Events outside of the bins or from other pixels are dropped.
+
+        @param so_ids: The pixel IDs of the spectra to create
+        @type so_ids: C{list} of C{tuple}s
+
+        @param edges: The time-of-flight bin edges. They must increase.
+        @type edges: C{numpy.ndarray} or sequence
+
+        @param tof_offset: (OPTIONAL) An offset to add to the time-of-flight
+                           of every event
+        @type tof_offset: C{float}
+
+        @param pulse_window: (OPTIONAL) Only use the pulses with a time in
+                             [start, stop). The times are in the units of
+                             I{event_time_zero}, which must increase.
+        @type pulse_window: C{tuple}
+
+        @param pulses_per_chunk: (OPTIONAL) The number of pulses to read at
+                                 a time. The default is
+                                 L{DEFAULT_PULSES_PER_CHUNK}.
+        @type pulses_per_chunk: C{int}
+
+
+        @return: The spectra with the counts as the variance
+        @rtype: L{SOM.SOBlock}
+
+
+        @raise ValueError: The bin edges do not increase or the chunk size is
+                           not positive
+        """
+        import numpy
+
+        if pulses_per_chunk is None:
+            pulses_per_chunk = self.DEFAULT_PULSES_PER_CHUNK
+        if pulses_per_chunk < 1:
+            raise ValueError("The number of pulses per chunk must be "
+                             "positive, not %d" % pulses_per_chunk)
+
+        edges = numpy.asarray(edges, dtype=numpy.float64)
+        if edges.ndim != 1 or len(edges) < 2 or \
+               (numpy.diff(edges) <= 0).any():
+            raise ValueError("The bin edges must be at least two increasing "
+                             "values")
+
+        num_bins = len(edges) - 1
+        rows = self.__get_rows(so_ids)
+        counts = numpy.zeros(len(so_ids) * num_bins, dtype=numpy.float64)
+
+        # Shifting the edges is the same as shifting every event
+        if tof_offset is None:
+            event_edges = edges
+        else:
+            event_edges = edges - tof_offset
+
+        # The events of pulse k are starts[k]:starts[k + 1]
+        starts = self.__read(self.location + "/event_index")
+        starts = numpy.append(starts.astype(numpy.int64),
+                              self.__get_length(self.location + "/event_id"))
+        (first, last) = self.__get_pulses(pulse_window, len(starts) - 1)
+
+        for pulse in xrange(first, last, pulses_per_chunk):
+            begin = int(starts[pulse])
+            end = int(starts[min(pulse + pulses_per_chunk, last)])
+            if end <= begin:
+                continue
+            pixel_ids = self.__read(self.location + "/event_id", begin,
+                                    end - begin)
+            tofs = self.__read(self.location + "/event_time_offset", begin,
+                               end - begin)
+            self.__accumulate(counts, rows, pixel_ids, tofs, event_edges)
+
+        axis = dst_utils.make_nessi_list(edges)
+
+        return SOM.SOBlock(counts.reshape(len(so_ids), num_bins), None,
+                           so_ids, [axis])
+
+    def __get_rows(self, so_ids):
+        # Maps pixel ID less the smallest ID to the row of the spectrum or -1
+        import numpy
+
+        num_y = self.get_id_max()[1]
+        positions = numpy.array([so_id[1][0] * num_y + so_id[1][1]
+                                 for so_id in so_ids], dtype=numpy.intp)
+        lookup = numpy.empty(self.__shape[0] * num_y, dtype=numpy.intp)
+        lookup.fill(-1)
+        lookup[positions] = numpy.arange(len(so_ids))
+
+        rows = numpy.empty_like(self.__pixels)
+        rows.fill(-1)
+        used = self.__pixels >= 0
+        rows[used] = lookup[self.__pixels[used]]
+
+        return rows
+
+    def __get_pulses(self, pulse_window, num_pulses):
+        # Returns the range of pulses inside of the time window
+        import numpy
+
+        if pulse_window is None:
+            return (0, num_pulses)
+
+        times = self.__read(self.location + "/event_time_zero")
+        (first, last) = numpy.searchsorted(times, pulse_window, side="left")
+        return (int(first), int(last))
+
+    def __accumulate(self, counts, rows, pixel_ids, tofs, edges):
+        # Adds the events of one chunk to the flat histogram
+        import numpy
+
+        num_bins = len(edges) - 1
+
+        index = numpy.asarray(pixel_ids, dtype=numpy.intp) - self.__id_min
+        row = rows.take(index, mode="clip")
+        row[(index < 0) | (index >= len(rows))] = -1
+
+        channel = numpy.searchsorted(edges, tofs, side="right") - 1
+        keep = (row >= 0) & (channel >= 0) & (channel < num_bins)
+        flat = row[keep] * num_bins + channel[keep]
+
+        # A full count is only worth it when the chunk fills the histogram
+        if len(flat) >= len(counts):
+            counts += numpy.bincount(flat, minlength=len(counts))
+        else:
+            (bins, number) = numpy.unique(flat, return_counts=True)
+            counts[bins] += number
+
+    def __read(self, path, start=None, size=None):
+        import numpy
+
+        self.__nexus.openpath(path)
+        if start is None:
+            return numpy.asarray(self.__nexus.getdata("n"))
+        return numpy.asarray(self.__nexus.getslab([start], [size], "n"))
+
+    def __repr__(self, verbose=False):
+        return "%s:%d" % (self.location, self.signal)
+
+def read_parameters(filehandle, pmap, entry, names):
+    """
+    This function reads parameters of a L{param_map.ParameterMap} from an
+    C{NXentry}. The paths of all of the parameters are worked out first and
+    then read in path order, so each group is opened once on the way through
+    the file.
+
+    @param filehandle: The handle to the NeXus file
+    @type filehandle: L{nexus_file.NeXusFile}
+
+    @param pmap: The mapping of the parameter names to paths and types
+    @type pmap: L{param_map.ParameterMap}
+
+    @param entry: The path of the C{NXentry}
+    @type entry: C{string}
+
+    @param names: The names of the parameters
+    @type names: C{list} of C{string}s
+
+
+    @return: The value and units of each parameter keyed by name, I{None}
+             for a parameter that is not in the file
+    @rtype: C{dict}
+
+
+    @raise KeyError: A name is not in the parameter map
+
+    @raise RuntimeError: The type of a parameter is not understood
+    """
+    requests = []
+    for name in names:
+        (tag, type) = pmap.getPathAndType(name)
+        path = entry + "/" + tag
+        if type == "log":
+            path += "/value"
+        requests.append((path, name, type))
+    requests.sort()
+
+    result = {}
+    for (path, name, type) in requests:
+        try:
+            filehandle.openpath(path)
+        except IOError:
+            result[name] = None
+            continue
+
+        try:
+            units = filehandle.getattr("units", "s")
+        except RuntimeError:
+            units = None
+
+        values = filehandle.getdata()
+        if type == "float":
+            value = float(values[0])
+        elif type == "int":
+            value = int(values[0])
+        elif type == "string":
+            if isinstance(values, basestring):
+                value = str(values)
+            else:
+                value = str(values[0])
+        elif type == "array":
+            value = list(values)
+        elif type == "log":
+            values = list(values)
+            if len(values) == 0:
+                value = None
+            else:
+                value = (sum(values) / float(len(values)), min(values),
+                         max(values))
+        else:
+            raise RuntimeError("Do not understand type %s" % type)
+
+        result[name] = (value, units)
+
+    return result
+
+def read_attributes(filehandle, tree, entry):
+    """
+    This function reads the SDSs that sit directly in an C{NXentry}, like
+    the title, run number and proton charge. The run number is kept as a
+    string, other values are read as numbers where they can be. The proton
+    charge is converted with L{convert_proton_charge}.
+
+    @param filehandle: The handle to the NeXus file
+    @type filehandle: L{nexus_file.NeXusFile}
+
+    @param tree: The file structure
+    @type tree: L{nexus_tree.NeXusTree}
+
+    @param entry: The path of the C{NXentry}
+    @type entry: C{string}
+
+
+    @return: The values keyed by the SDS name
+    @rtype: C{dict} of L{SOM.NxParameter}s
+    """
+    attrs = {}
+    for path in tree.children(entry, "SDS"):
+        key = path.split("/")[-1]
+        filehandle.openpath(path)
+        val = str(filehandle.getdata()).lstrip('[').rstrip(']')
+        if key != "run_number":
+            try:
+                val = float(val)
+            except ValueError:
+                pass
+
+        try:
+            units = filehandle.getattr("units", "s")
+        except RuntimeError:
+            units = None
+
+        if key == "proton_charge":
+            (val, units) = convert_proton_charge(val, units)
+
+        attrs[key] = SOM.NxParameter(val, units)
+
+    return attrs
+
+def convert_proton_charge(value, units):
+    """
+    This function converts a proton charge to picoCoulombs. A charge that
+    is already in picoCoulombs, or in units that are not known, is returned
+    as it is.
+
+    @param value: The proton charge
+    @type value: C{float}
+
+    @param units: The units of the proton charge
+    @type units: C{string}
+
+
+    @return: The proton charge and its units
+    @rtype: C{tuple}
+    """
+    scales = {"pC": 1.0, "nanoCoulomb": 1.0e3,
+              "microCoulomb": 1.0e6, "uC": 1.0e6, "milliCoulomb": 1.0e9,
+              "Coulomb": 1.0e12, "C": 1.0e12, "microAmp*hour": 36.0e8,
+              "uA*hour": 36.0e8}
+    if not scales.has_key(units) or isinstance(value, basestring):
+        return (value, units)
+    return (value * scales[units], "picoCoulomb")
+
+def read_block(filehandle, request):
+    """
+    This function reads the rows described by L{NeXusData.get_block_request}
+    from a NeXus file.
+
+    @param filehandle: The handle to the NeXus file
+    @type filehandle: L{nexus_file.NeXusFile}
+
+    @param request: The data path, variance path (or I{None}), number of
+                    channels and rows to read
+    @type request: C{tuple}
+
+
+    @return: The data and variance (or I{None}) blocks
+    @rtype: C{tuple} of C{numpy.ndarray}s
+    """
+    import numpy
+
+    (data_path, var_path, tof_chan, rows) = request
+
+    blocks = []
+    for path in (data_path, var_path):
+        if path is None:
+            blocks.append(None)
+            continue
+        filehandle.openpath(path)
+        block = numpy.asarray(filehandle.getdata("n"), dtype=numpy.float64)
+        blocks.append(block.reshape(-1, tof_chan).take(rows, axis=0))
+
+    return tuple(blocks)
+
+__worker_files__ = {}
+
+def __read_block_worker__(args):
+    # Runs in a worker process. Each process keeps its own file handles.
+    (filename, backend, request) = args
+    try:
+        filehandle = __worker_files__[(filename, backend)]
+    except KeyError:
+        filehandle = nexus_file.NeXusFile(filename, backend=backend)
+        __worker_files__[(filename, backend)] = filehandle
+
+    return read_block(filehandle, request)
+
 class NeXusAxis:
-    def __init__(self, filehandle, path):
+    def __init__(self, filehandle, path, tree=None):
         # set the location
         self.location = path
 
         # the label is the tail of the path
         self.label = path.split("/")[-1]
 
-        # get the value
-        filehandle.openpath(path)
-        self.value = filehandle.getdata()
+        # the value is read the first time it is used
+        self.__nexus = filehandle
 
         # get the list of attributes to set the label and units
-        attrs = __get_sds_attr__(filehandle, path)
+        attrs = __get_sds_attr__(filehandle, path, tree)
         try:
             self.units = attrs["units"]
         except KeyError:
@@ -1033,6 +2500,14 @@ class NeXusAxis:
             self.primary = None
 
 
+    def __getattr__(self, name):
+        # Reads the axis values on first use
+        if name != "value":
+            raise AttributeError(name)
+        self.__nexus.openpath(self.location)
+        self.value = self.__nexus.getdata()
+        return self.value
+
     def __str__(self):
         return "[%d]%s (%s)" % (int(self.number), str(self.label),
                                 str(self.units))
@@ -1040,7 +2515,13 @@ class NeXusAxis:
     def __len__(self):
         return len(self.value)
 
-def __get_sds_attr__(filehandle, path):
+def __get_sds_attr__(filehandle, path, tree=None):
+    # Use the attributes read while walking the file if there are any
+    if tree is not None:
+        attrs = tree.getAttributes(path)
+        if attrs is not None:
+            return attrs
+
     attrs = {}
     filehandle.openpath(path)
     filehandle.initattrdir()
@@ -1052,11 +2533,93 @@ def __get_sds_attr__(filehandle, path):
     return attrs
 
 
+def __get_block_starts__(som):
+    # Maps the position of the first spectrum of each block of a SOM to the
+    # block
+    starts = {}
+    position = 0
+    for block in som.getBlocks():
+        starts[position] = block
+        position += len(block)
+    return starts
+
+def __get_group_kwds__(kwds, index, groups):
+    # The getSOM keywords for reading the spectra of one of several data
+    # groups on its own
+    kwds = dict(kwds)
+    kwds.pop("workers", None)
+    kwds["geometry"] = False
+    if len(groups) > 1:
+        for name in ("start_id", "end_id"):
+            if kwds.get(name) is not None:
+                kwds[name] = kwds[name][index]
+    return kwds
+
+def __same_spectra__(spectra, block):
+    # Checks that spectra hold the pixel IDs, counts and independent axis of
+    # a block
+    import numpy
+
+    if [spectrum.id for spectrum in spectra] != list(block.ids):
+        return False
+    if len(spectra) == 0:
+        return True
+
+    if not numpy.array_equal(numpy.array([__to_numpy__(spectrum.y)
+                                          for spectrum in spectra]),
+                             block.y) or \
+       not numpy.array_equal(numpy.array([__to_numpy__(spectrum.var_y)
+                                          for spectrum in spectra]),
+                             block.var_y):
+        return False
+
+    # Spectra of one group share their axes, each array is compared once
+    checked = {}
+    for spectrum in spectra:
+        if len(spectrum.axis) != len(block.axis):
+            return False
+        for (primary, value) in zip(spectrum.axis, block.axis):
+            if primary.var is not None:
+                return False
+            key = id(primary.val.getValue()) \
+                  if hasattr(primary.val, "getValue") else id(primary.val)
+            if not checked.has_key(key):
+                checked[key] = numpy.array_equal(__to_numpy__(primary.val),
+                                                 __to_numpy__(value))
+            if not checked[key]:
+                return False
+    return True
+
+def __to_numpy__(values):
+    # The values of a NessiList or an array as an array
+    import numpy
+
+    try:
+        return numpy.asarray(values.toNumPy())
+    except AttributeError:
+        return numpy.asarray(values)
+
+def __get_signature__(tree, path):
+    # Describes the layout of a group from the directory tree: the class,
+    # dimensions and attributes of every node below it
+    signature = []
+    pending = [path]
+    while len(pending) > 0:
+        for child in tree.children(pending.pop()):
+            nxclass = tree.get(child)
+            attrs = tree.getAttributes(child)
+            if attrs is not None:
+                attrs = attrs.items()
+                attrs.sort()
+            signature.append((child, nxclass, tree.getDims(child), attrs))
+            if nxclass != "SDS":
+                pending.append(child)
+    signature.sort()
+    return signature
+
 class NeXusInstrument:
     def __init__(self, filehandle, tree, **kwargs):
         # do the easy part
-        import math
-
         try:
             from_saf = kwargs["from_saf"]
         except KeyError:
@@ -1065,9 +2628,7 @@ class NeXusInstrument:
         self.__nexus = filehandle
         self.__tree = tree
 
-        self.__entry_locations = self.__list_type(tree,"NXinstrument")
-        self.__det_locations = self.__list_type(tree,"NXdetector")
-        self.__mon_locations = self.__list_type(tree,"NXmonitor")
+        self.__entry_locations = tree.list_type("NXinstrument")
 
         self.__det_data = {}
         self.__mon_data = {}
@@ -1098,32 +2659,103 @@ class NeXusInstrument:
             self.__det_info.append("dh")
             self.__det_info.append("dtd")
 
-        for location in self.__det_locations:
-            label = location.split('/')[-1]
-            info_list = []
-            for name in self.__det_info:
-                path = location + "/" + name
-                info_list.append(self.__get_value(path))
-                
-            self.__det_data[label] = info_list
+        # the geometry of a bank is read the first time it is asked for
+        self.__primary = None
+        self.__index_locations()
 
-        for location in self.__mon_locations:
-            label = location.split('/')[-1]
-            path = location + "/distance"
-            self.__mon_data[label] = self.__get_value(path)
+    def __index_locations(self):
+        # Finds the detector, monitor and moderator groups in the tree
+        self.__det_paths = {}
+        for location in self.__tree.list_type("NXdetector"):
+            self.__det_paths[location.split('/')[-1]] = location
+
+        self.__mon_paths = {}
+        for location in self.__tree.list_type("NXmonitor"):
+            self.__mon_paths[location.split('/')[-1]] = location
+
+        self.__moderator_locations = self.__tree.list_type("NXmoderator")
+
+    def reset(self, tree, locations=None):
+        """
+        This method takes the directory tree of the file after it was changed
+        and forgets the geometry that was read from the changed groups. The
+        geometry of those groups is read again the next time it is asked for.
+
+        @param tree: The new directory tree of the file
+        @type tree: L{nexus_tree.NeXusTree}
+
+        @param locations: (OPTIONAL) The paths of the detector, monitor and
+                          moderator groups that changed. If not provided,
+                          all of the geometry is forgotten.
+        @type locations: C{list} of C{string}s
+        """
+        old_paths = self.__det_paths.copy()
+        old_paths.update(self.__mon_paths)
+
+        self.__tree = tree
+        self.__index_locations()
+
+        for cache in (self.__det_data, self.__mon_data):
+            for label in cache.keys():
+                if locations is None or old_paths.get(label) in locations or \
+                       (not self.__det_paths.has_key(label) and
+                        not self.__mon_paths.has_key(label)):
+                    del cache[label]
+
+        if locations is None or \
+               len([location for location in self.__moderator_locations
+                    if location in locations]) > 0:
+            self.__primary = None
+
+    def __get_det_data(self, label):
+        # Reads the geometry of a detector bank, raises KeyError if there is
+        # no such bank
+        try:
+            return self.__det_data[label]
+        except KeyError:
+            pass
+
+        location = self.__det_paths[label]
+        info_list = []
+        for name in self.__det_info:
+            path = location + "/" + name
+            info_list.append(self.__get_value(path))
+
+        self.__det_data[label] = info_list
+        return info_list
+
+    def __get_mon_data(self, label):
+        # Reads the distance of a monitor, raises KeyError if there is no
+        # such monitor
+        try:
+            return self.__mon_data[label]
+        except KeyError:
+            pass
+
+        path = self.__mon_paths[label] + "/distance"
+        self.__mon_data[label] = self.__get_value(path)
+        return self.__mon_data[label]
+
+    def __get_primary(self):
+        # Reads the moderator distance
+        if self.__primary is not None:
+            return self.__primary
+
+        import math
 
-        self.__moderator_locations =  self.__list_type(tree,"NXmoderator")
         try:
-            self.__primary = self.__get_value(self.__moderator_locations[-1] +
-                                              "/distance")
+            primary = self.__get_value(self.__moderator_locations[-1] +
+                                       "/distance")
         except IndexError:
-            self.__primary = (float('nan'), float('nan'), "")
+            primary = (float('nan'), float('nan'), "")
         # Remake tuple with primary with |distance|
         try:
-            self.__primary = (math.fabs(self.__primary[0]), self.__primary[1],
-                              self.__primary[2])
+            primary = (math.fabs(primary[0]), primary[1], primary[2])
         except TypeError:
-            self.__primary = (float('nan'), float('nan'), "")
+            primary = (float('nan'), float('nan'), "")
+
+        self.__primary = primary
+        return primary
 
     def __get_value(self, path):
         try:
@@ -1142,13 +2774,17 @@ class NeXusInstrument:
             values = values[0]
         else:
             pass
-        
-        while True:
-            (name, value) = self.__nexus.getnextattr()
-            if name is None:
-                break
-            if name == "units":
-                units = value
+
+        attrs = self.__tree.getAttributes(path)
+        if attrs is not None and attrs.has_key("units"):
+            units = attrs["units"]
+        else:
+            while True:
+                (name, value) = self.__nexus.getnextattr()
+                if name is None:
+                    break
+                if name == "units":
+                    units = value
 
         errors = self.__get_errors(path)
         if errors is None:
@@ -1177,13 +2813,6 @@ class NeXusInstrument:
         return self.__nexus.getdata()
     
         
-    def __list_type(self, tree, type):
-        my_list = []
-        for key in tree:
-            if tree[key] == type:
-                my_list.append(key)
-        return my_list
-
 
     def __get_val_as_str(self, path):
         self.__nexus.openpath(path)
@@ -1263,11 +2892,12 @@ class NeXusInstrument:
         # Check the monitor list
         flag = False
         try:
-            geometry = self.__mon_data[label]
+            geometry = self.__get_mon_data(label)
             # Add monitor distance to |moderator distance| to get correct
             # distance and recreate tuple
             try:
-                geometry = (self.__primary[0] + geometry[0], geometry[1])
+                geometry = (self.__get_primary()[0] + geometry[0],
+                            geometry[1])
             except TypeError:
                 geometry = (float('nan'), float('nan'))
             return SOM.Instrument(primary=geometry)
@@ -1283,7 +2913,7 @@ class NeXusInstrument:
             instname = self.__inst_name
             extra_stuff = None
             
-            geometry = self.__det_data[label]
+            geometry = self.__get_det_data(label)
 
             # Secondary flight path versus distance checks
             if geometry[0][0] is None:
@@ -1395,8 +3025,8 @@ class NeXusInstrument:
                 extra_stuff = dims[0][1]                
 
             return SOM.Instrument(instrument=instname,
-                                  primary=(self.__primary[0],
-                                           self.__primary[1]),
+                                  primary=(self.__get_primary()[0],
+                                           self.__get_primary()[1]),
                                   det_secondary=det_secondary,
                                   secondary=distance,
                                   secondary_err2=distance_err2,
@@ -1430,12 +3060,12 @@ class SnsInformation:
         self.__tree = tree
         self.__inst_name = inst_name
 
-        self.__det_locations = self.__list_type(tree, "NXdetector")
+        self.__det_locations = tree.list_type("NXdetector")
         self.__det_data = {}
 
         if self.__inst_name == "BSS":
 
-            self.__det_locations.extend(self.__list_type(tree, "NXcrystal"))
+            self.__det_locations.extend(tree.list_type("NXcrystal"))
             SOM_keys = {"analyzer" : ["Wavelength_final"]}
             data_loc = {"analyzer" : ["wavelength"]}
             index_sel = {"analyzer" : ["IJSelector"]}
@@ -1443,7 +3073,7 @@ class SnsInformation:
             self.__get_data(SOM_keys, data_loc, index_sel, from_saf=from_saf)
 
         elif self.__inst_name == "REF_L" or self.__inst_name == "REF_M":
-            self.__det_locations.extend(self.__list_type(tree, "NXaperture"))
+            self.__det_locations.extend(tree.list_type("NXaperture"))
 
             if self.__inst_name == "REF_L":
                 SOM_keys = {"aperture1" : ["Slit1_distance", "Slit1_top",
@@ -1464,10 +3094,8 @@ class SnsInformation:
                                            "s2b/value"],
                             "bank1" : ["Theta/readback", "TwoTheta/readback"]}
             else:
-                self.__det_locations.extend(self.__list_type(tree,
-                                                             "NXpositioner"))
-                self.__det_locations.extend(self.__list_type(tree,
-                                                             "NXsample"))
+                self.__det_locations.extend(tree.list_type("NXpositioner"))
+                self.__det_locations.extend(tree.list_type("NXsample"))
                 SOM_keys = {"aperture1" : ["Slit1_distance", "Slit1_left",
                                            "Slit1_right"],
                             "aperture3" : ["Slit3_distance", "Slit3_left",
@@ -1622,13 +3250,17 @@ class SnsInformation:
             values = values[0]
         else:
             pass
-        
-        while True:
-            (name, value) = self.__nexus.getnextattr()
-            if name is None:
-                break
-            if name == "units":
-                units = value
+
+        attrs = self.__tree.getAttributes(path)
+        if attrs is not None and attrs.has_key("units"):
+            units = attrs["units"]
+        else:
+            while True:
+                (name, value) = self.__nexus.getnextattr()
+                if name is None:
+                    break
+                if name == "units":
+                    units = value
 
         errors = self.__get_errors(path)
         if errors is None:
@@ -1656,13 +3288,6 @@ class SnsInformation:
 
         return self.__nexus.getdata()
         
-    def __list_type(self, tree, type):
-        my_list = []
-        for key in tree:
-            if tree[key] == type:
-                my_list.append(key)
-        return my_list
-
     def __get_val_as_str(self, path):
         self.__nexus.openpath(path)
         return str(self.__nexus.getdata())
@@ -1690,7 +3315,7 @@ class SampleInformation:
         self.__tree = tree
         self.__inst_name = inst_name
 
-        self.__samp_locations = self.__list_type(tree, "NXsample")
+        self.__samp_locations = tree.list_type("NXsample")
         
         self.__sample = SOM.Sample()
         
@@ -1700,13 +3325,6 @@ class SampleInformation:
         self.__sample.holder = self.__get_info("holder")
         self.__sample.changer_position = self.__get_info("changer_position")
 
-    def __list_type(self, tree, type):
-        my_list = []
-        for key in tree:
-            if tree[key] == type:
-                my_list.append(key)
-        return my_list
-
     def __get_val_as_str(self, path):
         self.__nexus.openpath(path)
         return str(self.__nexus.getdata())
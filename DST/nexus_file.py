@@ -22,8 +22,10 @@
 
 # $Id$
 
+import contextlib
 import sns_napi
 import enum
+import nexus_backend
 
 class NeXusError(SystemError):
     pass
@@ -40,25 +42,64 @@ class NeXusFile:
     ACCESS.set("NOSTRIP",   sns_napi.ACC_NOSTRIP)
 
     # ----- python stuff
-    def __init__(self, filename, access=sns_napi.ACC_READ):
-        self.__HANDLE__ = sns_napi.open(filename, access)
-        if self.__HANDLE__ is None:
-            raise SystemError("Failed to read file: %s" % filename)
+    def __init__(self, filename, access=sns_napi.ACC_READ, backend=None):
+        """
+        Open a NeXus file. The backend is I{napi} (the default) for the NeXus
+        API or I{hdf5} for reading HDF5 based files directly.
+        """
+        self.__backend     = nexus_backend.get_backend(backend)(filename,
+                                                                access)
+        self.__backend_name = backend or "napi"
+        self.__access      = access
         self.__filename    = filename
         self.__path        = []
         self.__dataopen    = False
+        self.__nxclasses   = {} # (parent path, name) -> nxclass
+        self.__targets     = {} # absolute path -> parsed target
 
     def __getnxclass(self, name):
         """
-        Return the nxclass of the supplied name.
+        Return the nxclass of the supplied name. The whole directory of the
+        current group is remembered the first time it is read.
         """
+        parent = tuple(self.__path)
+        try:
+            return self.__nxclasses[(parent, name)]
+        except KeyError:
+            pass
+
         self.initgroupdir()
         (myname, nxclass) = ("crap name","crap class")
         while (myname, nxclass) != (None, None):
             (myname, nxclass) = self.getnextentry()
-            if myname == name:
-                return nxclass
-        return None
+            if myname is not None:
+                self.__nxclasses[(parent, myname)] = nxclass
+        return self.__nxclasses.get((parent, name))
+
+    def prime(self, tree):
+        """
+        Remember the nxclass of every node in a directory tree so that
+        opening paths does not need to search the group directories.
+
+        @param tree: The full path of each node mapped to its nxclass
+        @type tree: C{dict}
+        """
+        for path in tree:
+            parts = path.strip("/").split("/")
+            self.__nxclasses[(tuple(parts[:-1]), parts[-1])] = tree[path]
+
+    def reopen(self):
+        """
+        Open the file again so that changes made by other programs since it
+        was opened are seen. The remembered nxclasses are forgotten and the
+        root group is open afterwards.
+        """
+        backend = nexus_backend.get_backend(self.__backend_name)
+        self.__backend     = backend(self.__filename, self.__access)
+        self.__path        = []
+        self.__dataopen    = False
+        self.__nxclasses   = {}
+        self.__targets     = {}
 
     def filename(self):
         return self.__filename
@@ -66,16 +107,20 @@ class NeXusFile:
     def getselfpath(self):
         return self.__path
 
+    def getbackend(self):
+        return self.__backend_name
+
     # ----- napi stuff
     def flush(self):
-        sns_napi.flush(self.__HANDLE__)
+        self.__backend.flush()
 
     def makegroup(self, name, type):
-        return sns_napi.makegroup(self.__HANDLE__, name, type)
+        self.__nxclasses[(tuple(self.__path), name)] = type
+        return self.__backend.makegroup(name, type)
 
     def opengroup(self, name, type):
         self.__path.append(name)
-        return sns_napi.opengroup(self.__HANDLE__, name, type)
+        return self.__backend.opengroup(name, type)
 
     def openpath(self, path):
         """
@@ -96,48 +141,13 @@ class NeXusFile:
     def _openpath(self, path, opendata=True):
         """helper function: open relative path and maybe data"""
         
-        if self.__path != []:
-            if path == self.__path[-1]:
-                #print "We are here already"
-                return
-        
-        # Determine target node as sequence of group names
-        if path == '/':
-            target = []
-        else:
-            if path.endswith("/"):
-                path = path[:-1]
+        # Determine target node as sequence of (name, nxclass)
+        try:
+            target = self.__targets[path]
+        except KeyError:
+            target = self.__parse_target(path)
             if path.startswith('/'):
-                target = path[1:].split('/')
-            else:
-                target = self.__path + path.split('/')
-
-        # Remove relative path indicators from target
-        L = []
-        for t in target: 
-            if t == '.': 
-                # Skip current node
-                pass
-            elif t == '..':
-                if L == []:
-                    raise ValueError("too many '..' in path")
-                L.pop()
-            else:
-                L.append(t)
-        target = L
-
-        # split out nxclass from each level if available
-        L = []
-        for t in target:
-            try:
-                item = t.split(":")
-                if len(item) == 1:
-                    L.append((item[0], None))
-                else:
-                    L.append(tuple(item))
-            except AttributeError:
-                L.append(t)
-        target = L
+                self.__targets[path] = target
 
         #print "current path",self.__path
         #print "%s"%path,target
@@ -152,12 +162,12 @@ class NeXusFile:
             if i == len(self.__path):
                 #print "target longer than current"
                 up = []
-                down = target[i:]
+                down = list(target[i:])
                 break
             elif self.__path[i] != name:
                 #print "target and current differ at",name
                 up = self.__path[i:]
-                down = target[i:]
+                down = list(target[i:])
                 break
         else:
             #print "target shorter than current"
@@ -172,6 +182,17 @@ class NeXusFile:
                 down[i] = (down[i], None)
         #print "close,open",up,down
 
+        # Already there
+        if up == [] and down == []:
+            return
+
+        # Jump straight to the target if the backend allows it
+        if self.__backend.RANDOM_ACCESS:
+            names = [name for (name, nxclass) in target]
+            self.__dataopen = self.__backend.openpath(names, opendata)
+            self.__path = names
+            return
+
         # Close groups on the way up
         if self.__dataopen and up != []:
             #print "closedata(%s)" % up[-1]
@@ -197,6 +218,47 @@ class NeXusFile:
             else:
                 raise IOError("node %s not in %s"%(name,self.path))
 
+    def __parse_target(self, path):
+        """helper function: split a path into (name, nxclass) pairs"""
+        
+        # Determine target node as sequence of group names
+        if path == '/':
+            target = []
+        else:
+            if path.endswith("/"):
+                path = path[:-1]
+            if path.startswith('/'):
+                target = path[1:].split('/')
+            else:
+                target = self.__path + path.split('/')
+
+        # Remove relative path indicators from target
+        L = []
+        for t in target: 
+            if t == '.': 
+                # Skip current node
+                pass
+            elif t == '..':
+                if L == []:
+                    raise ValueError("too many '..' in path")
+                L.pop()
+            else:
+                L.append(t)
+        target = L
+
+        # split out nxclass from each level if available
+        L = []
+        for t in target:
+            try:
+                item = t.split(":")
+                if len(item) == 1:
+                    L.append((item[0], None))
+                else:
+                    L.append(tuple(item))
+            except AttributeError:
+                L.append(t)
+        return tuple(L)
+
     def opengrouppath(self, path):
         """
         Open a particular group '/path/to/group', or the dataset containing
@@ -211,78 +273,80 @@ class NeXusFile:
         
     def closegroup(self):
         self.__path.pop()
-        return sns_napi.closegroup(self.__HANDLE__)
+        return self.__backend.closegroup()
 
     def makedata(self, name, type, dims):
-        return sns_napi.makedata(self.__HANDLE__, name, type, dims)
+        self.__nxclasses[(tuple(self.__path), name)] = "SDS"
+        return self.__backend.makedata(name, type, dims)
 
     def compmakedata(self, name, type, dims, c_buffer):
-        return sns_napi.compmakedata(self.__HANDLE__, name, type, dims)
+        self.__nxclasses[(tuple(self.__path), name)] = "SDS"
+        return self.__backend.compmakedata(name, type, dims)
 
     def compress(self, compression):
-        return sns_napi.compress(self.__HANDLE__, compression)
+        return self.__backend.compress(compression)
 
     def opendata(self, name):
         if self.__dataopen:
             self.closedata()
         self.__path.append(name)
         self.__dataopen = True
-        return sns_napi.opendata(self.__HANDLE__, name)
+        return self.__backend.opendata(name)
 
     def closedata(self):
         self.__path.pop()
         self.__dataopen = False
-        return sns_napi.closedata(self.__HANDLE__)
+        return self.__backend.closedata()
 
     def putdata(self, c_ptr):
-        return sns_napi.putdata(self.__HANDLE__, c_ptr)
+        return self.__backend.putdata(c_ptr)
 
     def putslab(self, c_ptr, dims):
-        return sns_napi.putslab(self.__HANDLE__, c_ptr, dims)
+        return self.__backend.putslab(c_ptr, dims)
 
     def getdata(self, type="f"):
-        return sns_napi.getdata(self.__HANDLE__, type)
+        return self.__backend.getdata(type)
 
     def getslab(self, start, size, type="f"):
-        return sns_napi.getslab(self.__HANDLE__, start, size, type)
+        return self.__backend.getslab(start, size, type)
 
     def putattr(self, name, c_ptr, type):
-        return sns_napi.putattr(self.__HANDLE__, name, c_ptr, type)
+        return self.__backend.putattr(name, c_ptr, type)
 
     def getdataID(self):
-        return sns_napi.getdataID(self.__HANDLE__)
+        return self.__backend.getdataID()
 
     def makelink(self, link):
-        return sns_napi.makelink(self.__HANDLE__, link)
+        return self.__backend.makelink(link)
 
     def opensourcegroup(self):
         #self.__path = ""
-        return sns_napi.opensourcegroup(self.__HANDLE__)
+        return self.__backend.opensourcegroup()
 
     def getdims(self):
-        return sns_napi.getinfo(self.__HANDLE__)
+        return self.__backend.getinfo()
 
     def getnextentry(self):
-        (name, nxclass, number) = sns_napi.getnextentry(self.__HANDLE__)
+        (name, nxclass, number) = self.__backend.getnextentry()
         return (name, nxclass)
 
     def getnextattr(self):
-        return sns_napi.getnextattr(self.__HANDLE__)
+        return self.__backend.getnextattr()
 
     def getattr(self, name, type):
-        return sns_napi.getattr(self.__HANDLE__, name)
+        return self.__backend.getattr(name)
 
     def getgroupID(self):
-        return sns_napi.getgroupID(self.__HANDLE__)
+        return self.__backend.getgroupID()
 
 #    def sameID(self): # not exposed through swig
 #        raise NotImplementedError
 
     def initgroupdir(self):
-        return sns_napi.initgroupdir(self.__HANDLE__)
+        return self.__backend.initgroupdir()
 
     def initattrdir(self):
-        return sns_napi.initattrdir(self.__HANDLE__)
+        return self.__backend.initattrdir()
 
 #    def setnumberformat(self): # not exposed through swig
 #        raise NotImplementedError
@@ -292,3 +356,175 @@ class NeXusFile:
 #extern  NXstatus  NXmalloc(void** data, int rank, int dimensions[],
 # int datatype);
 #extern  NXstatus  NXfree(void** data);
+
+class NeXusFilePool(object):
+    """
+    This class hands out independent L{NeXusFile} handles on one file so
+    that several threads can read from it at once. Each L{NeXusFile} keeps a
+    single open path, so a handle can only be used by one thread at a time.
+    A thread gets a handle for the length of an operation from L{handle} and
+    gives it back for other threads afterwards. Every other attribute is
+    passed to the handle of the calling thread, so the pool can be used in
+    place of a L{NeXusFile}. A thread that uses the pool outside of
+    L{handle} keeps its handle for as long as it runs, like the thread that
+    made the pool.
+
+    @ivar __filename: The name of the file
+    @type __filename: C{string}
+
+    @ivar __access: The access method of the handles
+    @type __access: C{int}
+
+    @ivar __backend: The backend of the handles
+    @type __backend: C{string}
+
+    @ivar __lock: Guards the idle handles, the tree and the generation
+    @type __lock: C{threading.Lock}
+
+    @ivar __local: The handle that each thread is using
+    @type __local: C{threading.local}
+
+    @ivar __idle: The handles that no thread is using
+    @type __idle: C{list}
+
+    @ivar __tree: The directory tree that the handles are primed with
+    @type __tree: C{dict}
+
+    @ivar __generation: The number of times the file was opened again
+    @type __generation: C{int}
+    """
+
+    def __init__(self, filename, access=sns_napi.ACC_READ, backend=None):
+        """
+        Object constructor. The first handle is opened right away and is
+        kept by the calling thread.
+
+        @param filename: The name of the file
+        @type filename: C{string}
+
+        @param access: (OPTIONAL) The access method of the handles. The
+                       default is I{ACC_READ}.
+        @type access: C{int}
+
+        @param backend: (OPTIONAL) The backend of the handles, see
+                        L{NeXusFile}
+        @type backend: C{string}
+        """
+        import threading
+
+        self.__filename = filename
+        self.__access = access
+        self.__backend = backend
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.__idle = []
+        self.__tree = None
+        self.__generation = 0
+        self.__local.entry = self.__acquire()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.__current(), name)
+
+    def filename(self):
+        return self.__filename
+
+    @contextlib.contextmanager
+    def handle(self):
+        """
+        This method gives the calling thread a handle for the length of a
+        C{with} block. A thread that already has a handle keeps using it.
+
+        @return: The handle
+        @rtype: L{NeXusFile}
+        """
+        if getattr(self.__local, "entry", None) is not None:
+            yield self.__current()
+            return
+
+        entry = self.__acquire()
+        self.__local.entry = entry
+        try:
+            yield self.__current()
+        finally:
+            self.__local.entry = None
+            self.__release(entry)
+
+    def prime(self, tree):
+        """
+        This method remembers the nxclass of every node in a directory tree
+        for all of the handles, see L{NeXusFile.prime}. The handles of other
+        threads are primed the next time they are used.
+
+        @param tree: The full path of each node mapped to its nxclass
+        @type tree: C{dict}
+        """
+        self.__lock.acquire()
+        try:
+            self.__tree = tree
+        finally:
+            self.__lock.release()
+        self.__current()
+
+    def reopen(self):
+        """
+        This method opens the file again for all of the handles, see
+        L{NeXusFile.reopen}. The idle handles are closed and the handles of
+        other threads are opened again the next time they are used. No other
+        thread should be reading while this is done.
+        """
+        self.__lock.acquire()
+        try:
+            self.__generation += 1
+            self.__tree = None
+            self.__idle = []
+        finally:
+            self.__lock.release()
+        self.__current()
+
+    def __current(self):
+        # The handle of the calling thread, brought up to date with the
+        # pool. A thread without a handle gets one to keep.
+        entry = getattr(self.__local, "entry", None)
+        if entry is None:
+            entry = self.__acquire()
+            self.__local.entry = entry
+
+        self.__lock.acquire()
+        try:
+            (generation, tree) = (self.__generation, self.__tree)
+        finally:
+            self.__lock.release()
+
+        if entry[0] != generation:
+            entry[2].reopen()
+            entry[0] = generation
+            entry[1] = None
+        if tree is not None and entry[1] is not tree:
+            entry[2].prime(tree)
+            entry[1] = tree
+        return entry[2]
+
+    def __acquire(self):
+        # An idle handle, or a new one if they are all in use. A handle is
+        # kept as its generation, the tree it was primed with and itself.
+        self.__lock.acquire()
+        try:
+            if len(self.__idle) > 0:
+                return self.__idle.pop()
+            generation = self.__generation
+        finally:
+            self.__lock.release()
+
+        return [generation, None,
+                NeXusFile(self.__filename, self.__access, self.__backend)]
+
+    def __release(self, entry):
+        # Gives a handle back unless the file was opened again meanwhile
+        self.__lock.acquire()
+        try:
+            if entry[0] == self.__generation:
+                self.__idle.append(entry)
+        finally:
+            self.__lock.release()
@@ -0,0 +1,341 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import dst_base
+import nexus_dst
+import nexus_file
+import nexus_tree
+import param_map
+import SOM
+
+class NeXusMetaDST(dst_base.DST_BASE):
+    """
+    This class reads the run metadata of a NeXus file without touching the
+    data or the instrument geometry. Only the top of the file is listed: the
+    C{NXentry} groups, their children and the children of their
+    C{NXinstrument} and C{NXsample} groups. The values read are the
+    C{NXentry} level SDSs, the mapped parameters of L{param_map.ParameterMap},
+    the sample information and the instrument name and beamline. This makes
+    it cheap enough to scan a large number of runs for a listing.
+
+    @cvar MIME_TYPE: The MIME-TYPE of the class
+    @type MIME_TYPE: C{string}
+
+    @cvar LISTED_GROUPS: The classes of the groups within an C{NXentry} whose
+                         children are listed
+    @type LISTED_GROUPS: C{tuple} of C{string}s
+
+    @cvar DATA_GROUPS: The classes of the data groups within an C{NXentry}
+    @type DATA_GROUPS: C{tuple} of C{string}s
+
+    @ivar __nexus: The handle to the NeXus file
+    @type __nexus: L{nexus_file.NeXusFile}
+
+    @ivar __tree: The listed part of the file structure
+    @type __tree: L{nexus_tree.NeXusTree}
+
+    @ivar __params: The mapping of parameter names to NeXus paths
+    @type __params: L{param_map.ParameterMap}
+
+    @ivar __inst_info: The reader for the instrument name and beamline
+    @type __inst_info: L{nexus_dst.NeXusInstrument}
+
+    @ivar __sample_info: The reader for the sample information
+    @type __sample_info: L{nexus_dst.SampleInformation}
+    """
+
+    MIME_TYPE = "application/x-NeXusMeta"
+
+    LISTED_GROUPS = ("NXinstrument", "NXsample")
+
+    DATA_GROUPS = ("NXdata", "NXmonitor", "NXevent_data")
+
+    def __init__(self, resource, *args, **kwargs):
+        """
+        Object constructor
+
+        @param resource: The name of the NeXus file
+        @type resource: C{string}
+
+        @param args: Argument objects that the class accepts (UNUSED)
+
+        @param kwargs: A list of keyword arguments that the class accepts:
+
+        @keyword backend: The library used to read the file: I{napi} for the
+                          NeXus API or I{hdf5} to read HDF5 based files
+                          directly. The default is I{napi}.
+        @type backend: C{string}
+        """
+        self.__nexus = nexus_file.NeXusFile(resource,
+                                            backend=kwargs.get("backend"))
+        self.__tree = nexus_tree.NeXusTree(self.__list_tree())
+        self.__nexus.prime(self.__tree)
+        self.__params = param_map.ParameterMap()
+
+        # The geometry of the instrument is only read when it is asked for
+        self.__inst_info = nexus_dst.NeXusInstrument(self.__nexus,
+                                                     self.__tree)
+        inst_name = self.__inst_info.getName()
+        self.__sample_info = nexus_dst.SampleInformation(self.__nexus,
+                                                         self.__tree,
+                                                         inst_name)
+
+    def release_resource(self):
+        """
+        This method closes the file handle to the NeXus file.
+        """
+        del self.__nexus
+        del self.__tree
+        del self.__inst_info
+        del self.__sample_info
+
+    def getEntries(self):
+        """
+        This method returns the C{NXentry} groups of the file.
+
+        @return: The paths of the C{NXentry} groups
+        @rtype: C{list} of C{string}s
+        """
+        return self.__tree.list_type("NXentry")
+
+    def getInstrumentName(self):
+        """
+        This method returns the short name of the instrument.
+
+        @return: The instrument name or I{None} if it is not in the file
+        @rtype: C{string}
+        """
+        return self.__inst_info.getName()
+
+    def getBeamline(self):
+        """
+        This method returns the beamline of the instrument.
+
+        @return: The beamline or I{None} if it is not in the file
+        @rtype: C{string}
+        """
+        return self.__inst_info.getBeamline()
+
+    def getSample(self):
+        """
+        This method returns the sample information.
+
+        @return: The sample information
+        @rtype: L{SOM.Sample}
+        """
+        return self.__sample_info.getSample()
+
+    def getDataGroups(self, entry=None):
+        """
+        This method returns the data groups of an C{NXentry}: the
+        C{NXdata}, C{NXmonitor} and C{NXevent_data} groups directly in it.
+
+        @param entry: (OPTIONAL) The path of the C{NXentry} to look in. The
+                      default is the first C{NXentry}.
+        @type entry: C{string}
+
+
+        @return: The paths of the data groups
+        @rtype: C{list} of C{string}s
+        """
+        if entry is None:
+            entry = self.getEntries()[0]
+
+        groups = []
+        for nxclass in self.DATA_GROUPS:
+            groups.extend(self.__tree.children(entry, nxclass))
+        groups.sort()
+        return groups
+
+    def getDataDims(self, path, signal=1):
+        """
+        This method returns the dimensions of the signal data of a data
+        group. Only the attributes and dimensions of the SDSs in the group
+        are read.
+
+        @param path: The path of the data group
+        @type path: C{string}
+
+        @param signal: (OPTIONAL) The signal number of the data. The default
+                       is I{1}.
+        @type signal: C{int}
+
+
+        @return: The dimensions or I{None} if there is no such signal
+        @rtype: C{tuple} of C{int}s
+        """
+        self.__nexus.openpath(path)
+        names = [name for (name, nxclass) in self.__list_level()
+                 if nxclass == "SDS"]
+
+        for name in names:
+            self.__nexus.openpath(path + "/" + name)
+            self.__nexus.initattrdir()
+            while True:
+                (attr_name, value) = self.__nexus.getnextattr()
+                if attr_name is None:
+                    break
+                if attr_name == "signal" and int(value) == signal:
+                    return tuple(self.__nexus.getdims()[0])
+
+        return None
+
+    def getParameter(self, name, entry=None):
+        """
+        This method reads a parameter of the L{param_map.ParameterMap}.
+
+        @param name: The name of the parameter
+        @type name: C{string}
+
+        @param entry: (OPTIONAL) The path of the C{NXentry} to read from. The
+                      default is the first C{NXentry}.
+        @type entry: C{string}
+
+
+        @return: The value and units of the parameter or I{None} if it is
+                 not in the file
+        @rtype: C{tuple}
+        """
+        return self.getParameters([name], entry)[name]
+
+    def getParameters(self, names, entry=None):
+        """
+        This method reads several parameters of the L{param_map.ParameterMap}
+        in one pass through the file.
+
+        @param names: The names of the parameters
+        @type names: C{list} of C{string}s
+
+        @param entry: (OPTIONAL) The path of the C{NXentry} to read from. The
+                      default is the first C{NXentry}.
+        @type entry: C{string}
+
+
+        @return: The value and units of each parameter keyed by name, I{None}
+                 for a parameter that is not in the file
+        @rtype: C{dict}
+        """
+        if entry is None:
+            entry = self.getEntries()[0]
+
+        return nexus_dst.read_parameters(self.__nexus, self.__params, entry,
+                                         names)
+
+    def getParameterMap(self):
+        """
+        This method returns the mapping used by L{getParameters}. More
+        parameters can be added to it.
+
+        @return: The parameter map
+        @rtype: L{param_map.ParameterMap}
+        """
+        return self.__params
+
+    def getAttributes(self, entry=None):
+        """
+        This method reads the SDSs that sit directly in an C{NXentry}, like
+        the title, run number and proton charge. They are read with
+        L{nexus_dst.read_attributes}, like the attribute list of a
+        L{SOM.SOM} from L{nexus_dst.NeXusDST}.
+
+        @param entry: (OPTIONAL) The path of the C{NXentry} to read from. The
+                      default is the first C{NXentry}.
+        @type entry: C{string}
+
+
+        @return: The values keyed by the SDS name
+        @rtype: C{dict} of L{SOM.NxParameter}s
+        """
+        if entry is None:
+            entry = self.getEntries()[0]
+
+        return nexus_dst.read_attributes(self.__nexus, self.__tree, entry)
+
+    def getMetadata(self, entry=None):
+        """
+        This method collects all of the metadata of a run: the I{filename},
+        I{instrument_name}, I{beamline} and I{sample}, the values of
+        L{getAttributes} and any mapped parameter that is not an C{NXentry}
+        level SDS.
+
+        @param entry: (OPTIONAL) The path of the C{NXentry} to read from. The
+                      default is the first C{NXentry}.
+        @type entry: C{string}
+
+
+        @return: The metadata keyed by name
+        @rtype: C{dict}
+        """
+        if entry is None:
+            entry = self.getEntries()[0]
+
+        metadata = self.getAttributes(entry)
+        names = [name for name in self.__params.getNames()
+                 if not metadata.has_key(name)]
+        for (name, value) in self.getParameters(names, entry).iteritems():
+            if value is not None:
+                metadata[name] = SOM.NxParameter(value[0], value[1])
+
+        metadata["filename"] = self.__nexus.filename()
+        metadata["instrument_name"] = self.getInstrumentName()
+        metadata["beamline"] = self.getBeamline()
+        metadata["sample"] = self.getSample()
+
+        return metadata
+
+    def __list_tree(self):
+        # Lists the NXentry groups and the groups of interest in them
+        listing = {}
+        for (name, nxclass) in self.__list_level():
+            if not nxclass.startswith("NX"):
+                continue
+            path = "/" + name
+            listing[path] = nxclass
+            if nxclass != "NXentry":
+                continue
+
+            self.__nexus.opengroup(name, nxclass)
+            for (child, child_class) in self.__list_level():
+                child_path = path + "/" + child
+                listing[child_path] = child_class
+                if child_class in self.LISTED_GROUPS:
+                    self.__nexus.opengroup(child, child_class)
+                    for (leaf, leaf_class) in self.__list_level():
+                        listing[child_path + "/" + leaf] = leaf_class
+                    self.__nexus.closegroup()
+            self.__nexus.closegroup()
+
+        return listing
+
+    def __list_level(self):
+        # Lists the names and classes in the open group
+        listing = []
+        self.__nexus.initgroupdir()
+        while True:
+            (name, nxclass) = self.__nexus.getnextentry()
+            if name is None:
+                break
+            if nxclass != "CDF0.0":
+                listing.append((name, nxclass))
+        return listing
@@ -0,0 +1,301 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+class NeXusTree(dict):
+    """
+    This class holds the directory tree of a NeXus file as a mapping of the
+    full path of each node to its NeXus class (I{SDS} for data). It also keeps
+    indexes of the paths by class and by parent, so looking up all of the
+    nodes of a class or the children of a group does not scan the tree.
+    Paths are indexed in the order they are added.
+
+    @ivar __classes: The paths of the nodes keyed by NeXus class
+    @type __classes: C{dict}
+
+    @ivar __children: The paths of the nodes keyed by the parent path. Each
+                      level of the path is one lookup, so this works as a
+                      trie over the path components.
+    @type __children: C{dict}
+
+    @ivar __info: The attributes and dimension information of the SDS nodes
+                  that were read while walking the file keyed by path
+    @type __info: C{dict}
+    """
+
+    def __init__(self, listing=None, info=None):
+        """
+        Object constructor
+
+        @param listing: (OPTIONAL) The paths and classes to start the tree
+                        with
+        @type listing: C{dict}
+
+        @param info: (OPTIONAL) The attributes and dimension information of
+                     the SDS nodes keyed by path
+        @type info: C{dict}
+        """
+        dict.__init__(self)
+        self.__classes = {}
+        self.__children = {}
+        self.__info = {}
+        if listing is not None:
+            self.update(listing)
+        if info is not None:
+            self.__info.update(info)
+
+    def __reduce__(self):
+        """
+        This method allows the tree to be pickled. Only the mapping and the
+        SDS information are kept, the indexes are rebuilt when the tree is
+        loaded.
+
+        @return: The constructor and its arguments
+        @rtype: C{tuple}
+        """
+        return (self.__class__, (dict(self), self.__info))
+
+    def __setitem__(self, path, classname):
+        """
+        This method adds a node to the tree or changes the class of an
+        existing node.
+
+        @param path: The full path of the node
+        @type path: C{string}
+
+        @param classname: The NeXus class of the node
+        @type classname: C{string}
+        """
+        if path in self:
+            self.__delitem__(path)
+
+        dict.__setitem__(self, path, classname)
+        self.__classes.setdefault(classname, []).append(path)
+        self.__children.setdefault(get_parent(path), []).append(path)
+
+    def __delitem__(self, path):
+        """
+        This method removes a node from the tree.
+
+        @param path: The full path of the node
+        @type path: C{string}
+        """
+        classname = self[path]
+        dict.__delitem__(self, path)
+        self.__info.pop(path, None)
+        self.__classes[classname].remove(path)
+        self.__children[get_parent(path)].remove(path)
+
+    def clear(self):
+        """
+        This method removes all of the nodes from the tree.
+        """
+        dict.clear(self)
+        self.__classes.clear()
+        self.__children.clear()
+        self.__info.clear()
+
+    def copy(self):
+        """
+        This method makes a copy of the tree.
+
+        @return: The copy of the tree
+        @rtype: C{NeXusTree}
+        """
+        return self.__class__(self, self.__info)
+
+    def pop(self, path, *args):
+        """
+        This method removes a node from the tree and returns its class.
+
+        @param path: The full path of the node
+        @type path: C{string}
+
+        @param args: The value to return if the node is not in the tree
+
+
+        @return: The NeXus class of the node
+        @rtype: C{string}
+        """
+        if path not in self:
+            return dict.pop(self, path, *args)
+
+        classname = self[path]
+        self.__delitem__(path)
+
+        return classname
+
+    def popitem(self):
+        """
+        This method removes a node from the tree and returns it.
+
+        @return: The path and NeXus class of the node
+        @rtype: C{tuple}
+        """
+        (path, classname) = dict.popitem(self)
+        dict.__setitem__(self, path, classname)
+        self.__delitem__(path)
+
+        return (path, classname)
+
+    def setdefault(self, path, classname=None):
+        """
+        This method adds a node to the tree if it is not already present.
+
+        @param path: The full path of the node
+        @type path: C{string}
+
+        @param classname: The NeXus class of the node
+        @type classname: C{string}
+
+
+        @return: The NeXus class of the node
+        @rtype: C{string}
+        """
+        if path not in self:
+            self.__setitem__(path, classname)
+
+        return self[path]
+
+    def update(self, *args, **kwargs):
+        """
+        This method adds the nodes from another mapping to the tree.
+
+        @param args: The mapping of paths to NeXus classes
+
+        @param kwargs: More paths and NeXus classes
+        """
+        for (path, classname) in dict(*args, **kwargs).iteritems():
+            self.__setitem__(path, classname)
+
+    def children(self, path, classname=None):
+        """
+        This method returns the nodes directly inside a group. The lookup
+        only touches the children of the group.
+
+        @param path: The full path of the group. The root is I{/}.
+        @type path: C{string}
+
+        @param classname: (OPTIONAL) Only return the children of this NeXus
+                          class
+        @type classname: C{string}
+
+
+        @return: The full paths of the children
+        @rtype: C{list} of C{string}s
+        """
+        children = self.__children.get(path.rstrip("/") or "/", [])
+        if classname is None:
+            return list(children)
+
+        return [child for child in children
+                if dict.__getitem__(self, child) == classname]
+
+    def getAttributes(self, path):
+        """
+        This method returns the attributes of an SDS that were read while
+        walking the file.
+
+        @param path: The full path of the SDS
+        @type path: C{string}
+
+
+        @return: The attribute values keyed by name or I{None} if the
+                 attributes were not read
+        @rtype: C{dict}
+        """
+        try:
+            return dict(self.__info[path][0])
+        except KeyError:
+            return None
+
+    def getDims(self, path):
+        """
+        This method returns the dimension information of an SDS that was read
+        while walking the file.
+
+        @param path: The full path of the SDS
+        @type path: C{string}
+
+
+        @return: The dimensions and data type as given by
+                 L{nexus_file.NeXusFile.getdims} or I{None} if they were not
+                 read
+        @rtype: C{tuple}
+        """
+        try:
+            return self.__info[path][1]
+        except KeyError:
+            return None
+
+    def hasInfo(self):
+        """
+        This method tells if the SDS information was read while walking the
+        file.
+
+        @return: I{True} if there is SDS information, I{False} if not
+        @rtype: C{boolean}
+        """
+        return len(self.__info) > 0
+
+    def setInfo(self, path, attrs, dims):
+        """
+        This method keeps the attributes and dimension information of an SDS.
+
+        @param path: The full path of the SDS
+        @type path: C{string}
+
+        @param attrs: The attribute values keyed by name
+        @type attrs: C{dict}
+
+        @param dims: The dimensions and data type as given by
+                     L{nexus_file.NeXusFile.getdims}
+        @type dims: C{tuple}
+        """
+        self.__info[path] = (dict(attrs), dims)
+
+    def list_type(self, classname):
+        """
+        This method returns all of the nodes of a NeXus class.
+
+        @param classname: The NeXus class to look for
+        @type classname: C{string}
+
+
+        @return: The full paths of the nodes
+        @rtype: C{list} of C{string}s
+        """
+        return list(self.__classes.get(classname, []))
+
+def get_parent(path):
+    """
+    This function returns the path of the group that holds a node.
+
+    @param path: The full path of the node
+    @type path: C{string}
+
+
+    @return: The full path of the parent group. The root is I{/}.
+    @rtype: C{string}
+    """
+    return path[:path.rfind("/")] or "/"
@@ -28,13 +28,25 @@ class ParameterMap:
     L{Parameter} objects in it. The L{Parameter} objects contain the end path
     location of the information in the NeXus file.
 
+    @cvar TYPES: The parameter types that are understood. I{float}, I{int}
+                 and I{string} are single values, I{array} is all of the
+                 values of an SDS and I{log} is the mean, minimum and maximum
+                 of the I{value} of an C{NXlog}.
+    @type TYPES: C{tuple} of C{string}s
+
     @ivar __pmap: Hash table for C{Parameter} objects
     @type __pmap: C{dict}
     """
+
+    TYPES = ("float", "int", "string", "array", "log")
     
-    def __init__(self):
+    def __init__(self, config=None):
         """
         Class constructor. Initializes all of the currently mapped parameters.
+
+        @param config: (OPTIONAL) The name of a file with more parameters to
+                       map, see L{load}
+        @type config: C{string}
         """
         self.__pmap = {}
 
@@ -42,6 +54,67 @@ class ParameterMap:
         self.__pmap["raw_frames"] = Parameter("raw_frames", "int")
         self.__pmap["total_counts"] = Parameter("total_counts", "int")
 
+        if config is not None:
+            self.load(config)
+
+    def addParameter(self, name, path, type):
+        """
+        Method that maps a parameter, replacing any parameter of the same
+        name.
+
+        @param name: The key name of the parameter
+        @type name: C{string}
+
+        @param path: The NeXus path of the parameter relative to the
+                     C{NXentry}
+        @type path: C{string}
+
+        @param type: The type of the parameter, one of L{TYPES}
+        @type type: C{string}
+
+
+        @raise ValueError: The type is not understood
+        """
+        if type not in ParameterMap.TYPES:
+            raise ValueError("Do not understand parameter type %s" % type)
+        self.__pmap[name] = Parameter(path, type)
+
+    def load(self, config):
+        """
+        Method that maps the parameters listed in a file. Each line holds
+        the key name, the NeXus path relative to the C{NXentry} and the type
+        of a parameter separated by whitespace, like::
+
+          sample_temp  DASlogs/SampleTemp  log
+
+        Blank lines and everything after a I{#} are ignored.
+
+        @param config: The name of the file
+        @type config: C{string}
+
+
+        @raise IOError: The file cannot be read
+
+        @raise ValueError: A line cannot be understood
+        """
+        cfile = open(config, "r")
+        try:
+            for (number, line) in enumerate(cfile):
+                fields = line.split("#")[0].split()
+                if len(fields) == 0:
+                    continue
+                if len(fields) != 3:
+                    raise ValueError("Line %d of %s is not \"name path "
+                                     "type\": %s" % (number + 1, config,
+                                                      line.strip()))
+                try:
+                    self.addParameter(*fields)
+                except ValueError, e:
+                    raise ValueError("Line %d of %s: %s" % (number + 1,
+                                                            config, e))
+        finally:
+            cfile.close()
+
     def getPathAndType(self, name):
         """
         Method that returns a tuple containing NeXus path and the type
@@ -59,6 +132,17 @@ class ParameterMap:
         return (self.__pmap[name].getPath(),
                 self.__pmap[name].getType())
 
+    def getNames(self):
+        """
+        Method that returns the key names of all of the mapped parameters.
+
+        @returns: The sorted key names
+        @rtype: C{list} of C{string}s
+        """
+        names = self.__pmap.keys()
+        names.sort()
+        return names
+
 class Parameter:
     """
     This is a simple class that contains two pieces of information about a
@@ -80,7 +164,7 @@ class Parameter:
         @param path: The NeXus path for the parameter
         @type path: C{string}
         
-        @param type: The type of the parameter
+        @param type: The type of the parameter, one of L{ParameterMap.TYPES}
         @type type: C{string}
         """
         self.__path = path
@@ -0,0 +1,161 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import os
+
+class PixelFilter(object):
+    """
+    This class holds the pixel IDs listed in a mask or ROI file. The file has
+    one pixel ID per line of the form I{bank_i_j} and lines starting with
+    I{#} are comments. The pixels are kept per bank as index arrays, so a
+    bank can be turned into a boolean grid in one step.
+
+    @ivar __pixels: The I{i} and I{j} indices of the listed pixels keyed by
+                    bank
+    @type __pixels: C{dict}
+    """
+
+    def __init__(self, filename):
+        """
+        Object constructor
+
+        @param filename: The name of the mask or ROI file
+        @type filename: C{string}
+
+
+        @raise IOError: The file cannot be read
+        """
+        import numpy
+
+        indices = {}
+        ifile = open(filename, "r")
+        try:
+            for line in ifile:
+                if line.startswith("#"):
+                    continue
+                parts = line.rstrip().split('_')
+                if len(parts) < 3:
+                    continue
+                try:
+                    indices[parts[0]].append((int(parts[1]), int(parts[2])))
+                except KeyError:
+                    indices[parts[0]] = [(int(parts[1]), int(parts[2]))]
+        finally:
+            ifile.close()
+
+        self.__pixels = {}
+        for bank_id in indices:
+            pixels = numpy.array(indices[bank_id], dtype=numpy.intp)
+            self.__pixels[bank_id] = (pixels[:, 0], pixels[:, 1])
+
+    def getBanks(self):
+        """
+        This method returns the banks that have pixels in the file.
+
+        @return: The bank IDs
+        @rtype: C{list} of C{string}s
+        """
+        return self.__pixels.keys()
+
+    def getGrid(self, bank_id, shape):
+        """
+        This method creates a boolean grid for a bank that is I{True} at the
+        pixels listed in the file. Listed pixels outside of the grid are
+        ignored.
+
+        @param bank_id: The name of the bank
+        @type bank_id: C{string}
+
+        @param shape: The number of pixels in each direction of the bank
+        @type shape: C{tuple}
+
+
+        @return: The grid of listed pixels
+        @rtype: C{numpy.ndarray}
+        """
+        import numpy
+
+        grid = numpy.zeros(shape, dtype=bool)
+        try:
+            (i, j) = self.__pixels[bank_id]
+        except KeyError:
+            return grid
+
+        inside = (i >= 0) & (i < shape[0]) & (j >= 0) & (j < shape[1])
+        grid[i[inside], j[inside]] = True
+
+        return grid
+
+    def getPixels(self, bank_id):
+        """
+        This method returns the listed pixel IDs for a bank.
+
+        @param bank_id: The name of the bank
+        @type bank_id: C{string}
+
+
+        @return: The pixel IDs of the form I{(bank, (i, j))}
+        @rtype: C{list} of C{tuple}s
+        """
+        try:
+            (i, j) = self.__pixels[bank_id]
+        except KeyError:
+            return []
+
+        return [(bank_id, pixel) for pixel in zip(i.tolist(), j.tolist())]
+
+__filters__ = {}
+
+def load(filename):
+    """
+    This function returns the compiled L{PixelFilter} for a mask or ROI file.
+    A file is only parsed again when its modification time changes.
+
+    @param filename: The name of the mask or ROI file
+    @type filename: C{string}
+
+
+    @return: The compiled file
+    @rtype: L{PixelFilter}
+
+
+    @raise IOError: The file cannot be read
+    """
+    filename = os.path.abspath(filename)
+    try:
+        mtime = os.stat(filename).st_mtime
+    except OSError, e:
+        raise IOError(str(e))
+
+    try:
+        (cached_mtime, pixel_filter) = __filters__[filename]
+        if cached_mtime == mtime:
+            return pixel_filter
+    except KeyError:
+        pass
+
+    pixel_filter = PixelFilter(filename)
+    __filters__[filename] = (mtime, pixel_filter)
+
+    return pixel_filter
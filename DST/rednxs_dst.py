@@ -129,11 +129,11 @@ class RedNxsDST(dst_base.DST_BASE):
 
         # Reshape the main data
         if so.dim() > 1:
-            y = so.y.toNumPy().reshape(tuple(ddims))
-            var_y = numpy.sqrt(so.var_y.toNumPy()).reshape(tuple(ddims))
+            y = __to_array__(so.y).reshape(tuple(ddims))
+            var_y = numpy.sqrt(__to_array__(so.var_y)).reshape(tuple(ddims))
         else:
-            y = so.y.toNumPy()
-            var_y = numpy.sqrt(so.var_y.toNumPy())
+            y = __to_array__(so.y)
+            var_y = numpy.sqrt(__to_array__(so.var_y))
         
         # Set the data and error blocks
         self.__file.makedata("data", str(y.dtype), ddims)
@@ -151,7 +151,7 @@ class RedNxsDST(dst_base.DST_BASE):
         self.__file.closedata()        
 
         for i, axis in enumerate(so.axis):
-            x = axis.val.toNumPy()
+            x = __to_array__(axis.val)
             self.__file.makedata(xlabels[i], str(x.dtype), adims[i:i+1])
             self.__file.opendata(xlabels[i])
             self.__file.putdata(x)
@@ -214,3 +214,20 @@ class RedNxsDST(dst_base.DST_BASE):
         """
         raise NotImplementedError
 
+def __to_array__(values):
+    """
+    This function returns values as a C{numpy.ndarray}. Values that are
+    already arrays, such as the spectra of a columnar L{SOM.SOM}, are not
+    copied.
+
+    @param values: The values to convert
+    @type values: C{nessi_list.NessiList} or C{numpy.ndarray}
+
+
+    @return: The values as an array
+    @rtype: C{numpy.ndarray}
+    """
+    try:
+        return values.toNumPy()
+    except AttributeError:
+        return numpy.asarray(values)
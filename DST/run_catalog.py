@@ -0,0 +1,431 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+"""
+This module keeps an index of the run metadata of NeXus files in a local
+SQLite database, so that runs can be looked up without opening the files.
+"""
+
+import os
+
+import nexus_dst
+import nexus_meta_dst
+import tree_cache
+
+class RunCatalog(object):
+    """
+    This class indexes the run metadata of the NeXus files in a directory
+    tree. The metadata is read with L{nexus_meta_dst.NeXusMetaDST} by a pool
+    of worker processes and kept in a SQLite database. An update only reads
+    the files that are new or whose modification time or size changed, and
+    drops the files that are gone. A file that cannot be read is kept with
+    its error so it is not read again until it changes.
+
+    @cvar VERSION: The version of the database layout. A database with
+                   another version is rebuilt.
+    @type VERSION: C{int}
+
+    @cvar FILENAME: The name of the database file in the cache directory
+    @type FILENAME: C{string}
+
+    @cvar COLUMNS: The metadata columns of a run
+    @type COLUMNS: C{tuple} of C{string}s
+
+    @ivar __database: The name of the database file
+    @type __database: C{string}
+
+    @ivar __conn: The connection to the database
+    @type __conn: C{sqlite3.Connection}
+    """
+
+    VERSION = 2
+
+    FILENAME = "run_catalog.sqlite"
+
+    COLUMNS = ("filename", "mtime", "size", "instrument", "beamline",
+               "title", "run_number", "proton_charge", "proton_charge_units",
+               "total_counts", "raw_frames", "sample", "error")
+
+    def __init__(self, database=None):
+        """
+        Object constructor
+
+        @param database: (OPTIONAL) The name of the database file. If not
+                         provided, it is L{FILENAME} in the directory from
+                         the I{DOM_CACHE_DIR} environment variable or
+                         I{~/.dom_cache}.
+        @type database: C{string}
+        """
+        import sqlite3
+
+        if database is None:
+            cache_dir = os.environ.get(tree_cache.TreeCache.ENV_NAME,
+                                       os.path.join("~", ".dom_cache"))
+            cache_dir = os.path.expanduser(cache_dir)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            database = os.path.join(cache_dir, RunCatalog.FILENAME)
+
+        self.__database = database
+        self.__conn = sqlite3.connect(database)
+        self.__create_tables()
+
+    def getDatabase(self):
+        """
+        This method returns the name of the database file.
+
+        @return: The database file
+        @rtype: C{string}
+        """
+        return self.__database
+
+    def close(self):
+        """
+        This method closes the connection to the database.
+        """
+        self.__conn.close()
+
+    def update(self, top, pattern="*.nxs", workers=None, backend=None):
+        """
+        This method brings the index of a directory tree up to date.
+
+        @param top: The directory to look for NeXus files in
+        @type top: C{string}
+
+        @param pattern: (OPTIONAL) The shell pattern the file names must
+                        match. The default is I{*.nxs}.
+        @type pattern: C{string}
+
+        @param workers: (OPTIONAL) The number of processes that read the
+                        files. By default the files are read in this
+                        process.
+        @type workers: C{int}
+
+        @param backend: (OPTIONAL) The library used to read the files, see
+                        L{nexus_meta_dst.NeXusMetaDST}
+        @type backend: C{string}
+
+
+        @return: The number of runs I{added}, I{updated}, I{removed} and
+                 I{unchanged} and the number of files that I{failed}
+        @rtype: C{dict}
+        """
+        import fnmatch
+
+        top = os.path.abspath(top)
+        found = {}
+        for (dirpath, dirnames, filenames) in os.walk(top):
+            for name in fnmatch.filter(filenames, pattern):
+                filename = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+                found[filename] = (stat.st_mtime, stat.st_size)
+
+        known = {}
+        prefix = os.path.join(top, "")
+        for (filename, mtime, size) in \
+                self.__conn.execute("SELECT filename, mtime, size FROM runs"):
+            if filename.startswith(prefix):
+                known[filename] = (mtime, size)
+
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0,
+                 "failed": 0}
+        todo = []
+        for filename in sorted(found.keys()):
+            if not known.has_key(filename):
+                stats["added"] += 1
+                todo.append(filename)
+            elif known[filename] != found[filename]:
+                stats["updated"] += 1
+                todo.append(filename)
+            else:
+                stats["unchanged"] += 1
+
+        args = [(filename, backend) for filename in todo]
+        if workers is None or workers < 2 or len(args) < 2:
+            results = map(__index_run__, args)
+        else:
+            import multiprocessing
+            pool = multiprocessing.Pool(min(workers, len(args)))
+            try:
+                results = pool.map(__index_run__, args, chunksize=16)
+            finally:
+                pool.close()
+                pool.join()
+
+        try:
+            for filename in known.keys():
+                if not found.has_key(filename):
+                    self.__remove(filename)
+                    stats["removed"] += 1
+
+            for (filename, record, banks) in results:
+                (record["mtime"], record["size"]) = found[filename]
+                if record["error"] is not None:
+                    stats["failed"] += 1
+                self.__store(record, banks)
+
+            self.__conn.commit()
+        except:
+            self.__conn.rollback()
+            raise
+
+        return stats
+
+    def query(self, instrument=None, sample=None, title=None,
+              run_number=None, min_proton_charge=None,
+              max_proton_charge=None, directory=None):
+        """
+        This method looks up runs in the index. Only the given conditions
+        are applied and files that could not be read are left out. The
+        proton charges are stored in picoCoulombs, so a run whose charge is
+        in units that cannot be converted is left out of a search on the
+        charge.
+
+        @param instrument: (OPTIONAL) The short name of the instrument
+        @type instrument: C{string}
+
+        @param sample: (OPTIONAL) The name of the sample. The shell wildcards
+                       I{*} and I{?} can be used.
+        @type sample: C{string}
+
+        @param title: (OPTIONAL) The title of the run. The shell wildcards
+                      I{*} and I{?} can be used.
+        @type title: C{string}
+
+        @param run_number: (OPTIONAL) The run number
+        @type run_number: C{string}
+
+        @param min_proton_charge: (OPTIONAL) The smallest proton charge in
+                                  picoCoulombs
+        @type min_proton_charge: C{float}
+
+        @param max_proton_charge: (OPTIONAL) The largest proton charge in
+                                  picoCoulombs
+        @type max_proton_charge: C{float}
+
+        @param directory: (OPTIONAL) Only runs below this directory
+        @type directory: C{string}
+
+
+        @return: The runs ordered by instrument and run number. Each run is
+                 a C{dict} of the L{COLUMNS} and the I{banks}, which maps
+                 the path of each data group to its dimensions.
+        @rtype: C{list} of C{dict}s
+        """
+        where = ["error IS NULL"]
+        values = []
+        if instrument is not None:
+            where.append("instrument = ?")
+            values.append(instrument)
+        if sample is not None:
+            where.append("sample GLOB ?")
+            values.append(sample)
+        if title is not None:
+            where.append("title GLOB ?")
+            values.append(title)
+        if run_number is not None:
+            where.append("run_number = ?")
+            values.append(str(run_number))
+        if min_proton_charge is not None:
+            where.append("proton_charge >= ?")
+            values.append(float(min_proton_charge))
+        if max_proton_charge is not None:
+            where.append("proton_charge <= ?")
+            values.append(float(max_proton_charge))
+        if min_proton_charge is not None or max_proton_charge is not None:
+            # A charge in units that cannot be converted is not compared
+            where.append("proton_charge_units = ?")
+            values.append("picoCoulomb")
+        if directory is not None:
+            where.append("substr(filename, 1, ?) = ?")
+            prefix = os.path.join(os.path.abspath(directory), "")
+            values.extend([len(prefix), prefix])
+
+        sql = "SELECT %s FROM runs WHERE %s ORDER BY instrument, " \
+              "CAST(run_number AS INTEGER), filename" \
+              % (", ".join(RunCatalog.COLUMNS), " AND ".join(where))
+
+        return [self.__make_run(row)
+                for row in self.__conn.execute(sql, values).fetchall()]
+
+    def getRun(self, filename):
+        """
+        This method returns the indexed metadata of a file.
+
+        @param filename: The name of the file
+        @type filename: C{string}
+
+
+        @return: The run as in L{query} or I{None} if the file is not
+                 indexed. A file that could not be read has its I{error}
+                 set.
+        @rtype: C{dict}
+        """
+        row = self.__conn.execute("SELECT %s FROM runs WHERE filename = ?" \
+                                  % ", ".join(RunCatalog.COLUMNS),
+                                  (os.path.abspath(filename),)).fetchone()
+        if row is None:
+            return None
+        return self.__make_run(row)
+
+    def __make_run(self, row):
+        # Turns a row of the runs table into a dictionary with its banks
+        run = dict(zip(RunCatalog.COLUMNS, row))
+        run["banks"] = {}
+        for (path, dims) in \
+                self.__conn.execute("SELECT path, dims FROM banks WHERE "
+                                    "filename = ?", (run["filename"],)):
+            if dims is None:
+                run["banks"][path] = None
+            else:
+                run["banks"][path] = tuple([int(dim)
+                                            for dim in dims.split("x")])
+        return run
+
+    def __store(self, record, banks):
+        # Replaces the index entries of a file
+        self.__remove(record["filename"])
+        self.__conn.execute("INSERT INTO runs (%s) VALUES (%s)" \
+                            % (", ".join(RunCatalog.COLUMNS),
+                               ", ".join(["?"] * len(RunCatalog.COLUMNS))),
+                            [record.get(column)
+                             for column in RunCatalog.COLUMNS])
+        for (path, dims) in banks:
+            if dims is not None:
+                dims = "x".join([str(dim) for dim in dims])
+            self.__conn.execute("INSERT INTO banks (filename, path, dims) "
+                                "VALUES (?, ?, ?)",
+                                (record["filename"], path, dims))
+
+    def __remove(self, filename):
+        # Drops the index entries of a file
+        self.__conn.execute("DELETE FROM runs WHERE filename = ?",
+                            (filename,))
+        self.__conn.execute("DELETE FROM banks WHERE filename = ?",
+                            (filename,))
+
+    def __create_tables(self):
+        # Makes the tables, or remakes them if the layout is out of date
+        version = self.__conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != RunCatalog.VERSION:
+            self.__conn.execute("DROP TABLE IF EXISTS runs")
+            self.__conn.execute("DROP TABLE IF EXISTS banks")
+
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS runs ("
+                            "filename TEXT PRIMARY KEY, mtime REAL, "
+                            "size INTEGER, instrument TEXT, beamline TEXT, "
+                            "title TEXT, run_number TEXT, "
+                            "proton_charge REAL, proton_charge_units TEXT, "
+                            "total_counts REAL, raw_frames INTEGER, "
+                            "sample TEXT, error TEXT)")
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS banks ("
+                            "filename TEXT, path TEXT, dims TEXT)")
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS runs_instrument ON "
+                            "runs (instrument, sample)")
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS banks_filename ON "
+                            "banks (filename)")
+        self.__conn.execute("PRAGMA user_version = %d" % RunCatalog.VERSION)
+        self.__conn.commit()
+
+def __index_run__(args):
+    # Reads the metadata of one file, possibly in a worker process. Errors
+    # are returned with the file so one bad file does not stop the update.
+    (filename, backend) = args
+    record = {"filename": filename, "error": None}
+    banks = []
+    try:
+        meta = nexus_meta_dst.NeXusMetaDST(filename, backend=backend)
+        try:
+            metadata = meta.getMetadata()
+            for path in meta.getDataGroups():
+                banks.append((path, meta.getDataDims(path)))
+        finally:
+            meta.release_resource()
+    except Exception, error:
+        record["error"] = "%s: %s" % (error.__class__.__name__, error)
+        return (filename, record, [])
+
+    record["instrument"] = metadata["instrument_name"]
+    record["beamline"] = metadata["beamline"]
+    record["sample"] = metadata["sample"].name
+    for key in ("title", "run_number", "total_counts", "raw_frames"):
+        if metadata.has_key(key):
+            record[key] = metadata[key].getValue()
+    if metadata.has_key("proton_charge"):
+        (record["proton_charge"], record["proton_charge_units"]) = \
+            nexus_dst.convert_proton_charge(
+                metadata["proton_charge"].getValue(),
+                metadata["proton_charge"].getUnits())
+    if record.get("run_number") is not None:
+        record["run_number"] = str(record["run_number"])
+
+    return (filename, record, banks)
+
+if __name__ == "__main__":
+    import optparse
+
+    parser = optparse.OptionParser(usage="%prog [options] update DIR... | "
+                                   "query")
+    parser.add_option("-d", "--database", help="the database file")
+    parser.add_option("-j", "--workers", type="int",
+                      help="the number of processes reading files")
+    parser.add_option("-p", "--pattern", default="*.nxs",
+                      help="the pattern of the file names to index")
+    parser.add_option("-i", "--instrument", help="the instrument to find")
+    parser.add_option("-s", "--sample", help="the sample to find")
+    parser.add_option("-t", "--title", help="the title to find")
+    parser.add_option("-r", "--run-number", help="the run number to find")
+    parser.add_option("--min-charge", type="float",
+                      help="the smallest proton charge to find")
+    parser.add_option("--max-charge", type="float",
+                      help="the largest proton charge to find")
+    (options, args) = parser.parse_args()
+
+    if len(args) == 0 or args[0] not in ("update", "query") or \
+           (args[0] == "update" and len(args) < 2):
+        parser.error("expected update DIR... or query")
+
+    catalog = RunCatalog(options.database)
+    try:
+        if args[0] == "update":
+            for top in args[1:]:
+                stats = catalog.update(top, options.pattern, options.workers)
+                print "%s: %d added, %d updated, %d removed, %d unchanged, " \
+                      "%d failed" % (top, stats["added"], stats["updated"],
+                                     stats["removed"], stats["unchanged"],
+                                     stats["failed"])
+        else:
+            for run in catalog.query(options.instrument, options.sample,
+                                     options.title, options.run_number,
+                                     options.min_charge,
+                                     options.max_charge):
+                print "%s\t%s\t%s\t%s\t%s" % (run["instrument"],
+                                              run["run_number"],
+                                              run["proton_charge"],
+                                              run["sample"], run["filename"])
+    finally:
+        catalog.close()
@@ -0,0 +1,322 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+"""
+This module sums the data of several NeXus runs into a single C{SOM}
+without holding more than one run in memory.
+"""
+
+import contextlib
+
+import nexus_dst
+import SOM
+
+DST_KEYWORDS = ("tree_cache", "prefetch", "backend")
+
+def sumRuns(filenames, som_id=None, so_axis=None, workers=None, **kwds):
+    """
+    This function sums the counts of several NeXus runs. The first run is
+    read with L{nexus_dst.NeXusDST.getSOM} as a columnar C{SOM}, including
+    the instrument geometry and run information. Every other run is read one
+    data group at a time, and its counts and variances are added in place to
+    the blocks of the first run. The L{SOM.NxParameter} metadata, like the
+    proton charge, is added with the usual parameter addition.
+
+    The runs must match: the same instrument, the same pixel IDs in every
+    data group, the same independent axis values and the same geometry. The
+    primary and secondary flight paths and the polar and azimuthal angles of
+    the pixels of each run are checked once against the first run, whose
+    geometry is used for the sum.
+
+    @param filenames: The names of the NeXus files to sum
+    @type filenames: C{list} of C{string}s
+
+    @param som_id: (OPTIONAL) The NeXus data group(s) to sum. If not
+                   provided, the default data groups of the first run are
+                   used.
+    @type som_id: C{tuple} or C{list} of C{tuple}s
+
+    @param so_axis: (OPTIONAL) The name of the independent axis for the
+                    spectra. The default is I{time_of_flight}.
+    @type so_axis: C{string}
+
+    @param workers: (OPTIONAL) The number of processes that read the runs
+                    after the first in parallel. Each process sums its share
+                    of the runs, so up to one run per process is held in
+                    memory.
+    @type workers: C{int}
+
+    @param kwds: A list of keyword arguments that the function accepts. The
+                 I{tree_cache}, I{prefetch} and I{backend} keywords are given
+                 to L{nexus_dst.NeXusDST}, the rest to
+                 L{nexus_dst.NeXusDST.getSOM}.
+
+
+    @return: The summed data
+    @rtype: L{SOM.SOM}
+
+
+    @raise ValueError: No files are given or the runs do not match
+    """
+    filenames = list(filenames)
+    if len(filenames) == 0:
+        raise ValueError("No runs to sum")
+
+    dst_kwds = {}
+    for key in DST_KEYWORDS:
+        if kwds.has_key(key):
+            dst_kwds[key] = kwds.pop(key)
+
+    # The result is always one block per data group
+    for key in ("columnar", "lazy", "workers", "geometry"):
+        kwds.pop(key, None)
+
+    data_dst = nexus_dst.NeXusDST(filenames[0], **dst_kwds)
+    try:
+        if som_id is None:
+            som_ids = data_dst.get_data_groups()
+        elif isinstance(som_id, list):
+            som_ids = list(som_id)
+        else:
+            som_ids = [som_id]
+
+        if len(som_ids) == 1:
+            result = data_dst.getSOM(som_ids[0], so_axis, columnar=True,
+                                     **kwds)
+        else:
+            result = data_dst.getSOM(som_ids, so_axis, columnar=True, **kwds)
+    finally:
+        data_dst.release_resource()
+
+    geometry = [__get_geometry__(result.attr_list.instrument, block.ids)
+                for block in result.getBlocks()]
+
+    args = (som_ids, so_axis, dst_kwds, kwds)
+    if workers is None or workers < 2 or len(filenames) < 3:
+        for filename in filenames[1:]:
+            # Closing the reader releases the run when it does not match
+            with contextlib.closing(__iter_run__(filename, *args)) as run:
+                for (index, part) in run:
+                    __add_part__(result, index, part, filename,
+                                 geometry[index])
+    else:
+        __sum_parallel__(result, filenames[1:], args, workers, geometry)
+
+    return result
+
+def __sum_parallel__(result, filenames, args, workers, geometry):
+    # Splits the runs into one contiguous group per process. Each process
+    # returns the sum of its group, which is then added to the result in the
+    # order of the runs.
+    import multiprocessing
+
+    workers = min(workers, len(filenames))
+    size = (len(filenames) + workers - 1) / workers
+    groups = [filenames[i:i + size] for i in xrange(0, len(filenames), size)]
+
+    pool = multiprocessing.Pool(len(groups))
+    try:
+        for (group, parts) in zip(groups,
+                                  pool.imap(__sum_group_worker__,
+                                            [(group,) + args
+                                             for group in groups])):
+            for (index, part) in enumerate(parts):
+                __add_part__(result, index, part, ", ".join(group),
+                             geometry[index])
+    finally:
+        pool.close()
+        pool.join()
+
+def __sum_group_worker__(args):
+    # Runs in a worker process and sums a group of runs. The data groups are
+    # returned as plain parts so that they can be sent back.
+    filenames = args[0]
+    parts = []
+    for filename in filenames:
+        with contextlib.closing(__iter_run__(filename, *args[1:])) as run:
+            for (index, part) in run:
+                if index == len(parts):
+                    parts.append(part)
+                else:
+                    __add_part__(parts[index], 0, part, filename,
+                                 parts[index].geometry)
+    return parts
+
+def __iter_run__(filename, som_ids, so_axis, dst_kwds, kwds):
+    # Reads a run one data group at a time. Each part is the instrument name,
+    # the NxParameters (first data group only), the geometry of the pixels,
+    # the pixel IDs, the axis values and the counts and variances.
+    data_dst = nexus_dst.NeXusDST(filename, **dst_kwds)
+    try:
+        for (index, som_id) in enumerate(som_ids):
+            bank_kwds = kwds.copy()
+            if len(som_ids) > 1:
+                for key in ("start_id", "end_id"):
+                    if kwds.has_key(key):
+                        bank_kwds[key] = kwds[key][index]
+
+            som = data_dst.getSOM(som_id, so_axis, columnar=True,
+                                  **bank_kwds)
+            if index == 0:
+                nxpars = dict([(key, value)
+                               for (key, value) in som.attr_list.iteritems()
+                               if isinstance(value, SOM.NxParameter)])
+            else:
+                nxpars = {}
+
+            block = som.getBlocks()[0]
+            yield (index, RunPart(som.attr_list["instrument_name"], nxpars,
+                                  __get_geometry__(som.attr_list.instrument,
+                                                   block.ids),
+                                  block.ids, [list(axis)
+                                              for axis in block.axis],
+                                  block.y, block.var_y))
+            del som, block
+    finally:
+        data_dst.release_resource()
+
+class RunPart(object):
+    """
+    This class holds one data group of a run, or of a partial sum of runs,
+    while it is being added to the sum.
+
+    @ivar name: The name of the instrument
+    @type name: C{string}
+
+    @ivar nxpars: The L{SOM.NxParameter}s of the run keyed by name
+    @type nxpars: C{dict}
+
+    @ivar geometry: The flight paths and angles of the pixels, see
+                    L{__get_geometry__}
+    @type geometry: C{dict}
+
+    @ivar ids: The pixel IDs of the spectra
+    @type ids: C{list}
+
+    @ivar axis: The independent axis values
+    @type axis: C{list} of C{list}s
+
+    @ivar y: The counts (spectra x channels)
+    @type y: C{numpy.ndarray}
+
+    @ivar var_y: The squared uncertainties of the counts
+    @type var_y: C{numpy.ndarray}
+    """
+
+    def __init__(self, name, nxpars, geometry, ids, axis, y, var_y):
+        """
+        Object constructor
+
+        @param name: The name of the instrument
+        @type name: C{string}
+
+        @param nxpars: The L{SOM.NxParameter}s of the run keyed by name
+        @type nxpars: C{dict}
+
+        @param geometry: The flight paths and angles of the pixels
+        @type geometry: C{dict}
+
+        @param ids: The pixel IDs of the spectra
+        @type ids: C{list}
+
+        @param axis: The independent axis values
+        @type axis: C{list} of C{list}s
+
+        @param y: The counts (spectra x channels)
+        @type y: C{numpy.ndarray}
+
+        @param var_y: The squared uncertainties of the counts
+        @type var_y: C{numpy.ndarray}
+        """
+        self.name = name
+        self.nxpars = nxpars
+        self.geometry = geometry
+        self.ids = ids
+        self.axis = axis
+        self.y = y
+        self.var_y = var_y
+
+    def getBlocks(self):
+        return [self]
+
+def __add_part__(target, index, part, filename, geometry):
+    # Checks that a data group matches the sum, whose geometry is given, and
+    # adds it in place
+    if isinstance(target, RunPart):
+        name = target.name
+        nxpars = target.nxpars
+    else:
+        name = target.attr_list["instrument_name"]
+        nxpars = target.attr_list
+
+    if part.name != name:
+        raise ValueError("Run %s is from instrument %s, not %s" \
+                         % (filename, part.name, name))
+
+    block = target.getBlocks()[index]
+    if list(block.ids) != list(part.ids):
+        raise ValueError("Run %s has different pixels in data group %d" \
+                         % (filename, index))
+    if [list(axis) for axis in block.axis] != part.axis:
+        raise ValueError("Run %s has a different independent axis in data "
+                         "group %d" % (filename, index))
+    if (geometry is None) != (part.geometry is None):
+        raise ValueError("Run %s has different geometry in data group %d" \
+                         % (filename, index))
+    if geometry is not None:
+        for key in sorted(geometry):
+            if geometry[key] != part.geometry[key]:
+                raise ValueError("Run %s has a different %s in data group "
+                                 "%d" % (filename, key, index))
+
+    block.y += part.y
+    block.var_y += part.var_y
+
+    for (key, value) in part.nxpars.iteritems():
+        if isinstance(nxpars.get(key), SOM.NxParameter):
+            nxpars[key] += value
+
+def __get_geometry__(instrument, ids):
+    # Collects the primary flight path and the secondary flight path, polar
+    # and azimuthal angle of each pixel. A quantity the instrument does not
+    # have is None. Monitor spectra have integer IDs and no pixel geometry.
+    pixels = [pixel_id for pixel_id in ids if isinstance(pixel_id, tuple)]
+    if instrument is None or not pixels:
+        return None
+
+    geometry = {}
+    try:
+        geometry["primary flight path"] = instrument.get_primary(pixels[0])[0]
+    except RuntimeError:
+        geometry["primary flight path"] = None
+
+    for (key, getter) in (("secondary flight path", instrument.get_secondary),
+                          ("polar angle", instrument.get_polar),
+                          ("azimuthal angle", instrument.get_azimuthal)):
+        try:
+            geometry[key] = [getter(pixel_id)[0] for pixel_id in pixels]
+        except RuntimeError:
+            geometry[key] = None
+
+    return geometry
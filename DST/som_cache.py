@@ -0,0 +1,596 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import os
+
+import SOM
+import tree_cache
+
+class SomCache(object):
+    """
+    This class keeps the C{SOM}s read from NeXus files on disk so that a
+    repeated read with the same parameters does not need to open the file.
+    An entry is keyed by the state of the NeXus file (see
+    L{tree_cache.make_file_key}), the data groups, the axis, every keyword
+    given to L{nexus_dst.NeXusDST.getSOM} and the modification times of the
+    mask and ROI files. Each entry is one file holding the metadata as a
+    pickle followed by the spectra as raw C{numpy} arrays, so a hit is read
+    at the speed of the disk. The least recently used entries are removed
+    when the cache grows past its size limit.
+
+    @cvar VERSION: The version of the cache entry layout
+    @type VERSION: C{int}
+
+    @cvar DEFAULT_MAX_SIZE: The default size limit of the cache in bytes
+    @type DEFAULT_MAX_SIZE: C{int}
+
+    @cvar DST_KEYWORDS: The keywords that are given to the
+                        L{nexus_dst.NeXusDST} constructor. They do not change
+                        the data, so they are not part of the key.
+    @type DST_KEYWORDS: C{tuple}
+
+    @ivar __cache_dir: The directory holding the cache entries
+    @type __cache_dir: C{string}
+
+    @ivar __max_size: The size limit of the cache in bytes
+    @type __max_size: C{int}
+
+    @ivar __stats: The number of hits, misses, stores and evictions
+    @type __stats: C{dict}
+    """
+
+    VERSION = 3
+    DEFAULT_MAX_SIZE = 1 << 30
+    DST_KEYWORDS = ("tree_cache", "prefetch", "backend")
+
+    def __init__(self, cache_dir=None, max_size=None):
+        """
+        Object constructor
+
+        @param cache_dir: (OPTIONAL) The directory to keep the cache entries
+                          in. If not provided, the directory comes from the
+                          I{DOM_CACHE_DIR} environment variable or defaults to
+                          I{~/.dom_cache}.
+        @type cache_dir: C{string}
+
+        @param max_size: (OPTIONAL) The size limit of the cache in bytes. The
+                         default is L{DEFAULT_MAX_SIZE}.
+        @type max_size: C{int}
+        """
+        if cache_dir is None:
+            cache_dir = os.environ.get(tree_cache.TreeCache.ENV_NAME,
+                                       os.path.join("~", ".dom_cache"))
+
+        if max_size is None:
+            max_size = SomCache.DEFAULT_MAX_SIZE
+
+        self.__cache_dir = os.path.join(os.path.expanduser(cache_dir),
+                                        "soms")
+        self.__max_size = max_size
+        self.__stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def getCacheDir(self):
+        """
+        This method returns the directory that holds the cache entries.
+
+        @return: The cache directory
+        @rtype: C{string}
+        """
+        return self.__cache_dir
+
+    def getStats(self):
+        """
+        This method returns the number of hits, misses, stores and evictions
+        of this object.
+
+        @return: The counts keyed by I{hits}, I{misses}, I{stores} and
+                 I{evictions}
+        @rtype: C{dict}
+        """
+        return dict(self.__stats)
+
+    def getSOM(self, filename, som_id=None, so_axis=None, **kwds):
+        """
+        This method returns the C{SOM} for a read of a NeXus file from the
+        cache. On a miss the file is read with L{nexus_dst.NeXusDST} and the
+        result is stored. Lazy reads are not cached.
+
+        @param filename: The name of the NeXus file
+        @type filename: C{string}
+
+        @param som_id: (OPTIONAL) The NeXus data group(s) to retrieve
+        @type som_id: C{tuple} or C{list} of C{tuple}s
+
+        @param so_axis: (OPTIONAL) The name of the independent axis for the
+                        spectra
+        @type so_axis: C{string}
+
+        @param kwds: The keywords for L{nexus_dst.NeXusDST} (I{tree_cache},
+                     I{prefetch} and I{backend}) and
+                     L{nexus_dst.NeXusDST.getSOM}
+
+
+        @return: The requested data
+        @rtype: L{SOM.SOM}
+        """
+        import nexus_dst
+
+        dst_kwds = {}
+        som_kwds = {}
+        for key in kwds:
+            if key in SomCache.DST_KEYWORDS:
+                dst_kwds[key] = kwds[key]
+            else:
+                som_kwds[key] = kwds[key]
+
+        use_cache = not som_kwds.get("lazy", False)
+        if use_cache:
+            som = self.get(filename, som_id, so_axis, **som_kwds)
+            if som is not None:
+                return som
+
+        data_dst = nexus_dst.NeXusDST(filename, **dst_kwds)
+        try:
+            som = data_dst.getSOM(som_id, so_axis, **som_kwds)
+        finally:
+            data_dst.release_resource()
+
+        if use_cache:
+            self.put(filename, som, som_id, so_axis, **som_kwds)
+
+        return som
+
+    def get(self, filename, som_id=None, so_axis=None, **kwds):
+        """
+        This method returns the cached C{SOM} for a read of a NeXus file.
+
+        @param filename: The name of the NeXus file
+        @type filename: C{string}
+
+        @param som_id: (OPTIONAL) The NeXus data group(s) of the read
+        @type som_id: C{tuple} or C{list} of C{tuple}s
+
+        @param so_axis: (OPTIONAL) The independent axis of the read
+        @type so_axis: C{string}
+
+        @param kwds: The keywords of the read
+
+
+        @return: The cached C{SOM} or I{None} if there is no valid entry
+        @rtype: L{SOM.SOM}
+        """
+        try:
+            key = make_som_key(filename, som_id, so_axis, **kwds)
+        except (IOError, OSError):
+            self.__stats["misses"] += 1
+            return None
+
+        entry_name = self.__get_entry_name(key)
+        try:
+            entry_file = open(entry_name, "rb")
+        except IOError:
+            self.__stats["misses"] += 1
+            return None
+
+        try:
+            try:
+                som = read_entry(entry_file, key)
+            except Exception:
+                som = None
+        finally:
+            entry_file.close()
+
+        if som is None:
+            self.__remove(entry_name)
+            self.__stats["misses"] += 1
+            return None
+
+        # The modification time orders the entries for eviction
+        try:
+            os.utime(entry_name, None)
+        except OSError:
+            pass
+
+        self.__stats["hits"] += 1
+        return som
+
+    def put(self, filename, som, som_id=None, so_axis=None, **kwds):
+        """
+        This method stores the C{SOM} from a read of a NeXus file. A failure
+        to write the entry is ignored since the cache is only an
+        optimization.
+
+        @param filename: The name of the NeXus file
+        @type filename: C{string}
+
+        @param som: The data from the read
+        @type som: L{SOM.SOM}
+
+        @param som_id: (OPTIONAL) The NeXus data group(s) of the read
+        @type som_id: C{tuple} or C{list} of C{tuple}s
+
+        @param so_axis: (OPTIONAL) The independent axis of the read
+        @type so_axis: C{string}
+
+        @param kwds: The keywords of the read
+        """
+        import tempfile
+
+        if isinstance(som, SOM.LazySOM):
+            return
+
+        try:
+            key = make_som_key(filename, som_id, so_axis, **kwds)
+            if not os.path.isdir(self.__cache_dir):
+                os.makedirs(self.__cache_dir)
+
+            (fd, temp_name) = tempfile.mkstemp(dir=self.__cache_dir,
+                                               suffix=".tmp")
+            temp_file = os.fdopen(fd, "wb")
+            try:
+                write_entry(temp_file, key, som)
+            finally:
+                temp_file.close()
+
+            entry_name = self.__get_entry_name(key)
+            os.rename(temp_name, entry_name)
+        except (IOError, OSError):
+            return
+
+        self.__stats["stores"] += 1
+        self.__evict(entry_name)
+
+    def clear(self):
+        """
+        This method removes all of the cache entries.
+        """
+        for (entry_name, size, mtime) in self.__list_entries():
+            self.__remove(entry_name)
+
+    def __evict(self, keep):
+        # Removes the least recently used entries until the cache fits
+        entries = self.__list_entries()
+        total = sum([size for (entry_name, size, mtime) in entries])
+
+        entries.sort(key=lambda entry: entry[2])
+        for (entry_name, size, mtime) in entries:
+            if total <= self.__max_size:
+                break
+            if entry_name == keep:
+                continue
+            self.__remove(entry_name)
+            total -= size
+            self.__stats["evictions"] += 1
+
+    def __list_entries(self):
+        try:
+            names = os.listdir(self.__cache_dir)
+        except OSError:
+            return []
+
+        entries = []
+        for name in names:
+            if not name.endswith(".som"):
+                continue
+            entry_name = os.path.join(self.__cache_dir, name)
+            try:
+                stats = os.stat(entry_name)
+            except OSError:
+                continue
+            entries.append((entry_name, stats.st_size, stats.st_mtime))
+
+        return entries
+
+    def __get_entry_name(self, key):
+        import hashlib
+        digest = hashlib.md5(repr(key)).hexdigest()
+        return os.path.join(self.__cache_dir, digest + ".som")
+
+    def __remove(self, entry_name):
+        try:
+            os.remove(entry_name)
+        except OSError:
+            pass
+
+def make_som_key(filename, som_id=None, so_axis=None, **kwds):
+    """
+    This function creates the key that identifies a read of a NeXus file. It
+    is made from the key of the file, the data groups, the axis, the
+    keywords of the read and the keys of the mask and ROI files.
+
+    @param filename: The name of the NeXus file
+    @type filename: C{string}
+
+    @param som_id: (OPTIONAL) The NeXus data group(s) of the read
+    @type som_id: C{tuple} or C{list} of C{tuple}s
+
+    @param so_axis: (OPTIONAL) The independent axis of the read
+    @type so_axis: C{string}
+
+    @param kwds: The keywords of the read
+
+
+    @return: The key for the read
+    @rtype: C{tuple}
+
+
+    @raise OSError: If one of the files cannot be accessed
+    """
+    files = []
+    for name in ("mask_file", "roi_file"):
+        if kwds.get(name) is not None:
+            stats = os.stat(kwds[name])
+            files.append((name, os.path.abspath(kwds[name]), stats.st_size,
+                          stats.st_mtime))
+
+    keywords = [(name, __make_token__(kwds[name])) for name in sorted(kwds)]
+
+    return (tree_cache.make_file_key(filename), __make_token__(som_id),
+            so_axis, tuple(keywords), tuple(files))
+
+def __make_token__(value):
+    # Gives a value a form whose repr is complete and stable
+    import hashlib
+
+    if isinstance(value, (list, tuple)):
+        return tuple([__make_token__(item) for item in value])
+
+    if hasattr(value, "dtype") and hasattr(value, "tostring"):
+        return ("array", value.dtype.str, value.shape,
+                hashlib.md5(value.tostring()).hexdigest())
+
+    return value
+
+def write_entry(ofile, key, som):
+    """
+    This function writes a C{SOM} to an open cache entry. The metadata and
+    pixel IDs are pickled, the spectra and axes follow as C{numpy} arrays.
+    Spectra that came from L{SOM.SOBlock}s are written as their blocks.
+
+    @param ofile: The open entry
+    @type ofile: C{file}
+
+    @param key: The key of the entry
+    @type key: C{tuple}
+
+    @param som: The data to write
+    @type som: L{SOM.SOM}
+    """
+    import cPickle
+    import numpy
+
+    arrays = []
+    axes = {}
+    def add_axis(value):
+        # Shared axes are written once
+        if hasattr(value, "getValue"):
+            value = value.getValue()
+        try:
+            return axes[id(value)][0]
+        except KeyError:
+            arrays.append(__to_array__(value))
+            axes[id(value)] = (len(arrays) - 1, value)
+            return len(arrays) - 1
+
+    segments = []
+    for (kind, items) in __get_segments__(som):
+        if kind == "block":
+            ids = items.ids
+            axis = [(add_axis(value), None) for value in items.axis]
+            index = len(arrays)
+            arrays.append(items.y)
+            arrays.append(items.var_y)
+            shared = None
+        else:
+            ids = [so.id for so in items]
+            axis = []
+            for primary in items[0].axis:
+                if primary.var is None:
+                    axis.append((add_axis(primary.val), None))
+                else:
+                    axis.append((add_axis(primary.val),
+                                 add_axis(primary.var)))
+            index = len(arrays)
+            arrays.append(numpy.array([__to_array__(so.y) for so in items]))
+            arrays.append(numpy.array([__to_array__(so.var_y)
+                                       for so in items]))
+            shared = [so.isVarianceShared() for so in items]
+        segments.append((kind, ids, axis, index, shared))
+
+    header = {"title": som.getTitle(),
+              "data_set_type": som.getDataSetType(),
+              "axis_labels": som.getAllAxisLabels(),
+              "axis_units": som.getAllAxisUnits(),
+              "y_label": som.getYLabel(),
+              "y_units": som.getYUnits(),
+              "attr_list": som.attr_list,
+              "segments": segments,
+              "num_arrays": len(arrays)}
+
+    pickler = cPickle.Pickler(ofile, cPickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = __persistent_id__
+    pickler.dump((SomCache.VERSION, key, header))
+
+    for array in arrays:
+        numpy.save(ofile, numpy.ascontiguousarray(array))
+
+def read_entry(ifile, key):
+    """
+    This function reads a C{SOM} from an open cache entry.
+
+    @param ifile: The open entry
+    @type ifile: C{file}
+
+    @param key: The expected key of the entry
+    @type key: C{tuple}
+
+
+    @return: The data or I{None} if the entry does not match the key
+    @rtype: L{SOM.SOM}
+    """
+    import cPickle
+    import dst_utils
+    import numpy
+
+    unpickler = cPickle.Unpickler(ifile)
+    unpickler.persistent_load = __persistent_load__
+    (version, entry_key, header) = unpickler.load()
+    if version != SomCache.VERSION or entry_key != key:
+        return None
+
+    arrays = [numpy.load(ifile) for i in xrange(header["num_arrays"])]
+
+    som = SOM.SOM()
+    som.setTitle(header["title"])
+    som.setDataSetType(header["data_set_type"])
+    som.setAllAxisLabels(header["axis_labels"])
+    som.setAllAxisUnits(header["axis_units"])
+    som.setYLabel(header["y_label"])
+    som.setYUnits(header["y_units"])
+    som.attr_list = header["attr_list"]
+
+    axes = {}
+    def get_axis(index):
+        try:
+            return axes[index]
+        except KeyError:
+            axes[index] = dst_utils.make_nessi_list(arrays[index])
+            return axes[index]
+
+    for (kind, ids, axis, index, shared) in header["segments"]:
+        (y, var_y) = arrays[index:index + 2]
+        if kind == "block":
+            som.appendBlock(SOM.SOBlock(y, var_y, ids,
+                                        [get_axis(val) for (val, var)
+                                         in axis]))
+            continue
+
+        # The lists of the whole segment are made in one go
+        y = dst_utils.make_nessi_lists(y)
+        var_y = iter(dst_utils.make_nessi_lists(
+            var_y.compress(numpy.logical_not(shared), axis=0)))
+        for (so_id, so_y, so_shared) in zip(ids, y, shared):
+            spectrum = SOM.SO(dim=len(axis), id=so_id)
+            spectrum.y = so_y
+            if so_shared:
+                spectrum.shareVariance()
+            else:
+                spectrum.var_y = var_y.next()
+            for (primary, (val, var)) in zip(spectrum.axis, axis):
+                primary.share(get_axis(val))
+                if var is not None:
+                    primary.var = dst_utils.make_nessi_list(arrays[var])
+            som.append(spectrum)
+
+    return som
+
+def __get_segments__(som):
+    # Splits the spectra into the blocks they came from and runs of plain
+    # spectra with the same length, variance pattern and axes. Each segment
+    # is written with the axes of its first spectrum.
+    blocks = som.getBlocks()
+    if len(blocks) > 0:
+        position = 0
+        for block in blocks:
+            for spectrum in som[position:position + len(block)]:
+                if len(spectrum.axis) != len(block.axis) or \
+                       [primary.var for primary in spectrum.axis] != \
+                       [None] * len(block.axis) or \
+                       not __same_values__([primary.val
+                                            for primary in spectrum.axis],
+                                           block.axis):
+                    break
+            else:
+                position += len(block)
+                continue
+            break
+        else:
+            return [("block", block) for block in blocks]
+
+    segments = []
+    for spectrum in som:
+        if len(segments) > 0:
+            first = segments[-1][1][0]
+            if len(first.y) == len(spectrum.y) and \
+                   len(first.axis) == len(spectrum.axis) and \
+                   [primary.var is None for primary in first.axis] == \
+                   [primary.var is None for primary in spectrum.axis] and \
+                   __same_values__([primary.val for primary in first.axis],
+                                   [primary.val
+                                    for primary in spectrum.axis]) and \
+                   __same_values__([primary.var for primary in first.axis],
+                                   [primary.var
+                                    for primary in spectrum.axis]):
+                segments[-1][1].append(spectrum)
+                continue
+        segments.append(("list", [spectrum]))
+
+    return segments
+
+def __same_values__(left, right):
+    # Checks that two lists of axis arrays hold the same values, without
+    # comparing the values of arrays that are shared
+    import numpy
+
+    for (left_value, right_value) in zip(left, right):
+        if hasattr(left_value, "getValue"):
+            left_value = left_value.getValue()
+        if hasattr(right_value, "getValue"):
+            right_value = right_value.getValue()
+        if left_value is right_value:
+            continue
+        if left_value is None or right_value is None or \
+               not numpy.array_equal(__to_array__(left_value),
+                                     __to_array__(right_value)):
+            return False
+    return True
+
+def __to_array__(values):
+    import numpy
+
+    if hasattr(values, "getValue"):
+        # A shared axis
+        values = values.getValue()
+    try:
+        return numpy.asarray(values.toNumPy())
+    except AttributeError:
+        return numpy.asarray(values)
+
+def __persistent_id__(obj):
+    # NessiLists are stored by their values
+    import nessi_list
+
+    if isinstance(obj, nessi_list.NessiList):
+        values = list(obj)
+        if len(values) > 0 and isinstance(values[0], int):
+            return ("i", values)
+        return ("f", values)
+    return None
+
+def __persistent_load__(pid):
+    import dst_utils
+    import numpy
+
+    (type, values) = pid
+    return dst_utils.make_nessi_list(numpy.array(values), type)
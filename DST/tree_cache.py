@@ -0,0 +1,210 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+
+# $Id$
+
+import os
+
+class TreeCache(object):
+    """
+    This class keeps the directory trees of NeXus files on disk so that a file
+    that was already walked does not need to be walked again. Each tree is
+    stored in its own file in the cache directory. An entry is keyed by the
+    absolute path, size and modification time of the NeXus file and a
+    fingerprint of its first and last blocks. An entry whose key does not
+    match the file anymore is thrown away.
+
+    @cvar ENV_NAME: The environment variable that can set the cache directory
+    @type ENV_NAME: C{string}
+
+    @cvar VERSION: The version of the cache entry layout
+    @type VERSION: C{int}
+
+    @cvar FINGERPRINT_SIZE: The number of bytes read from each end of a file
+                            to make its fingerprint
+    @type FINGERPRINT_SIZE: C{int}
+
+    @ivar __cache_dir: The directory holding the cache entries
+    @type __cache_dir: C{string}
+    """
+
+    ENV_NAME = "DOM_CACHE_DIR"
+    VERSION = 1
+    FINGERPRINT_SIZE = 65536
+
+    def __init__(self, cache_dir=None):
+        """
+        Object constructor
+
+        @param cache_dir: (OPTIONAL) The directory to keep the cache entries
+                          in. If not provided, the directory comes from the
+                          I{DOM_CACHE_DIR} environment variable or defaults to
+                          I{~/.dom_cache}.
+        @type cache_dir: C{string}
+        """
+        if cache_dir is None:
+            cache_dir = os.environ.get(TreeCache.ENV_NAME,
+                                       os.path.join("~", ".dom_cache"))
+
+        self.__cache_dir = os.path.join(os.path.expanduser(cache_dir),
+                                        "trees")
+
+    def getCacheDir(self):
+        """
+        This method returns the directory that holds the cache entries.
+
+        @return: The cache directory
+        @rtype: C{string}
+        """
+        return self.__cache_dir
+
+    def get(self, filename):
+        """
+        This method returns the cached tree for a NeXus file.
+
+        @param filename: The name of the NeXus file
+        @type filename: C{string}
+
+
+        @return: The cached tree or I{None} if there is no valid entry
+        @rtype: C{object}
+        """
+        import cPickle
+
+        entry_name = self.__get_entry_name(filename)
+        try:
+            entry_file = open(entry_name, "rb")
+        except IOError:
+            return None
+
+        try:
+            try:
+                (version, key, tree) = cPickle.load(entry_file)
+            except Exception:
+                version = None
+        finally:
+            entry_file.close()
+
+        if version != TreeCache.VERSION or key != make_file_key(filename):
+            self.__remove(entry_name)
+            return None
+
+        return tree
+
+    def put(self, filename, tree):
+        """
+        This method stores the tree for a NeXus file. A failure to write the
+        entry is ignored since the cache is only an optimization.
+
+        @param filename: The name of the NeXus file
+        @type filename: C{string}
+
+        @param tree: The tree for the NeXus file
+        @type tree: C{object}
+        """
+        import cPickle
+        import tempfile
+
+        try:
+            if not os.path.isdir(self.__cache_dir):
+                os.makedirs(self.__cache_dir)
+
+            (fd, temp_name) = tempfile.mkstemp(dir=self.__cache_dir)
+            temp_file = os.fdopen(fd, "wb")
+            try:
+                cPickle.dump((TreeCache.VERSION, make_file_key(filename),
+                              tree), temp_file, cPickle.HIGHEST_PROTOCOL)
+            finally:
+                temp_file.close()
+
+            os.rename(temp_name, self.__get_entry_name(filename))
+        except (IOError, OSError):
+            pass
+
+    def clear(self):
+        """
+        This method removes all of the cache entries.
+        """
+        try:
+            entry_names = os.listdir(self.__cache_dir)
+        except OSError:
+            return
+
+        for entry_name in entry_names:
+            self.__remove(os.path.join(self.__cache_dir, entry_name))
+
+    def __get_entry_name(self, filename):
+        """
+        This method creates the name of the cache entry for a NeXus file.
+
+        @param filename: The name of the NeXus file
+        @type filename: C{string}
+
+
+        @return: The name of the cache entry
+        @rtype: C{string}
+        """
+        import hashlib
+        digest = hashlib.md5(os.path.abspath(filename)).hexdigest()
+        return os.path.join(self.__cache_dir, digest + ".tree")
+
+    def __remove(self, entry_name):
+        try:
+            os.remove(entry_name)
+        except OSError:
+            pass
+
+def make_file_key(filename):
+    """
+    This function creates the key that identifies the current state of a
+    file. It is made from the absolute path, the size, the modification time
+    and an MD5 digest of the first and last blocks of the file.
+
+    @param filename: The name of the file
+    @type filename: C{string}
+
+
+    @return: The key for the file
+    @rtype: C{tuple}
+
+
+    @raise OSError: If the file cannot be accessed
+    """
+    import hashlib
+
+    stats = os.stat(filename)
+    size = stats.st_size
+
+    digest = hashlib.md5()
+    infile = open(filename, "rb")
+    try:
+        digest.update(infile.read(TreeCache.FINGERPRINT_SIZE))
+        if size > TreeCache.FINGERPRINT_SIZE:
+            infile.seek(max(TreeCache.FINGERPRINT_SIZE,
+                            size - TreeCache.FINGERPRINT_SIZE))
+            digest.update(infile.read(TreeCache.FINGERPRINT_SIZE))
+    finally:
+        infile.close()
+
+    return (os.path.abspath(filename), size, stats.st_mtime,
+            digest.hexdigest())
@@ -31,6 +31,7 @@ from instrument import Instrument
 from comp_instrument import CompositeInstrument
 from asg_instrument import ASG_Instrument
 from indexselector import *
+from lazy_som import LazySOM
 from nexus_id import NeXusId
 from nxparameter import NxParameter
 from roi import Roi
@@ -39,6 +40,7 @@ from simpleselector import *
 from som import SOM
 from so import PrimaryAxis
 from so import SO
+from so_block import SOBlock
 
 from DOM_version import version as __version__
 
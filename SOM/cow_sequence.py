@@ -0,0 +1,281 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+
+# $Id$
+
+import nessi_list
+
+class CowSequence(nessi_list.NessiList):
+    """
+    This class wraps an array that is shared between several owners (like the
+    independent axes of all L{SO}s from one detector bank). Reading passes
+    straight through to the shared array. The first change made through the
+    wrapper replaces the shared array with a private copy, both inside the
+    wrapper and on the owning object, so the other owners never see the
+    change. Only changes made through Python are tracked, functions that
+    write into the underlying C buffer directly must be given a copy.
+
+    The wrapper is a C{nessi_list.NessiList} without a buffer of its own. The
+    I{__type__} and I{__array__} of the shared array and the methods of
+    C{nessi_list.NessiList} that are not listed here are passed on to the
+    shared array, so the SCL functions read it like any other list.
+
+    @ivar __owner: The object that holds the wrapper as an attribute
+    @type __owner: C{object}
+
+    @ivar __name: The name of the attribute on the owner
+    @type __name: C{string}
+
+    @ivar __value: The array that all reads and writes go to
+    @type __value: C{nessi_list.NessiList} or sequence
+
+    @ivar __shared: Flag to tell if the array is still the shared one
+    @type __shared: C{boolean}
+    """
+
+    def __init__(self, owner, name, value):
+        """
+        Object constructor
+
+        @param owner: The object that holds the wrapper as an attribute
+        @type owner: C{object}
+
+        @param name: The name of the attribute on the owner
+        @type name: C{string}
+
+        @param value: The shared array
+        @type value: C{nessi_list.NessiList} or sequence
+        """
+        # The base constructor is not called, the values live in the shared
+        # array
+        self.__owner = owner
+        self.__name = name
+        self.__value = value
+        self.__shared = True
+
+    def isShared(self):
+        """
+        This method tells if the wrapper still refers to the shared array.
+
+        @return: I{True} if no private copy has been made, I{False} otherwise
+        @rtype: C{boolean}
+        """
+        return self.__shared
+
+    def getValue(self):
+        """
+        This method returns the array that the wrapper reads from. While the
+        wrapper is shared this is the shared array itself.
+
+        @return: The wrapped array
+        @rtype: C{nessi_list.NessiList} or sequence
+        """
+        return self.__value
+
+    def __detach(self):
+        """
+        This method makes the private copy of the shared array and places it
+        on the owning object.
+
+        @return: The private array
+        @rtype: C{nessi_list.NessiList} or sequence
+        """
+        if self.__shared:
+            import copy
+            self.__value = copy.deepcopy(self.__value)
+            self.__shared = False
+            setattr(self.__owner, self.__name, self.__value)
+        return self.__value
+
+    def __unwrap(self, other):
+        if isinstance(other, CowSequence):
+            return other.__value
+        return other
+
+    # ----- reading
+    def __getattr__(self, name):
+        # Private and special names are not passed on, pickle and copy look
+        # them up before the wrapped array is set
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.__value, name)
+
+    # The NessiList protocol of the SCL functions
+    __type__ = property(lambda self: self.__value.__type__)
+
+    __array__ = property(lambda self: self.__value.__array__)
+
+    def __len__(self):
+        return len(self.__value)
+
+    def __getitem__(self, index):
+        return self.__value[index]
+
+    def __getslice__(self, start, stop):
+        return self.__value[start:stop]
+
+    def __iter__(self):
+        return iter(self.__value)
+
+    def __reversed__(self):
+        return reversed(self.__value)
+
+    def __contains__(self, item):
+        return item in self.__value
+
+    def __eq__(self, other):
+        return self.__value == self.__unwrap(other)
+
+    def __ne__(self, other):
+        return self.__value != self.__unwrap(other)
+
+    def __str__(self):
+        return str(self.__value)
+
+    def __repr__(self):
+        return repr(self.__value)
+
+    def __add__(self, other):
+        return self.__value + self.__unwrap(other)
+
+    def __radd__(self, other):
+        return self.__unwrap(other) + self.__value
+
+    def __sub__(self, other):
+        return self.__value - self.__unwrap(other)
+
+    def __rsub__(self, other):
+        return self.__unwrap(other) - self.__value
+
+    def __mul__(self, other):
+        return self.__value * self.__unwrap(other)
+
+    def __rmul__(self, other):
+        return self.__unwrap(other) * self.__value
+
+    def __div__(self, other):
+        return self.__value / self.__unwrap(other)
+
+    def __truediv__(self, other):
+        return self.__value / self.__unwrap(other)
+
+    def __neg__(self):
+        return -self.__value
+
+    def __copy__(self):
+        import copy
+        return copy.copy(self.__value)
+
+    def __deepcopy__(self, memo):
+        # The copy is private to the owner. The shared array is not looked
+        # up in the memo, or the copied owners (like the values and the
+        # variance of one spectrum) would silently write into one array.
+        import copy
+        return copy.deepcopy(self.__value)
+
+    def __reduce_ex__(self, protocol):
+        # Only the wrapper state is stored, the base class would store the
+        # empty buffer of the wrapper
+        import copy_reg
+        return (copy_reg.__newobj__, (CowSequence,), self.__dict__)
+
+    # ----- writing
+    def __setitem__(self, index, value):
+        self.__detach()[index] = value
+
+    def __delitem__(self, index):
+        del self.__detach()[index]
+
+    def __setslice__(self, start, stop, value):
+        self.__detach()[start:stop] = value
+
+    def __delslice__(self, start, stop):
+        del self.__detach()[start:stop]
+
+    def __iadd__(self, other):
+        value = self.__detach()
+        value += self.__unwrap(other)
+        return value
+
+    def __isub__(self, other):
+        value = self.__detach()
+        value -= self.__unwrap(other)
+        return value
+
+    def __imul__(self, other):
+        value = self.__detach()
+        value *= self.__unwrap(other)
+        return value
+
+    def __idiv__(self, other):
+        value = self.__detach()
+        value /= self.__unwrap(other)
+        return value
+
+    __itruediv__ = __idiv__
+
+    def append(self, item):
+        self.__detach().append(item)
+
+    def extend(self, *args):
+        self.__detach().extend(*args)
+
+    def insert(self, index, item):
+        self.__detach().insert(index, item)
+
+    def pop(self, *args):
+        return self.__detach().pop(*args)
+
+    def remove(self, item):
+        self.__detach().remove(item)
+
+    def reverse(self):
+        self.__detach().reverse()
+
+    def sort(self, *args, **kwargs):
+        self.__detach().sort(*args, **kwargs)
+
+def __forward__(name):
+    # Creates a method that reads the shared array
+    def forward(self, *args, **kwargs):
+        return getattr(self.getValue(), name)(*args, **kwargs)
+    forward.__name__ = name
+    return forward
+
+def __add_forwards__():
+    # Every other method of NessiList only reads, it has to go to the shared
+    # array instead of the empty buffer of the wrapper
+    import inspect
+
+    skip = ("__init__", "__new__", "__getattribute__", "__setattr__",
+            "__delattr__", "__reduce__", "__reduce_ex__", "__getstate__",
+            "__setstate__", "__sizeof__", "__subclasshook__")
+    for base in inspect.getmro(nessi_list.NessiList):
+        if base is object:
+            continue
+        for (name, value) in base.__dict__.items():
+            if callable(value) and name not in skip and \
+                   name not in CowSequence.__dict__:
+                setattr(CowSequence, name, __forward__(name))
+
+__add_forwards__()
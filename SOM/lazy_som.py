@@ -0,0 +1,418 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+
+# $Id$
+
+import som
+
+class LazySOM(som.SOM):
+    """
+    This class is a L{SOM} whose L{SO}s are created the first time they are
+    accessed. The C{LazySOM} holds the pixel IDs of all of its spectra and,
+    for each group of IDs, a factory function that creates the L{SO} for a
+    given ID. Created spectra are kept in a bounded cache with the least
+    recently used spectrum thrown away first, so it will be created again by
+    the factory on the next access.
+
+    A spectrum whose I{y}, I{var_y} or axis values were changed after it was
+    created cannot be created again, so it is pinned in memory instead of
+    being thrown away. Pinned spectra do not count against the cache size
+    and are only thrown away by L{invalidate}, which loses the changes.
+
+    Iteration, indexing, C{len()}, C{in}, C{reversed()}, I{index},
+    I{count}, L{getSO} and L{toXY} behave like they do for a L{SOM}. List
+    operations that reorder or remove spectra are not supported, use
+    L{materialize} to get a L{SOM} for those. Copying or pickling a
+    C{LazySOM} creates all of its spectra and gives a L{SOM}.
+
+    @cvar DEFAULT_CACHE_SIZE: The default number of spectra kept in memory
+    @type DEFAULT_CACHE_SIZE: C{int}
+
+    @ivar __ids__: The pixel IDs of all of the spectra
+    @type __ids__: C{list}
+
+    @ivar __starts__: The index of the first spectrum for each factory
+    @type __starts__: C{list} of C{int}s
+
+    @ivar __factories__: The functions that create the spectra. They take a
+                         pixel ID and return a L{SO}.
+    @type __factories__: C{list} of C{function}s
+
+    @ivar __cache__: The created spectra and the checksums of their values in
+                     least to most recently used order
+    @type __cache__: C{collections.OrderedDict}
+
+    @ivar __pinned__: The changed spectra keyed by their index
+    @type __pinned__: C{dict}
+
+    @ivar __cache_size__: The maximum number of spectra kept in the cache
+    @type __cache_size__: C{int}
+    """
+
+    DEFAULT_CACHE_SIZE = 1024
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Object constructor
+
+        @param cache_size: The maximum number of spectra kept in memory
+        @type cache_size: C{int}
+
+
+        @raise ValueError: If the cache size is less than one
+        """
+        import collections
+
+        som.SOM.__init__(self)
+
+        if cache_size < 1:
+            raise ValueError("Cache size must be at least 1, not %d" \
+                             % cache_size)
+
+        self.__ids__ = []
+        self.__starts__ = []
+        self.__factories__ = []
+        self.__cache__ = collections.OrderedDict()
+        self.__pinned__ = {}
+        self.__cache_size__ = cache_size
+
+    def appendLazy(self, ids, factory):
+        """
+        This method adds spectra that will be created when they are first
+        accessed.
+
+        @param ids: The pixel IDs of the spectra to add
+        @type ids: C{list}
+
+        @param factory: The function that creates the L{SO} for a pixel ID
+        @type factory: C{function}
+        """
+        if len(ids) == 0:
+            return
+
+        self.__starts__.append(len(self.__ids__))
+        self.__factories__.append(factory)
+        self.__ids__.extend(ids)
+
+    def replaceLazy(self, other):
+        """
+        This method replaces all of the spectra with the spectra of another
+        C{LazySOM}. The spectra created so far are thrown away, including
+        the pinned ones.
+
+        @param other: Object holding the spectra to take over
+        @type other: L{LazySOM}
+        """
+        self.__ids__ = other.getIds()
+        self.__starts__ = list(other.__starts__)
+        self.__factories__ = list(other.__factories__)
+        self.__cache__.clear()
+        self.__pinned__.clear()
+
+    def append(self, so):
+        """
+        This method adds an already created L{SO} to the C{LazySOM}.
+
+        @param so: The spectrum to add
+        @type so: L{SO}
+        """
+        self.appendLazy([so.id], lambda so_id: so)
+
+    def extend(self, sos):
+        """
+        This method adds already created L{SO}s to the C{LazySOM}.
+
+        @param sos: The spectra to add
+        @type sos: C{list} of L{SO}s
+        """
+        for so in sos:
+            self.append(so)
+
+    def getCacheSize(self):
+        """
+        This method returns the maximum number of spectra kept in memory.
+
+        @return: The size of the spectrum cache
+        @rtype: C{int}
+        """
+        return self.__cache_size__
+
+    def getPinned(self):
+        """
+        This method returns the pixel IDs of the spectra that are pinned in
+        memory because they were changed.
+
+        @return: The pixel IDs
+        @rtype: C{list}
+        """
+        return [self.__ids__[index] for index in sorted(self.__pinned__)]
+
+    def getIds(self):
+        """
+        This method returns the pixel IDs of all of the spectra without
+        creating them.
+
+        @return: The pixel IDs
+        @rtype: C{list}
+        """
+        import copy
+        return copy.copy(self.__ids__)
+
+    def getSO(self, pixel_id):
+        """
+        This method returns a L{SO} based on the provided pixel ID. If the
+        L{SO} is not found, I{None} is returned. Only the requested spectrum
+        is created.
+
+        @param pixel_id: The identification tag for the pixel
+        @type pixel_id: C{various}
+
+
+        @return: The requested data object.
+        @rtype: L{SO}
+        """
+        try:
+            return self[self.__ids__.index(pixel_id)]
+        except ValueError:
+            return None
+
+    def invalidate(self, ids=None):
+        """
+        This method throws away created spectra so that they are created again
+        on the next access. Changes to pinned spectra are lost.
+
+        @param ids: (OPTIONAL) The pixel IDs of the spectra to throw away. If
+                    not provided, all spectra are thrown away.
+        @type ids: C{list}
+        """
+        if ids is None:
+            self.__cache__.clear()
+            self.__pinned__.clear()
+            return
+
+        for index in self.__cache__.keys():
+            if self.__ids__[index] in ids:
+                del self.__cache__[index]
+        for index in self.__pinned__.keys():
+            if self.__ids__[index] in ids:
+                del self.__pinned__[index]
+
+    def materialize(self):
+        """
+        This method creates all of the spectra and places them in a L{SOM}
+        with the same metadata.
+
+        @return: The fully created dataset
+        @rtype: L{SOM}
+        """
+        result = som.SOM()
+        result.copyAttributes(self)
+        for so in self:
+            result.append(so)
+        return result
+
+    def __len__(self):
+        """
+        This method returns the number of spectra without creating them.
+
+        @return: The number of spectra
+        @rtype: C{int}
+        """
+        return len(self.__ids__)
+
+    def __iter__(self):
+        """
+        This method iterates over the spectra, creating them as needed.
+
+        @return: The next spectrum
+        @rtype: L{SO}
+        """
+        for index in xrange(len(self.__ids__)):
+            yield self.__get_so(index)
+
+    def __getitem__(self, index):
+        """
+        This method returns the spectrum (or a C{list} of spectra for a slice)
+        at the requested index, creating it if needed.
+
+        @param index: The position of the spectrum
+        @type index: C{int} or C{slice}
+
+
+        @return: The requested spectrum or spectra
+        @rtype: L{SO} or C{list} of L{SO}s
+
+
+        @raise IndexError: If the index is out of range
+        """
+        if isinstance(index, slice):
+            return [self.__get_so(i) \
+                    for i in xrange(*index.indices(len(self.__ids__)))]
+
+        if index < 0:
+            index += len(self.__ids__)
+        if index < 0 or index >= len(self.__ids__):
+            raise IndexError("LazySOM index out of range")
+
+        return self.__get_so(index)
+
+    def __getslice__(self, start, stop):
+        return self.__getitem__(slice(start, stop))
+
+    def __reversed__(self):
+        for index in xrange(len(self.__ids__) - 1, -1, -1):
+            yield self.__get_so(index)
+
+    def __contains__(self, so):
+        for spectrum in self:
+            if spectrum == so:
+                return True
+        return False
+
+    def index(self, so, start=0, stop=None):
+        """
+        This method returns the position of the first spectrum equal to the
+        given one, creating the spectra as needed.
+
+        @param so: The spectrum to look for
+        @type so: L{SO}
+
+        @param start: (OPTIONAL) The first position to look at
+        @type start: C{int}
+
+        @param stop: (OPTIONAL) The position to stop looking before
+        @type stop: C{int}
+
+
+        @return: The position of the spectrum
+        @rtype: C{int}
+
+
+        @raise ValueError: If the spectrum is not in the C{LazySOM}
+        """
+        if stop is None:
+            stop = len(self.__ids__)
+        for index in xrange(*slice(start, stop).indices(len(self.__ids__))):
+            if self.__get_so(index) == so:
+                return index
+        raise ValueError("LazySOM.index(x): x not in LazySOM")
+
+    def count(self, so):
+        """
+        This method returns the number of spectra equal to the given one,
+        creating the spectra as needed.
+
+        @param so: The spectrum to count
+        @type so: L{SO}
+
+
+        @return: The number of equal spectra
+        @rtype: C{int}
+        """
+        return len([spectrum for spectrum in self if spectrum == so])
+
+    def __iadd__(self, sos):
+        self.extend(sos)
+        return self
+
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles are made from the created spectra, the
+        # factories cannot be copied
+        result = self.materialize()
+        return (som.SOM, (), result.__dict__, iter(result))
+
+    def __get_so(self, index):
+        """
+        This method returns the spectrum at a valid index from the cache or
+        creates it with the appropriate factory. The least recently used
+        spectrum is pinned instead of thrown away when it was changed.
+
+        @param index: The position of the spectrum
+        @type index: C{int}
+
+
+        @return: The requested spectrum
+        @rtype: L{SO}
+        """
+        try:
+            return self.__pinned__[index]
+        except KeyError:
+            pass
+
+        try:
+            entry = self.__cache__.pop(index)
+        except KeyError:
+            import bisect
+            factory = self.__factories__[bisect.bisect_right(self.__starts__,
+                                                             index) - 1]
+            spectrum = factory(self.__ids__[index])
+            entry = (spectrum, __checksum__(spectrum))
+            if len(self.__cache__) >= self.__cache_size__:
+                (old_index, (old, checksum)) = \
+                            self.__cache__.popitem(last=False)
+                if __checksum__(old) != checksum:
+                    self.__pinned__[old_index] = old
+
+        self.__cache__[index] = entry
+        return entry[0]
+
+    def __not_supported(self, *args, **kwargs):
+        raise NotImplementedError("Operation is not supported by LazySOM, "\
+                                  +"use materialize() first")
+
+    __setitem__ = __not_supported
+    __delitem__ = __not_supported
+    __setslice__ = __not_supported
+    __delslice__ = __not_supported
+    insert = __not_supported
+    pop = __not_supported
+    remove = __not_supported
+    reverse = __not_supported
+    sort = __not_supported
+    __add__ = __not_supported
+    __radd__ = __not_supported
+    __mul__ = __not_supported
+    __rmul__ = __not_supported
+    __imul__ = __not_supported
+
+def __checksum__(spectrum):
+    # Sums up the values of a spectrum to find out whether it was changed
+    import numpy
+    import zlib
+
+    values = [spectrum.y, spectrum.var_y]
+    for axis in spectrum.axis:
+        values.extend([axis.val, axis.var])
+
+    result = []
+    for value in values:
+        if value is None:
+            result.append(None)
+            continue
+        try:
+            array = value.toNumPy()
+        except AttributeError:
+            array = value
+        array = numpy.ascontiguousarray(array)
+        result.append((array.dtype.str, zlib.crc32(array.data)))
+    return result
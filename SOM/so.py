@@ -22,6 +22,7 @@
 
 # $Id$
 
+import cow_sequence
 import nessi_list
 
 class SO:
@@ -80,6 +81,37 @@ class SO:
             self.axis.append(PrimaryAxis(i+1, **kwargs))
         self.__dim = dim
 
+    def shareVariance(self):
+        """
+        This method makes the squared uncertainties of the dependent axis an
+        implicit alias of its values, as for raw counts with Poisson
+        statistics. Both the values and the squared uncertainties read the
+        same array until one of them is changed, which gives the changed one
+        its own copy. Both stay C{nessi_list.NessiList}s for the SCL
+        functions, but functions that write into the underlying C buffer
+        directly must be given a copy.
+        """
+        value = self.y
+        if isinstance(value, cow_sequence.CowSequence):
+            value = value.getValue()
+        self.y = cow_sequence.CowSequence(self, "y", value)
+        self.var_y = cow_sequence.CowSequence(self, "var_y", value)
+
+    def isVarianceShared(self):
+        """
+        This method tells if the squared uncertainties of the dependent axis
+        are still an implicit alias of its values.
+
+        @return: I{True} if the values and squared uncertainties are the same
+                 array, I{False} otherwise
+        @rtype: C{boolean}
+        """
+        try:
+            return self.y.isShared() and self.var_y.isShared() and \
+                   self.y.getValue() is self.var_y.getValue()
+        except AttributeError:
+            return False
+
     def dim(self):
         """
         This method returns the dimension of the C{SO}.
@@ -136,10 +168,10 @@ class SO:
         @rtype: C{boolean}
         """        
         try:
-            if self.y != other.y:
+            if __values_differ__(self.y, other.y):
                 return False
 
-            if self.var_y != other.var_y:
+            if __values_differ__(self.var_y, other.var_y):
                 return False
             
             if len(self.axis) != len(other.axis):
@@ -169,6 +201,34 @@ class SO:
         """                
         return not self.__eq__(other)
 
+def __values_differ__(left, right):
+    """
+    This function compares two value arrays. It handles the element-wise
+    comparison results of arrays (like the row views of a L{SOBlock}) as well
+    as the single result of C{nessi_list.NessiList} comparisons.
+
+    @param left: The first array to compare
+    @type left: C{nessi_list.NessiList} or C{numpy.ndarray}
+
+    @param right: The second array to compare
+    @type right: C{nessi_list.NessiList} or C{numpy.ndarray}
+
+
+    @return: I{True} if the arrays are different, I{False} if they are not
+    @rtype: C{boolean}
+    """
+    if left is None or right is None:
+        return left is not right
+
+    if len(left) != len(right):
+        return True
+
+    differ = left != right
+    try:
+        return bool(differ.any())
+    except AttributeError:
+        return differ
+
 class PrimaryAxis:
     """
     This class handles the values and error^2 arrays for an independent axis.
@@ -226,6 +286,17 @@ class PrimaryAxis:
             self.var = None
         self.pid = id
 
+    def share(self, value):
+        """
+        This method sets the values of the C{PrimaryAxis} to an array that is
+        shared with other axes. The array is copied the first time it is
+        changed through this axis, so the other axes are not affected.
+
+        @param value: The shared axis values
+        @type value: C{nessi_list.NessiList}
+        """
+        self.val = cow_sequence.CowSequence(self, "val", value)
+
     def __len__(self):
         """
         This method returns the length of the C{PrimaryAxis}. The length is
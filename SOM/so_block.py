@@ -0,0 +1,131 @@
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+
+# $Id$
+
+import so
+
+class SOBlock(object):
+    """
+    This class holds the dependent axis information for a group of L{SO}s
+    (usually a full detector bank) as two contiguous 2-D arrays with the shape
+    (spectra x channels). The L{SO}s handed out by the class do not own their
+    data, their I{y} and I{var_y} members are row views into the block. This
+    means that changing a value through a spectrum (C{so.y[i] = value})
+    changes the block and that operations over the whole block only touch a
+    single buffer.
+
+    @ivar y: The dependent axis values for all spectra in the block
+    @type y: C{numpy.ndarray}
+
+    @ivar var_y: The squared uncertainties of the dependent axis values for
+                 all spectra in the block
+    @type var_y: C{numpy.ndarray}
+
+    @ivar ids: The pixel IDs for the spectra in the block. The index of an ID
+               in the list is the row of the spectrum in the block.
+    @type ids: C{list}
+
+    @ivar axis: The independent axis values shared by every spectrum created
+                from the block
+    @type axis: C{list} of C{nessi_list.NessiList}s
+    """
+
+    def __init__(self, y, var_y=None, ids=None, axis=None):
+        """
+        Object constructor
+
+        @param y: The dependent axis values. A 1-D sequence is treated as a
+                  block with a single spectrum.
+        @type y: C{numpy.ndarray} or sequence
+
+        @param var_y: (OPTIONAL) The squared uncertainties of the dependent
+                      axis values. If not provided, a copy of I{y} is used.
+        @type var_y: C{numpy.ndarray} or sequence
+
+        @param ids: (OPTIONAL) The pixel IDs of the spectra. If not provided,
+                    the row numbers are used.
+        @type ids: C{list}
+
+        @param axis: (OPTIONAL) The independent axis values for the spectra
+        @type axis: C{list} of C{nessi_list.NessiList}s
+
+
+        @raise ValueError: If the shapes of I{y}, I{var_y} and I{ids} do not
+                           agree
+        """
+        import numpy
+
+        self.y = numpy.asarray(y)
+        if self.y.ndim == 1:
+            self.y = self.y.reshape(1, -1)
+
+        if var_y is None:
+            self.var_y = self.y.copy()
+        else:
+            self.var_y = numpy.asarray(var_y).reshape(self.y.shape)
+
+        if ids is None:
+            self.ids = range(self.y.shape[0])
+        else:
+            self.ids = list(ids)
+
+        if len(self.ids) != self.y.shape[0]:
+            raise ValueError("Number of IDs (%d) does not match number of "
+                             "spectra (%d)" % (len(self.ids),
+                                               self.y.shape[0]))
+
+        if axis is None:
+            self.axis = []
+        else:
+            self.axis = axis
+
+    def __len__(self):
+        """
+        This method returns the number of spectra in the C{SOBlock}.
+
+        @return: The number of spectra
+        @rtype: C{int}
+        """
+        return self.y.shape[0]
+
+    def getSO(self, index):
+        """
+        This method creates a L{SO} whose dependent axis arrays are views of
+        the requested row in the block. The independent axes are shared with
+        the other spectra of the block until they are changed.
+
+        @param index: The row of the spectrum in the block
+        @type index: C{int}
+
+
+        @return: The spectrum object for the requested row
+        @rtype: L{SO}
+        """
+        spectrum = so.SO(dim=max(len(self.axis), 1), id=self.ids[index])
+        spectrum.y = self.y[index]
+        spectrum.var_y = self.var_y[index]
+        for i in xrange(len(self.axis)):
+            spectrum.axis[i].share(self.axis[i])
+
+        return spectrum
@@ -62,6 +62,10 @@ class SOM(list):
     @ivar dst: The pointer to the file containing the data for the dataset.
                B{NOTE}: This is currently unused.
     @type dst: L{DST}
+
+    @ivar __blocks__: The contiguous data blocks that back the L{SO}s added
+                      via L{appendBlock}
+    @type __blocks__: C{list} of L{SOBlock}s
     """
     
     EMPTY = ""
@@ -79,6 +83,7 @@ class SOM(list):
         
         self.attr_list = attribute.AttributeList()
         self.dst = None
+        self.__blocks__ = []
 
     def __eq__(self, other):
         """
@@ -181,6 +186,20 @@ class SOM(list):
                 self.attr_list[key_to_get] = \
                                        copy.copy(other.attr_list[key_to_get])
 
+    def appendBlock(self, block):
+        """
+        This method adds all of the spectra held by a L{SOBlock} to the
+        C{SOM}. The added L{SO}s are views into the block, so the data is not
+        copied. The block is kept so that operations over the whole C{SOM}
+        can work directly on the contiguous arrays.
+
+        @param block: Object containing the spectra to add
+        @type block: L{SOBlock}
+        """
+        self.__blocks__.append(block)
+        for i in xrange(len(block)):
+            self.append(block.getSO(i))
+
     def axisUnitsAt(self, units):
         """
         This method returns the axis index (starting from zero) according to
@@ -241,6 +260,39 @@ class SOM(list):
         """        
         return self.__axis_units__[dim]
 
+    def getBlocks(self):
+        """
+        This method returns the contiguous data blocks that back the
+        C{SOM}s spectra. The list is empty if no spectra were added with
+        L{appendBlock}. It is also empty once the spectra no longer match
+        the rows of the blocks in order, for example after spectra were
+        added, removed, reordered or given new arrays through the list
+        methods.
+
+        @return: The data blocks of the C{SOM}
+        @rtype: C{list} of L{SOBlock}s
+        """
+        import copy
+
+        if not self.__blocks_match():
+            return []
+        return copy.copy(self.__blocks__)
+
+    def __blocks_match(self):
+        # Checks that the spectra are the rows of the blocks in order
+        if sum([len(block) for block in self.__blocks__]) != len(self):
+            return False
+
+        position = 0
+        for block in self.__blocks__:
+            for i in xrange(len(block)):
+                spectrum = self[position]
+                if not __is_row__(spectrum.y, block.y, i) or \
+                       not __is_row__(spectrum.var_y, block.var_y, i):
+                    return False
+                position += 1
+        return True
+
     def getDataSetType(self):
         """
         This method returns the dataset type of this C{SOM}.
@@ -504,6 +556,31 @@ class SOM(list):
 
         return arrays
         
+def __is_row__(value, array, index):
+    """
+    This function checks that an array is a view of one row of a 2-D array.
+
+    @param value: The array to check
+    @type value: C{numpy.ndarray}
+
+    @param array: The 2-D array
+    @type array: C{numpy.ndarray}
+
+    @param index: The row of the 2-D array
+    @type index: C{int}
+
+
+    @return: I{True} if the array is the row, I{False} if it is not
+    @rtype: C{boolean}
+    """
+    try:
+        row = array[index]
+        return value.shape == row.shape and value.strides == row.strides \
+               and value.__array_interface__["data"][0] == \
+               row.__array_interface__["data"][0]
+    except (AttributeError, TypeError):
+        return False
+
 if __name__ == "__main__":
     import so
     import asg_instrument
@@ -1,7 +1,6 @@
 import DST
 import math
 import numpy
-import sns_timing
 import SOM
 import sys
 
@@ -29,146 +28,156 @@ def __calc_polar(xi, yi, zi):
 def __calc_azi(xi, yi):
     return math.atan2(yi, xi)
 
-filename = sys.argv[1]
-try:
-    temp = sys.argv[2]
-    debug = True
-except IndexError:
-    debug = False
+def __get_bank_frame(nexus, main_path):
+    # The arrays keep the shape of the datasets, like [1, 6], so they are
+    # flattened before they are indexed
 
-# Setup output file
-outtag = filename.split('/')[-1].split('_')[0]
-outfilename = outtag + "_geom.txt"
-outfile = open(outfilename, "w")
+    # Get the bank orienatation matrix
+    orient_path = main_path + "/origin/orientation/value"
+    nexus.openpath(orient_path)
+    orient = nexus.getdata("n").astype(numpy.float64).ravel()
 
-timer = sns_timing.DiffTime()
+    # Fill out rest of 3x3 matrix
+    orient = numpy.concatenate((orient, numpy.cross(orient[0:3],
+                                                    orient[3:6])))
 
-data_dst = DST.getInstance("application/x-NeXus", filename) 
-timer.getTime(msg="After reading data ")
+    # Put orientation matrix in correct order
+    orientm = orient.reshape(3, 3).T
 
-SOM_ids = data_dst.get_SOM_ids()
+    # Get the bank translation point
+    trans_path = main_path + "/origin/translation/distance"
+    nexus.openpath(trans_path)
+    translation = nexus.getdata("n").astype(numpy.float64).ravel()
 
-# Get the bank numbers sorted in proper order
-bank_list = [SOM_id[0].split('/')[-1] for SOM_id in SOM_ids if SOM_id[1] == 1]
-bank_nums = [int(id.replace('bank', '')) for id in bank_list
-             if not id.startswith("monitor")]
-bank_nums.sort()
+    return (orientm, translation)
 
-signsx = [-1.0, 1.0]
-signsy1 = signsx
-signsy2 = [1.0, -1.0] 
+if __name__ == "__main__":
+    filename = sys.argv[1]
+    try:
+        temp = sys.argv[2]
+        debug = True
+    except IndexError:
+        debug = False
 
-timer.getTime(False)
+    # Setup output file
+    outtag = filename.split('/')[-1].split('_')[0]
+    outfilename = outtag + "_geom.txt"
+    outfile = open(outfilename, "w")
 
-# Grabbing file handle
-nexus = data_dst.getResource()
+    import sns_timing
+    timer = sns_timing.DiffTime()
 
-for bank_num in bank_nums:
-    bank_id = "bank" + str(bank_num)
-    main_path = "/entry/instrument/" + bank_id
-    inst_path = "/entry/" + bank_id
+    data_dst = DST.getInstance("application/x-NeXus", filename) 
+    timer.getTime(msg="After reading data ")
 
-    print bank_id
+    SOM_ids = data_dst.get_SOM_ids()
 
-    # Get the bank geometry
-    cur_geom = data_dst.getInstrument(inst_path)
+    # Get the bank numbers sorted in proper order
+    bank_list = [SOM_id[0].split('/')[-1] for SOM_id in SOM_ids
+                 if SOM_id[1] == 1]
+    bank_nums = [int(id.replace('bank', '')) for id in bank_list
+                 if not id.startswith("monitor")]
+    bank_nums.sort()
 
-    # Get the number of pixels in each direction of the bank
-    nx = cur_geom.get_num_x()
-    ny = cur_geom.get_num_y()
+    signsx = [-1.0, 1.0]
+    signsy1 = signsx
+    signsy2 = [1.0, -1.0] 
 
-    # Get the bank orienatation matrix
-    orient_path = main_path + "/origin/orientation/value"
-    nexus.openpath(orient_path)
-    orient = nexus.getdata()
+    timer.getTime(False)
 
-    # Fill out rest of 3x3 matrix
-    orient.append(orient[1]*orient[5] - orient[2]*orient[4])
-    orient.append(orient[2]*orient[3] - orient[0]*orient[5])
-    orient.append(orient[0]*orient[4] - orient[1]*orient[3])
+    # Grabbing file handle
+    nexus = data_dst.getResource()
 
-    # Put orientation matrix in correct order
-    orientm = orient.toNumPy().reshape(3, 3).T
+    for bank_num in bank_nums:
+        bank_id = "bank" + str(bank_num)
+        main_path = "/entry/instrument/" + bank_id
+        inst_path = "/entry/" + bank_id
 
-    if debug:
-        print "Orientation:", orientm
+        print bank_id
 
-    # Get the bank translation point
-    trans_path = main_path + "/origin/translation/distance"
-    nexus.openpath(trans_path)
-    translation = nexus.getdata().toNumPy()
-
-    if debug:
-        print "Translation:", translation
-    
-    for i in xrange(nx):
-        for j in xrange(ny):
-            # Make the pixel ID
-            nexus_id = SOM.NeXusId(bank_id, i, j)
-
-            if debug:
-                print nexus_id
-
-            print >> outfile, nexus_id.toJoinedStr()
-                
-            # Get pixel center
-            x = cur_geom.get_x_pix_offset(nexus_id.toTuple())
-            y = cur_geom.get_y_pix_offset(nexus_id.toTuple())
-
-            # Get indicies for nearest neighbors
-            xindex = nexus_id.getXindex() + 1
-            if xindex == nx:
-                xindex -= 2
-
-            yindex = nexus_id.getYindex() + 1
-            if yindex == ny:
-                yindex -= 2                
-
-            # Make pixel ID for nearest x direction neighbor
-            xneighbor_id = SOM.NeXusId(nexus_id.getDetId(), xindex,
-                                       nexus_id.getYindex())
-
-            yneighbor_id = SOM.NeXusId(nexus_id.getDetId(), 
-                                       nexus_id.getXindex(),
-                                       yindex)
-            
-            # Get x and y from x and y neighbors
-            xp = cur_geom.get_x_pix_offset(xneighbor_id.toTuple())
-            yp = cur_geom.get_y_pix_offset(yneighbor_id.toTuple())
-
-            # Get half width and half height from pixel centers
-            hdw = math.fabs(x - xp) * 0.5
-            hdh = math.fabs(y - yp) * 0.5
-
-            polar_angles = []
-            azi_angles = []
-
-            # Make each corner and calculate the polar and azimuthal angles
-            for signx in signsx:
-                if signx < 0:
-                    signs = signsy1
-                else:
-                    signs = signsy2
-                for signy in signs:
-                    cpt = numpy.array([x+(signx*hdw), y+(signy*hdh), 0.0])
-                    if debug:
-                        print "Corner Pt:", cpt
-                    values = __get_corner(cpt, translation, orientm, debug)
-                    polar_angles.append(values[0])
-                    azi_angles.append(values[1])
-
-            if debug:
-                print "Polar:", polar_angles
-                print "Azi:", azi_angles
-
-            for polar_angle in polar_angles:
-                print >> outfile, polar_angle,
-
-            print >> outfile, EMPTY
-
-            for azi_angle in azi_angles:
-                print >> outfile, azi_angle,
-
-            print >> outfile, EMPTY            
-
-timer.getTime(msg="After calculating and writing data ")
+        # Get the bank geometry
+        cur_geom = data_dst.getInstrument(inst_path)
+
+        # Get the number of pixels in each direction of the bank
+        nx = cur_geom.get_num_x()
+        ny = cur_geom.get_num_y()
+
+        (orientm, translation) = __get_bank_frame(nexus, main_path)
+
+        if debug:
+            print "Orientation:", orientm
+
+        if debug:
+            print "Translation:", translation
+
+        for i in xrange(nx):
+            for j in xrange(ny):
+                # Make the pixel ID
+                nexus_id = SOM.NeXusId(bank_id, i, j)
+
+                if debug:
+                    print nexus_id
+
+                print >> outfile, nexus_id.toJoinedStr()
+
+                # Get pixel center
+                x = cur_geom.get_x_pix_offset(nexus_id.toTuple())
+                y = cur_geom.get_y_pix_offset(nexus_id.toTuple())
+
+                # Get indicies for nearest neighbors
+                xindex = nexus_id.getXindex() + 1
+                if xindex == nx:
+                    xindex -= 2
+
+                yindex = nexus_id.getYindex() + 1
+                if yindex == ny:
+                    yindex -= 2                
+
+                # Make pixel ID for nearest x direction neighbor
+                xneighbor_id = SOM.NeXusId(nexus_id.getDetId(), xindex,
+                                           nexus_id.getYindex())
+
+                yneighbor_id = SOM.NeXusId(nexus_id.getDetId(), 
+                                           nexus_id.getXindex(),
+                                           yindex)
+
+                # Get x and y from x and y neighbors
+                xp = cur_geom.get_x_pix_offset(xneighbor_id.toTuple())
+                yp = cur_geom.get_y_pix_offset(yneighbor_id.toTuple())
+
+                # Get half width and half height from pixel centers
+                hdw = math.fabs(x - xp) * 0.5
+                hdh = math.fabs(y - yp) * 0.5
+
+                polar_angles = []
+                azi_angles = []
+
+                # Make each corner and calculate the polar and azimuthal angles
+                for signx in signsx:
+                    if signx < 0:
+                        signs = signsy1
+                    else:
+                        signs = signsy2
+                    for signy in signs:
+                        cpt = numpy.array([x+(signx*hdw), y+(signy*hdh), 0.0])
+                        if debug:
+                            print "Corner Pt:", cpt
+                        values = __get_corner(cpt, translation, orientm, debug)
+                        polar_angles.append(values[0])
+                        azi_angles.append(values[1])
+
+                if debug:
+                    print "Polar:", polar_angles
+                    print "Azi:", azi_angles
+
+                for polar_angle in polar_angles:
+                    print >> outfile, polar_angle,
+
+                print >> outfile, EMPTY
+
+                for azi_angle in azi_angles:
+                    print >> outfile, azi_angle,
+
+                print >> outfile, EMPTY            
+
+    timer.getTime(msg="After calculating and writing data ")
@@ -28,6 +28,10 @@
 
 // python
 #include <Python.h>
+#include <pythread.h>
+#ifdef HAVE_NUMPY
+#include <numpy/arrayobject.h>
+#endif
 // nexus
 #include <napi.h>
 // C++
@@ -38,14 +42,41 @@
 #include <stdexcept>
 #include <string>
 
-enum res_type {FLOAT,INT,PYTHON};
+enum res_type {FLOAT,INT,PYTHON,NUMPY};
 
 static int GROUP_STRING_LEN=80;
 static PyObject *module;
+
+// The NeXus library and the file format libraries below it are not thread
+// safe, so every call into them holds this lock. The calls that read data
+// wait for the lock and read with the interpreter lock released so other
+// python threads keep running. Any thread waiting for the lock has released
+// the interpreter lock first, so the two cannot deadlock.
+static PyThread_type_lock napi_lock=NULL;
+
+static void NeXusFile_acquire()
+{
+  if(!PyThread_acquire_lock(napi_lock,NOWAIT_LOCK)){
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(napi_lock,WAIT_LOCK);
+    Py_END_ALLOW_THREADS
+  }
+}
+
+// Holds the lock for the rest of the full expression it is created in
+class NeXusFile_guard
+{
+public:
+  NeXusFile_guard(){ NeXusFile_acquire(); }
+  ~NeXusFile_guard(){ PyThread_release_lock(napi_lock); }
+};
+
+#define NX_LOCKED(call) ((void)NeXusFile_guard(),(call))
+
 static void NeXusFile_privateclose(void *file)
 {
   NXhandle handle=static_cast<NXhandle>(file);
-  NXclose(&handle);
+  NX_LOCKED(NXclose(&handle));
   return;
 }
 
@@ -306,6 +337,86 @@ static PyObject * NeXusFile_convertobj(void * value,int type, long length,res_ty
   return NeXusFile_convertobj2(value,type,length,result_type);
 }
 
+#ifdef HAVE_NUMPY
+static int NeXusFile_numpytype(int type)
+{
+  switch(type){
+  case NX_FLOAT32:
+    return NPY_FLOAT32;
+  case NX_FLOAT64:
+    return NPY_FLOAT64;
+  case NX_INT8:
+    return NPY_INT8;
+  case NX_UINT8:
+    return NPY_UINT8;
+  case NX_INT16:
+    return NPY_INT16;
+  case NX_UINT16:
+    return NPY_UINT16;
+  case NX_INT32:
+    return NPY_INT32;
+  case NX_UINT32:
+    return NPY_UINT32;
+  default:
+    return -1;
+  }
+}
+
+static void NeXusFile_freebuffer(void *data)
+{
+  NXfree(&data);
+  return;
+}
+#endif
+
+/*
+ * Wrap a buffer from NXmalloc in a numpy array of the native type without
+ * copying. The array takes ownership of the buffer and releases it with
+ * NXfree when it is deleted. On success the caller's pointer is cleared.
+ */
+static PyObject * NeXusFile_tonumpy(void **data, int type, int rank,
+                                    int *dims)
+{
+#ifdef HAVE_NUMPY
+  int typenum=NeXusFile_numpytype(type);
+  if(typenum<0){
+    PyErr_SetString(PyExc_TypeError,"Do not understand type");
+    return NULL;
+  }
+
+  npy_intp np_dims[NX_MAXRANK];
+  for( int i=0 ; i<rank ; i++ )
+    np_dims[i]=dims[i];
+
+  PyObject *result=PyArray_SimpleNewFromData(rank,np_dims,typenum,*data);
+  if(result==NULL)
+    return NULL;
+
+  PyObject *base=PyCObject_FromVoidPtr(*data,NeXusFile_freebuffer);
+  if(base==NULL){
+    Py_DECREF(result);
+    return NULL;
+  }
+#if NPY_API_VERSION >= 0x00000007
+  if(PyArray_SetBaseObject(reinterpret_cast<PyArrayObject *>(result),
+                           base)<0){
+    Py_DECREF(base);
+    Py_DECREF(result);
+    return NULL;
+  }
+#else
+  PyArray_BASE(reinterpret_cast<PyArrayObject *>(result))=base;
+#endif
+
+  *data=NULL;
+  return result;
+#else
+  PyErr_SetString(PyExc_NotImplementedError,
+                  "sns_napi was built without numpy support");
+  return NULL;
+#endif
+}
+
 //NXopen(filename,access)
 static PyObject * NeXusFile_open(PyObject *, PyObject *args)
 {
@@ -319,7 +430,7 @@ static PyObject * NeXusFile_open(PyObject *, PyObject *args)
 
   // open the file
   NXhandle handle;
-  if(NXopen(filename,(NXaccess)access,&handle)!=NX_OK){
+  if(NX_LOCKED(NXopen(filename,(NXaccess)access,&handle))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"Could not open file");
     return NULL;
   }
@@ -350,7 +461,7 @@ static PyObject *NeXusFile_opengroup(PyObject *, PyObject *args)
   NXhandle handle=static_cast<NXhandle>(PyCObject_AsVoidPtr(pyhandle));
 
   // do the work
-  if(NXopengroup(handle,name,nxclass)!=NX_OK){
+  if(NX_LOCKED(NXopengroup(handle,name,nxclass))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"opengroup failed");
     return NULL;
   }
@@ -369,7 +480,7 @@ static PyObject *NeXusFile_closegroup(PyObject *, PyObject *args)
   NXhandle handle=static_cast<NXhandle>(PyCObject_AsVoidPtr(pyhandle));
 
   // do the work
-  if(NXclosegroup(handle)!=NX_OK){
+  if(NX_LOCKED(NXclosegroup(handle))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"closegroup failed");
     return NULL;
   }
@@ -389,7 +500,7 @@ static PyObject *NeXusFile_openpath(PyObject *, PyObject *args)
   NXhandle handle=static_cast<NXhandle>(PyCObject_AsVoidPtr(pyhandle));
 
   // do the work
-  if(NXopenpath(handle,path)!=NX_OK){
+  if(NX_LOCKED(NXopenpath(handle,path))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"openpath failed");
     return NULL;
   }
@@ -409,7 +520,7 @@ static PyObject *NeXusFile_opengrouppath(PyObject *, PyObject *args)
   NXhandle handle=static_cast<NXhandle>(PyCObject_AsVoidPtr(pyhandle));
 
   // do the work
-  if(NXopengrouppath(handle,path)!=NX_OK){
+  if(NX_LOCKED(NXopengrouppath(handle,path))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"opengrouppath failed");
     return NULL;
   }
@@ -443,7 +554,7 @@ static PyObject *NeXusFile_opendata(PyObject *, PyObject *args)
   NXhandle handle=static_cast<NXhandle>(PyCObject_AsVoidPtr(pyhandle));
 
   // do the work
-  if(NXopendata(handle,name)!=NX_OK){
+  if(NX_LOCKED(NXopendata(handle,name))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"opendata failed");
     return NULL;
   }
@@ -469,7 +580,7 @@ static PyObject *NeXusFile_closedata(PyObject *, PyObject *args)
   NXhandle handle=static_cast<NXhandle>(PyCObject_AsVoidPtr(pyhandle));
 
   // do the work
-  if(NXclosedata(handle)!=NX_OK){
+  if(NX_LOCKED(NXclosedata(handle))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"opendata failed");
     return NULL;
   }
@@ -488,6 +599,7 @@ static res_type get_res_type(PyObject *pytype){
   std::string float_type("f");
   std::string int_type("i");
   std::string python_type("p");
+  std::string numpy_type("n");
   /*  PyObject *float_type=PyString_FromString("f");
   PyObject *int_type=PyString_FromString("i");
   PyObject *python_type=PyString_FromString("p");
@@ -502,12 +614,15 @@ static res_type get_res_type(PyObject *pytype){
     return INT;
   if(python_type==ctype)
     return PYTHON;
+  if(numpy_type==ctype)
+    return NUMPY;
 
   throw std::invalid_argument("Do not understand type");
 }
 
 char * NeXusFile_getdata_doc=
-  "getdata(handle,type='f')";
+  "getdata(handle,type='f') - type 'n' returns a numpy array of the\n"
+  "native type that owns the data buffer";
 
 //NXgetdata(handle,data)
 static PyObject *NeXusFile_getdata(PyObject *, PyObject *args)
@@ -525,7 +640,7 @@ static PyObject *NeXusFile_getdata(PyObject *, PyObject *args)
   int rank=0;
   int type=0;
   int dims[NX_MAXRANK];
-  if(NXgetinfo(handle,&rank,dims,&type)!=NX_OK){
+  if(NX_LOCKED(NXgetinfo(handle,&rank,dims,&type))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"In getdata: getinfo failed");
     return NULL;
   }
@@ -538,10 +653,24 @@ static PyObject *NeXusFile_getdata(PyObject *, PyObject *args)
   }
 
   // get the data
-  if(NXgetdata(handle,data)!=NX_OK){
+  NXstatus status;
+  Py_BEGIN_ALLOW_THREADS
+  PyThread_acquire_lock(napi_lock,WAIT_LOCK);
+  status=NXgetdata(handle,data);
+  PyThread_release_lock(napi_lock);
+  Py_END_ALLOW_THREADS
+  if(status!=NX_OK){
     PyErr_SetString(PyExc_IOError,"In getdata: getdata failed");
     return NULL;
   }
+  // hand the buffer to a numpy array
+  if(result_type==NUMPY && type!=NX_CHAR){
+    PyObject *array=NeXusFile_tonumpy(&data,type,rank,dims);
+    if(array==NULL)
+      NXfree(&data);
+    return array;
+  }
+
   // calculate the total length of the data as a 1D array
   long tot_len=1;
   for( int i=0 ; i<rank ; i++ ){
@@ -607,7 +736,8 @@ static const char * formatgetSlabError(const int rank, const int * start,
 }
 
 char * NeXusFile_getslab_doc=
-  "getslab(handle,start,size,type='f')";
+  "getslab(handle,start,size,type='f') - type 'n' returns a numpy array of\n"
+  "the native type that owns the data buffer";
 
 //NXgetslab(handle,data,start[],size[])
 static PyObject *NeXusFile_getslab(PyObject *, PyObject *args)
@@ -634,7 +764,7 @@ static PyObject *NeXusFile_getslab(PyObject *, PyObject *args)
   int rank=0;
   int type=0;
   int dims[NX_MAXRANK];
-  if(NXgetinfo(handle,&rank,dims,&type)!=NX_OK){
+  if(NX_LOCKED(NXgetinfo(handle,&rank,dims,&type))!=NX_OK){
     PyErr_SetString(PyExc_IOError,
                     formatgetSlabError(rank, start, size, type, "getinfo failed"));
     return NULL;
@@ -650,13 +780,27 @@ static PyObject *NeXusFile_getslab(PyObject *, PyObject *args)
   }
 
   // get the data
-  if(NXgetslab(handle,data,start,size)!=NX_OK){
+  NXstatus status;
+  Py_BEGIN_ALLOW_THREADS
+  PyThread_acquire_lock(napi_lock,WAIT_LOCK);
+  status=NXgetslab(handle,data,start,size);
+  PyThread_release_lock(napi_lock);
+  Py_END_ALLOW_THREADS
+  if(status!=NX_OK){
     PyErr_SetString(PyExc_IOError,
                     formatgetSlabError(rank, start, size, type, "getslab failed"));
     NXfree(&data);
     return NULL;
   }
 
+  // hand the buffer to a numpy array
+  if(result_type==NUMPY && type!=NX_CHAR){
+    PyObject *array=NeXusFile_tonumpy(&data,type,rank,size);
+    if(array==NULL)
+      NXfree(&data);
+    return array;
+  }
+
   // calculate the total length of the data as a 1D array
   long tot_len=1;
   for( int i=0 ; i<rank ; i++ ){
@@ -690,12 +834,12 @@ static PyObject *NeXusFile_getattr(PyObject *, PyObject *args)
   NXhandle handle=static_cast<NXhandle>(PyCObject_AsVoidPtr(pyhandle));
 
   // get ready to look for the attribute
-  if(NXinitattrdir(handle)!=NX_OK){
+  if(NX_LOCKED(NXinitattrdir(handle))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"In getattr: initattrdir failed");
     return NULL;
   }
   int num_attr;
-  if(NXgetattrinfo(handle,&num_attr)!=NX_OK){
+  if(NX_LOCKED(NXgetattrinfo(handle,&num_attr))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"In getattr: getattrinfo failed");
     return NULL;
   }
@@ -706,7 +850,7 @@ static PyObject *NeXusFile_getattr(PyObject *, PyObject *args)
   // look for the attribute
   bool found=false;
   for( int i=0 ; i<num_attr ; i++ ){
-    if(NXgetnextattr(handle,attr_name,&attr_len,&attr_type)!=NX_OK){
+    if(NX_LOCKED(NXgetnextattr(handle,attr_name,&attr_len,&attr_type))!=NX_OK){
       PyErr_SetString(PyExc_IOError,"In getattr: getattrinfo failed");
       return NULL;
     }
@@ -728,7 +872,7 @@ static PyObject *NeXusFile_getattr(PyObject *, PyObject *args)
       PyErr_SetString(PyExc_IOError,"In getattr: malloc failed");
       return NULL;
   }
-  if(NXgetattr(handle,attr_name,attr_value,attr_dims,&attr_type)!=NX_OK){
+  if(NX_LOCKED(NXgetattr(handle,attr_name,attr_value,attr_dims,&attr_type))!=NX_OK){
       PyErr_SetString(PyExc_IOError,"In getattr: getattr failed");
       return NULL;
   }
@@ -773,7 +917,7 @@ static PyObject *NeXusFile_flush(PyObject *, PyObject *args)
   NXhandle handle=static_cast<NXhandle>(PyCObject_AsVoidPtr(pyhandle));
 
   // find out about the data we are about to read
-  if(NXflush(&handle)!=NX_OK){
+  if(NX_LOCKED(NXflush(&handle))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"flush failed");
     return NULL;
   }
@@ -795,7 +939,7 @@ static PyObject *NeXusFile_getinfo(PyObject *, PyObject *args)
   int rank;
   int dims[NX_MAXRANK];
   int type;
-  if(NXgetinfo(handle,&rank,dims,&type)!=NX_OK){
+  if(NX_LOCKED(NXgetinfo(handle,&rank,dims,&type))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"getinfo failed");
     return NULL;
   }
@@ -831,7 +975,7 @@ static PyObject *NeXusFile_initgroupdir(PyObject *, PyObject *args)
   NXhandle handle=static_cast<NXhandle>(PyCObject_AsVoidPtr(pyhandle));
 
   // do the work
-  if(NXinitgroupdir(handle)!=NX_OK){
+  if(NX_LOCKED(NXinitgroupdir(handle))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"initgroupdir failed");
     return NULL;
   }
@@ -853,7 +997,7 @@ static PyObject *NeXusFile_getnextentry(PyObject *, PyObject *args)
   char name[GROUP_STRING_LEN];
   char nxclass[GROUP_STRING_LEN];
   int type;
-  if(NXgetnextentry(handle,name,nxclass,&type)!=NX_OK){
+  if(NX_LOCKED(NXgetnextentry(handle,name,nxclass,&type))!=NX_OK){
     return Py_BuildValue("(OOi)",Py_None,Py_None,-1);
   }
 
@@ -877,7 +1021,7 @@ static PyObject *NeXusFile_getattrinfo(PyObject *, PyObject *args)
 
   // do the work
   int num_attr;
-  if(NXgetattrinfo(handle,&num_attr)!=NX_OK){
+  if(NX_LOCKED(NXgetattrinfo(handle,&num_attr))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"getnumattr failed");
     return NULL;
   }
@@ -897,7 +1041,7 @@ static PyObject *NeXusFile_initattrdir(PyObject *, PyObject *args)
   NXhandle handle=static_cast<NXhandle>(PyCObject_AsVoidPtr(pyhandle));
 
   // do the work
-  if(NXinitattrdir(handle)!=NX_OK){
+  if(NX_LOCKED(NXinitattrdir(handle))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"initattrdir failed");
     return NULL;
   }
@@ -919,7 +1063,7 @@ static PyObject *NeXusFile_getnextattr(PyObject *, PyObject *args)
   char attr_name[GROUP_STRING_LEN];
   int attr_type;
   int attr_len;
-  if(NXgetnextattr(handle,attr_name,&attr_len,&attr_type)!=NX_OK){
+  if(NX_LOCKED(NXgetnextattr(handle,attr_name,&attr_len,&attr_type))!=NX_OK){
     return Py_BuildValue("(OO)",Py_None,Py_None);
   }
   PyObject *name=PyString_FromString(attr_name);
@@ -932,7 +1076,7 @@ static PyObject *NeXusFile_getnextattr(PyObject *, PyObject *args)
       PyErr_SetString(PyExc_IOError,"In getattr: malloc failed");
       return NULL;
   }
-  if(NXgetattr(handle,attr_name,attr_value,attr_dims,&attr_type)!=NX_OK){
+  if(NX_LOCKED(NXgetattr(handle,attr_name,attr_value,attr_dims,&attr_type))!=NX_OK){
       PyErr_SetString(PyExc_IOError,"In getattr: getattr failed");
       return NULL;
   }
@@ -967,7 +1111,7 @@ static PyObject *NeXusFile_getgroupID(PyObject *, PyObject *args)
 
   // get the information about the attribute
   NXlink *link=new NXlink;
-  if(NXgetgroupID(handle,link)!=NX_OK){
+  if(NX_LOCKED(NXgetgroupID(handle,link))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"getgroupID failed");
     return NULL;
   }
@@ -987,7 +1131,7 @@ static PyObject *NeXusFile_getdataID(PyObject *, PyObject *args)
 
   // get the information about the attribute
   NXlink *link=new NXlink;
-  if(NXgetdataID(handle,link)!=NX_OK){
+  if(NX_LOCKED(NXgetdataID(handle,link))!=NX_OK){
     PyErr_SetString(PyExc_IOError,"getdataID failed");
     return NULL;
   }
@@ -1075,6 +1219,16 @@ PyMODINIT_FUNC initsns_napi(void)
   if(module==NULL)
     return;
 
+  napi_lock=PyThread_allocate_lock();
+  if(napi_lock==NULL){
+    PyErr_SetString(PyExc_RuntimeError,"cannot allocate the NeXus lock");
+    return;
+  }
+
+#ifdef HAVE_NUMPY
+  import_array();
+#endif
+
   // get module dictionary for adding constants
   PyObject *d;
   d=PyModule_GetDict(module);
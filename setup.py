@@ -106,12 +106,22 @@ def setupSnsNapiExt(locations):
     
     if os.uname()[0] == 'Linux':
         lib_list_all.append('stdc++')
+
+    # NumPy support for reading data straight into arrays is optional
+    macro_list = []
+    try:
+        import numpy
+        incdir_list.append(numpy.get_include())
+        macro_list.append(('HAVE_NUMPY', None))
+    except ImportError:
+        print "NumPy not found. Building sns_napi without NumPy support."
             
     return [Extension("sns_napi",
                       [os.path.join('nexus', 'sns_napi.cpp')],
                       include_dirs = incdir_list,
                       library_dirs = libdir_list,
-                      libraries = lib_list_all)]
+                      libraries = lib_list_all,
+                      define_macros = macro_list)]
 
 class build_doc(Command):
     """
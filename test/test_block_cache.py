@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import numpy
+import unittest
+
+import nessi_list
+from DST import block_cache
+
+class BlockCacheTest(unittest.TestCase):
+
+    def testGet(self):
+        cache = block_cache.BlockCache(100)
+        self.failUnless(cache.get("a") is None)
+        cache.put("a", "block a", 10)
+        self.assertEqual(cache.get("a"), "block a")
+        self.failUnless("a" in cache)
+        self.assertEqual(len(cache), 1)
+
+        stats = cache.getStats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["blocks"],
+                          stats["bytes"]), (1, 1, 1, 10))
+
+    def testReplace(self):
+        cache = block_cache.BlockCache(100)
+        cache.put("a", "old", 40)
+        cache.put("a", "new", 30)
+        self.assertEqual(cache.get("a"), "new")
+        self.assertEqual(cache.getStats()["bytes"], 30)
+
+    def testEviction(self):
+        cache = block_cache.BlockCache(30)
+        cache.put("a", "block a", 10)
+        cache.put("b", "block b", 10)
+        cache.put("c", "block c", 10)
+        # a is now the most recently used block
+        cache.get("a")
+        cache.put("d", "block d", 10)
+        self.failIf("b" in cache)
+        self.failUnless("a" in cache)
+        self.failUnless("d" in cache)
+        self.assertEqual(cache.getStats()["evictions"], 1)
+
+    def testLargeBlock(self):
+        cache = block_cache.BlockCache(30)
+        cache.put("a", "block a", 10)
+        cache.put("b", "block b", 50)
+        self.failIf("a" in cache)
+        self.failUnless("b" in cache)
+        cache.put("c", "block c", 10)
+        self.failIf("b" in cache)
+
+    def testPins(self):
+        cache = block_cache.BlockCache(20)
+        cache.put("a", "block a", 10)
+        cache.pin("a")
+        cache.pin("a")
+        cache.put("b", "block b", 10)
+        cache.put("c", "block c", 20)
+        self.failUnless("a" in cache)
+        self.failIf("b" in cache)
+        self.assertEqual(cache.getStats()["pinned"], 1)
+
+        # Pins are counted
+        cache.unpin("a")
+        self.failUnless(cache.isPinned("a"))
+        self.failUnless("a" in cache)
+        # The last unpin brings the cache back within its budget
+        cache.unpin("a")
+        self.failIf(cache.isPinned("a"))
+        self.failIf("a" in cache)
+        self.assertEqual(cache.getStats()["bytes"], 20)
+
+    def testPinBeforePut(self):
+        cache = block_cache.BlockCache(10)
+        cache.pin("a")
+        cache.put("a", "block a", 10)
+        cache.put("b", "block b", 10)
+        self.failUnless("a" in cache)
+        cache.unpin("a")
+        self.failUnless("b" in cache)
+
+    def testRemovePinned(self):
+        cache = block_cache.BlockCache(100)
+        cache.put("a", "block a", 10)
+        cache.pin("a")
+        cache.remove("a")
+        self.failIf("a" in cache)
+        self.assertEqual(cache.getStats()["pinned"], 0)
+        cache.unpin("a")
+
+    def testClearWhilePinned(self):
+        cache = block_cache.BlockCache(100)
+        cache.put("a", "block a", 10)
+        cache.pin("a")
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.getStats()["bytes"], 0)
+        self.failIf(cache.isPinned("a"))
+        # The reader that held the pin still unpins it
+        cache.unpin("a")
+        cache.unpin("b")
+
+    def testMaxBytes(self):
+        cache = block_cache.BlockCache(None)
+        for key in range(5):
+            cache.put(key, key, 100)
+        self.assertEqual(len(cache), 5)
+        self.failUnless(cache.getMaxBytes() is None)
+
+        cache.setMaxBytes(250)
+        self.assertEqual(cache.getMaxBytes(), 250)
+        self.assertEqual(sorted(cache.getStats().keys()),
+                         ["blocks", "bytes", "evictions", "hits", "misses",
+                          "pinned"])
+        self.assertEqual([key in cache for key in range(5)],
+                         [False, False, False, True, True])
+        self.assertRaises(ValueError, cache.setMaxBytes, -1)
+        self.assertRaises(ValueError, block_cache.BlockCache, -1)
+
+    def testGetSize(self):
+        values = nessi_list.NessiList()
+        values.extend([1.0, 2.0, 3.0])
+        self.assertEqual(block_cache.get_size(None), 0)
+        self.assertEqual(block_cache.get_size(numpy.zeros(4)), 32)
+        self.assertEqual(block_cache.get_size(values), 24)
+        self.assertEqual(block_cache.get_size((numpy.zeros(4), values,
+                                               None)), 56)
+
+if __name__ == "__main__":
+    unittest.main()
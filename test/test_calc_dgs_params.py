@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import imp
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+import DST
+
+# The script is not a module of a package
+calc_dgs_params = imp.load_source("calc_dgs_params",
+                                  os.path.join(os.path.dirname(
+                                      os.path.abspath(__file__)), os.pardir,
+                                               "geom", "calc_dgs_params.py"))
+get_bank_frame = getattr(calc_dgs_params, "__get_bank_frame")
+
+# The first two rows of a rotation by 90 degrees about z
+ORIENTATION = [0.0, 1.0, 0.0, -1.0, 0.0, 0.0]
+
+class BankFrameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dsts = []
+
+    def tearDown(self):
+        for dst in self.dsts:
+            dst.release_resource()
+        shutil.rmtree(self.directory)
+
+    def frame(self, orientation, translation):
+        import h5py
+
+        filename = os.path.join(self.directory, "%d.nxs" % len(self.dsts))
+        nfile = h5py.File(filename, "w")
+        entry = nfile.create_group("entry")
+        entry.attrs["NX_class"] = "NXentry"
+        instrument = entry.create_group("instrument")
+        instrument.attrs["NX_class"] = "NXinstrument"
+        bank = instrument.create_group("bank1")
+        bank.attrs["NX_class"] = "NXdetector"
+        origin = bank.create_group("origin")
+        origin.attrs["NX_class"] = "NXgeometry"
+        group = origin.create_group("orientation")
+        group.attrs["NX_class"] = "NXorientation"
+        group.create_dataset("value", data=orientation)
+        group = origin.create_group("translation")
+        group.attrs["NX_class"] = "NXtranslation"
+        group.create_dataset("distance", data=translation)
+        nfile.close()
+
+        self.dsts.append(DST.getInstance("application/x-NeXus", filename,
+                                         backend="hdf5"))
+        return get_bank_frame(self.dsts[-1].getResource(),
+                              "/entry/instrument/bank1")
+
+    def check(self, frame):
+        (orientm, translation) = frame
+        self.assertEqual(orientm.shape, (3, 3))
+        self.assertEqual(orientm.tolist(), [[0.0, -1.0, 0.0],
+                                            [1.0, 0.0, 0.0],
+                                            [0.0, 0.0, 1.0]])
+        self.assertEqual(translation.tolist(), [1.0, 2.0, 3.0])
+
+    def testFlat(self):
+        self.check(self.frame(ORIENTATION, [1.0, 2.0, 3.0]))
+
+    def test2D(self):
+        self.check(self.frame([ORIENTATION], [[1.0, 2.0, 3.0]]))
+        self.check(self.frame(numpy.reshape(ORIENTATION, (2, 3)),
+                              numpy.array([[1, 2, 3]], dtype="i4")))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import copy
+import cPickle
+import pickle
+import unittest
+
+import nessi_list
+import SOM
+from SOM import cow_sequence
+
+def make_list(values):
+    result = nessi_list.NessiList()
+    result.extend(values)
+    return result
+
+class CowSequenceTest(unittest.TestCase):
+
+    def makeSOM(self):
+        # Two spectra sharing one independent axis like a bank from getSOM
+        axis = make_list([0.0, 10.0, 20.0])
+        som = SOM.SOM()
+        for i in range(2):
+            spectrum = SOM.SO(id=i)
+            spectrum.y = make_list([1.0 + i, 2.0 + i])
+            spectrum.var_y = make_list([1.0 + i, 2.0 + i])
+            spectrum.axis[0].share(axis)
+            som.append(spectrum)
+        return (som, axis)
+
+    def testRead(self):
+        (som, axis) = self.makeSOM()
+        value = som[0].axis[0].val
+        self.failUnless(isinstance(value, cow_sequence.CowSequence))
+        self.failUnless(value.isShared())
+        self.failUnless(value.getValue() is axis)
+        self.assertEqual(len(value), 3)
+        self.assertEqual(value[1], 10.0)
+        self.assertEqual(list(value), [0.0, 10.0, 20.0])
+        self.assertEqual(value, som[1].axis[0].val)
+
+    def testNessiList(self):
+        (som, axis) = self.makeSOM()
+        value = som[0].axis[0].val
+        # SCL functions and writers expect a NessiList
+        self.failUnless(isinstance(value, nessi_list.NessiList))
+        self.assertEqual(value.__type__, axis.__type__)
+        self.assertEqual(list(value.toNumPy()), [0.0, 10.0, 20.0])
+        self.assertEqual(value.index(10.0), 1)
+        self.assertEqual(value.count(20.0), 1)
+        self.assertEqual(list(reversed(value)), [20.0, 10.0, 0.0])
+        self.failUnless(value.isShared())
+
+    def testCopyOnWrite(self):
+        (som, axis) = self.makeSOM()
+        som[0].axis[0].val[1] = 15.0
+        self.assertEqual(list(som[0].axis[0].val), [0.0, 15.0, 20.0])
+        self.failIf(isinstance(som[0].axis[0].val,
+                               cow_sequence.CowSequence))
+        self.assertEqual(list(axis), [0.0, 10.0, 20.0])
+        self.assertEqual(list(som[1].axis[0].val), [0.0, 10.0, 20.0])
+        self.failUnless(som[1].axis[0].val.isShared())
+
+    def testAppend(self):
+        (som, axis) = self.makeSOM()
+        som[1].axis[0].val.append(30.0)
+        self.assertEqual(list(som[1].axis[0].val), [0.0, 10.0, 20.0, 30.0])
+        self.assertEqual(len(axis), 3)
+
+    def testCopy(self):
+        (som, axis) = self.makeSOM()
+        value = copy.deepcopy(som[0].axis[0].val)
+        value[0] = -1.0
+        self.assertEqual(axis[0], 0.0)
+
+    def testCopyOwners(self):
+        (som, axis) = self.makeSOM()
+        som = copy.deepcopy(som)
+        self.failIf(som[0].axis[0].val is som[1].axis[0].val)
+        self.failIf(som[0].axis[0].val is axis)
+
+        som[0].axis[0].val[0] = 5.0
+        self.assertEqual(som[1].axis[0].val[0], 0.0)
+        self.assertEqual(axis[0], 0.0)
+
+    def testPrivateNames(self):
+        (som, axis) = self.makeSOM()
+        self.assertRaises(AttributeError, getattr, som[0].axis[0].val,
+                          "__setstate__")
+
+    def testPickle(self):
+        for module in (pickle, cPickle):
+            for protocol in (0, 2):
+                (som, axis) = self.makeSOM()
+                som = module.loads(module.dumps(som, protocol))
+                self.assertEqual(len(som), 2)
+                self.assertEqual([list(so.y) for so in som],
+                                 [[1.0, 2.0], [2.0, 3.0]])
+                self.failUnless(som[0].axis[0].val.getValue() is
+                                som[1].axis[0].val.getValue())
+
+                # the copy is still made on the unpickled spectrum
+                som[0].axis[0].val[0] = 5.0
+                self.assertEqual(som[0].axis[0].val[0], 5.0)
+                self.assertEqual(som[1].axis[0].val[0], 0.0)
+                self.failUnless(som[1].axis[0].val.isShared())
+
+class ShareVarianceTest(unittest.TestCase):
+
+    def makeSOM(self):
+        # Raw spectra like the ones from a default getSOM
+        som = SOM.SOM()
+        for i in range(3):
+            spectrum = SOM.SO(id=i)
+            spectrum.y = make_list([1.0 + i, 2.0 + i, 3.0 + i])
+            spectrum.shareVariance()
+            som.append(spectrum)
+        return som
+
+    def testShared(self):
+        spectrum = self.makeSOM()[0]
+        self.failUnless(spectrum.isVarianceShared())
+        self.assertEqual(list(spectrum.var_y), [1.0, 2.0, 3.0])
+
+    def testNessiList(self):
+        som = self.makeSOM()
+        spectrum = som[0]
+        # SCL arithmetic and the writers expect two NessiLists
+        for value in (spectrum.y, spectrum.var_y):
+            self.failUnless(isinstance(value, nessi_list.NessiList))
+            self.assertEqual(value.__type__, "double")
+            self.assertEqual(list(value.toNumPy()), [1.0, 2.0, 3.0])
+        self.failUnless(spectrum.isVarianceShared())
+
+        (x, y, var_y) = som.toXY(withYvar=True)[0]
+        self.assertEqual(list(y), [1.0, 2.0, 3.0])
+        self.assertEqual(list(var_y), [1.0, 2.0, 3.0])
+
+    def testChangeValues(self):
+        spectrum = self.makeSOM()[0]
+        spectrum.y[0] = 7.0
+        self.failIf(spectrum.isVarianceShared())
+        self.assertEqual(list(spectrum.y), [7.0, 2.0, 3.0])
+        self.assertEqual(list(spectrum.var_y), [1.0, 2.0, 3.0])
+
+    def testChangeVariance(self):
+        spectrum = self.makeSOM()[0]
+        spectrum.var_y[1] = 7.0
+        self.assertEqual(list(spectrum.y), [1.0, 2.0, 3.0])
+        self.assertEqual(list(spectrum.var_y), [1.0, 7.0, 3.0])
+
+    def testCopy(self):
+        spectrum = copy.deepcopy(self.makeSOM()[0])
+        spectrum.y[0] = 7.0
+        self.assertEqual(list(spectrum.var_y), [1.0, 2.0, 3.0])
+
+    def testPickle(self):
+        for module in (pickle, cPickle):
+            for protocol in (0, 2):
+                som = module.loads(module.dumps(self.makeSOM(), protocol))
+                self.assertEqual([list(so.y) for so in som],
+                                 [[1.0, 2.0, 3.0], [2.0, 3.0, 4.0],
+                                  [3.0, 4.0, 5.0]])
+                for spectrum in som:
+                    self.failUnless(spectrum.isVarianceShared())
+
+                som[1].y[0] = 7.0
+                self.failIf(som[1].isVarianceShared())
+                self.assertEqual(list(som[1].var_y), [2.0, 3.0, 4.0])
+                self.failUnless(som[2].isVarianceShared())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+import DST
+
+# pixel ID, time-of-flight and pulse of every event, the pixel IDs count up
+# along y first in a 2 x 3 bank, 7 is not a pixel of the bank
+EVENTS = [(0, 1.0, 0), (4, 12.0, 0), (4, 25.0, 0),
+          (0, 3.0, 1), (5, 19.0, 1),
+          (4, 11.0, 2), (7, 15.0, 2), (0, 29.0, 2),
+          (2, 5.0, 3), (0, 35.0, 3)]
+PULSE_TIMES = [0.0, 1.0, 2.0, 3.0]
+EDGES = [0.0, 10.0, 20.0, 30.0]
+
+class EventDataTest(unittest.TestCase):
+
+    def setUp(self):
+        import h5py
+
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "events.nxs")
+
+        nfile = h5py.File(self.filename, "w")
+        entry = nfile.create_group("entry")
+        entry.attrs["NX_class"] = "NXentry"
+        instrument = entry.create_group("instrument")
+        instrument.attrs["NX_class"] = "NXinstrument"
+        name = instrument.create_dataset("name", data=numpy.string_("TST"))
+        name.attrs["short_name"] = "TST"
+        detector = instrument.create_group("bank1")
+        detector.attrs["NX_class"] = "NXdetector"
+        detector.create_dataset("x_pixel_offset", data=[0.0, 0.1])
+        detector.create_dataset("y_pixel_offset", data=[0.0, 0.1, 0.2])
+
+        events = entry.create_group("bank1_events")
+        events.attrs["NX_class"] = "NXevent_data"
+        events.create_dataset("event_id", data=numpy.array(
+            [event[0] for event in EVENTS], dtype="u4"))
+        tof = events.create_dataset("event_time_offset", data=numpy.array(
+            [event[1] for event in EVENTS], dtype="f4"))
+        tof.attrs["units"] = "microsecond"
+        starts = [[event[2] for event in EVENTS].index(pulse)
+                  for pulse in range(len(PULSE_TIMES))]
+        events.create_dataset("event_index",
+                              data=numpy.array(starts, dtype="u8"))
+        times = events.create_dataset("event_time_zero", data=PULSE_TIMES)
+        times.attrs["units"] = "second"
+        nfile.close()
+
+        self.dst = DST.getInstance("application/x-NeXus", self.filename,
+                                   backend="hdf5")
+
+    def tearDown(self):
+        self.dst.release_resource()
+        shutil.rmtree(self.directory)
+
+    def expected(self, pulses=None, offset=0.0):
+        counts = {}
+        for (pixel_id, tof, pulse) in EVENTS:
+            if pixel_id >= 6 or (pulses is not None and pulse not in pulses):
+                continue
+            pixel = (pixel_id / 3, pixel_id % 3)
+            counts[pixel] = counts.get(pixel, numpy.zeros(3)) + \
+                            numpy.histogram([tof + offset], EDGES)[0]
+        return dict([(pixel, values.tolist())
+                     for (pixel, values) in counts.iteritems()])
+
+    def histogram(self, **kwds):
+        som = self.dst.getSOM(("/entry/bank1_events", 1), bin_edges=EDGES,
+                              geometry=False, **kwds)
+        self.assertEqual(len(som), 6)
+        self.assertEqual(som.getAxisLabel(0), "time_of_flight")
+        self.assertEqual(som.getDataSetType(), "histogram")
+        counts = {}
+        for spectrum in som:
+            self.assertEqual(spectrum.id[0], "bank1")
+            self.assertEqual(list(spectrum.var_y), list(spectrum.y))
+            self.assertEqual(list(spectrum.axis[0].val), EDGES)
+            if sum(spectrum.y) > 0:
+                counts[spectrum.id[1]] = list(spectrum.y)
+        return counts
+
+    def testGroups(self):
+        self.failUnless(("/entry/bank1_events", 1) in
+                        self.dst.get_SOM_ids())
+
+    def testHistogram(self):
+        self.assertEqual(self.histogram(), self.expected())
+        self.assertEqual(self.expected()[(0, 0)], [2.0, 0.0, 1.0])
+
+    def testChunks(self):
+        self.assertEqual(self.histogram(pulses_per_chunk=1),
+                         self.expected())
+
+    def testOffset(self):
+        self.assertEqual(self.histogram(tof_offset=6.0),
+                         self.expected(offset=6.0))
+
+    def testPulseWindow(self):
+        self.assertEqual(self.histogram(pulse_window=(1.0, 3.0)),
+                         self.expected(pulses=(1, 2)))
+        self.assertEqual(self.histogram(pulse_window=(0.5, 2.5),
+                                        pulses_per_chunk=1),
+                         self.expected(pulses=(1, 2)))
+        self.assertEqual(self.histogram(pulse_window=(5.0, 6.0)), {})
+
+    def testBinParams(self):
+        som = self.dst.getSOM(("/entry/bank1_events", 1),
+                              bin_params=(0.0, 30.0, 10.0), geometry=False)
+        self.assertEqual(list(som[0].axis[0].val), EDGES)
+        self.assertEqual(list(som[0].y), [2.0, 0.0, 1.0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import copy
+import cPickle
+import unittest
+
+import nessi_list
+import SOM
+
+class LazySOMTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def factory(self, so_id):
+        self.calls.append(so_id)
+        spectrum = SOM.SO(id=so_id)
+        spectrum.y = nessi_list.NessiList()
+        spectrum.y.extend([float(so_id), float(so_id) + 0.5])
+        spectrum.var_y = nessi_list.NessiList()
+        spectrum.var_y.extend([1.0, 1.0])
+        spectrum.axis[0].val = nessi_list.NessiList()
+        spectrum.axis[0].val.extend([0.0, 1.0, 2.0])
+        return spectrum
+
+    def makeSOM(self, cache_size=SOM.LazySOM.DEFAULT_CACHE_SIZE):
+        som = SOM.LazySOM(cache_size)
+        som.setTitle("lazy")
+        som.appendLazy(range(0, 8), self.factory)
+        som.appendLazy(range(100, 104), self.factory)
+        return som
+
+    def testLazy(self):
+        som = self.makeSOM()
+        self.assertEqual(len(som), 12)
+        self.assertEqual(som.getIds(), range(8) + range(100, 104))
+        self.assertEqual(self.calls, [])
+
+    def testIndexing(self):
+        som = self.makeSOM()
+        self.assertEqual(som[0].id, 0)
+        self.assertEqual(som[8].id, 100)
+        self.assertEqual(som[-1].id, 103)
+        self.assertEqual([so.id for so in som[6:10]], [6, 7, 100, 101])
+        self.assertEqual([so.id for so in som[::5]], [0, 5, 102])
+        self.assertRaises(IndexError, som.__getitem__, 12)
+        self.assertRaises(IndexError, som.__getitem__, -13)
+        self.assertEqual(som.getSO(102).id, 102)
+        self.assertEqual(som.getSO(50), None)
+        self.assertEqual(self.calls, [0, 100, 103, 6, 7, 101, 5, 102])
+
+    def testIteration(self):
+        som = self.makeSOM()
+        self.assertEqual([so.id for so in som], som.getIds())
+        self.assertEqual([so.id for so in reversed(som)],
+                         list(reversed(som.getIds())))
+
+    def testCache(self):
+        som = self.makeSOM(cache_size=2)
+        self.failUnless(som[0] is som[0])
+        som[1]
+        som[2]
+        som[0]
+        self.assertEqual(self.calls, [0, 1, 2, 0])
+        som.invalidate([0])
+        som[0]
+        self.assertEqual(self.calls, [0, 1, 2, 0, 0])
+        self.assertRaises(ValueError, SOM.LazySOM, 0)
+
+    def testChanged(self):
+        som = self.makeSOM(cache_size=2)
+        som[0].y[0] = 42.0
+        som[1].axis[0].val = nessi_list.NessiList()
+        som[1].axis[0].val.extend([0.0, 2.0, 4.0])
+        som[2]
+        som[3]
+        som[4]
+        # The changed spectra are pinned instead of created again
+        self.assertEqual(self.calls, [0, 1, 2, 3, 4])
+        self.assertEqual(som.getPinned(), [0, 1])
+        self.assertEqual(som[0].y[0], 42.0)
+        self.assertEqual(list(som[1].axis[0].val), [0.0, 2.0, 4.0])
+        self.assertEqual(self.calls, [0, 1, 2, 3, 4])
+
+        # Spectra that were only read are thrown away
+        som[2]
+        self.assertEqual(self.calls, [0, 1, 2, 3, 4, 2])
+
+        som.invalidate([0])
+        self.assertEqual(som.getPinned(), [1])
+        self.assertEqual(som[0].y[0], 0.0)
+        som.invalidate()
+        self.assertEqual(som.getPinned(), [])
+
+    def testSearch(self):
+        som = self.makeSOM()
+        self.failUnless(som[3] in som)
+        self.failUnless(self.factory(101) in som)
+        self.failIf(self.factory(7.5) in som)
+        self.assertEqual(som.index(som[9]), 9)
+        self.assertEqual(som.index(som[9], 9, 12), 9)
+        self.assertRaises(ValueError, som.index, som[2], 3)
+        self.assertRaises(ValueError, som.index, self.factory(7.5))
+        self.assertEqual(som.count(som[4]), 1)
+        self.assertEqual(som.count(self.factory(7.5)), 0)
+
+    def testAppend(self):
+        som = self.makeSOM()
+        som.append(self.factory(200))
+        som += [self.factory(201)]
+        self.assertEqual(len(som), 14)
+        self.assertEqual([so.id for so in som[-2:]], [200, 201])
+
+    def testNotSupported(self):
+        som = self.makeSOM()
+        for (method, args) in ((som.pop, ()), (som.reverse, ()),
+                               (som.sort, ()), (som.insert, (0, som[0])),
+                               (som.remove, (som[0],)),
+                               (som.__delitem__, (0,)),
+                               (som.__setitem__, (0, som[0])),
+                               (som.__add__, ([],)), (som.__mul__, (2,))):
+            self.assertRaises(NotImplementedError, method, *args)
+        self.assertEqual(len(som), 12)
+
+    def testMaterialize(self):
+        som = self.makeSOM().materialize()
+        self.failIf(isinstance(som, SOM.LazySOM))
+        self.assertEqual(som.getTitle(), "lazy")
+        self.assertEqual(list.__len__(som), 12)
+        self.assertEqual(som.getBlocks(), [])
+
+    def testCopy(self):
+        for make_copy in (copy.copy, copy.deepcopy,
+                          lambda som: cPickle.loads(cPickle.dumps(som, 2))):
+            som = self.makeSOM()
+            result = make_copy(som)
+            self.failIf(isinstance(result, SOM.LazySOM))
+            self.assertEqual(len(result), 12)
+            self.assertEqual([so.id for so in result], som.getIds())
+            self.assertEqual(result.getTitle(), "lazy")
+            self.assertEqual(len(som), 12)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from DST import pixel_filter
+
+class PixelFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, lines):
+        filename = os.path.join(self.directory, name)
+        ofile = open(filename, "w")
+        ofile.write("\n".join(lines) + "\n")
+        ofile.close()
+        return filename
+
+    def testParse(self):
+        filename = self.write("mask.dat", ["# a comment", "bank1_0_1",
+                                           "bank1_2_0", "", "junk",
+                                           "bank2_1_1"])
+        pixels = pixel_filter.PixelFilter(filename)
+        banks = pixels.getBanks()
+        banks.sort()
+        self.assertEqual(banks, ["bank1", "bank2"])
+        self.assertEqual(pixels.getPixels("bank1"),
+                         [("bank1", (0, 1)), ("bank1", (2, 0))])
+        self.assertEqual(pixels.getPixels("bank3"), [])
+
+    def testGrid(self):
+        filename = self.write("roi.dat", ["bank1_0_1", "bank1_2_0",
+                                          "bank1_5_0", "bank1_0_7"])
+        pixels = pixel_filter.PixelFilter(filename)
+        grid = pixels.getGrid("bank1", (3, 2))
+        self.assertEqual(grid.dtype, numpy.bool_)
+        self.assertEqual(grid.tolist(), [[False, True], [False, False],
+                                         [True, False]])
+        self.failIf(pixels.getGrid("bank2", (3, 2)).any())
+
+    def testMaskAndRoi(self):
+        # the same selection getSOM makes for a range of a bank
+        mask = pixel_filter.PixelFilter(self.write("mask.dat",
+                                                   ["bank1_1_1"]))
+        roi = pixel_filter.PixelFilter(self.write("roi.dat",
+                                                  ["bank1_0_0", "bank1_1_1",
+                                                   "bank1_1_2", "bank1_3_0"]))
+        keep = numpy.zeros((4, 3), dtype=bool)
+        keep[0:2, 0:3] = True
+        keep &= ~mask.getGrid("bank1", (4, 3))
+        keep &= roi.getGrid("bank1", (4, 3))
+        self.assertEqual(zip(*[index.tolist() for index in keep.nonzero()]),
+                         [(0, 0), (1, 2)])
+
+    def testLoad(self):
+        filename = self.write("mask.dat", ["bank1_0_0"])
+        first = pixel_filter.load(filename)
+        self.failUnless(pixel_filter.load(filename) is first)
+
+        self.write("mask.dat", ["bank1_1_1"])
+        mtime = os.stat(filename).st_mtime + 10
+        os.utime(filename, (mtime, mtime))
+        second = pixel_filter.load(filename)
+        self.failIf(second is first)
+        self.assertEqual(second.getPixels("bank1"), [("bank1", (1, 1))])
+
+    def testMissing(self):
+        self.assertRaises(IOError, pixel_filter.load,
+                          os.path.join(self.directory, "none.dat"))
+
+if __name__ == "__main__":
+    unittest.main()
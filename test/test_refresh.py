@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import numpy
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import DST
+
+GROUPS = [("/entry/bank1", 1), ("/entry/bank2", 1)]
+EDGES = [0.0, 10.0, 20.0, 30.0, 40.0]
+
+class RefreshTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "live.nxs")
+        self.write({"bank1": 1.0, "bank2": 1.0})
+        self.dst = DST.getInstance("application/x-NeXus", self.filename,
+                                   backend="hdf5", prefetch=True)
+
+    def tearDown(self):
+        self.dst.release_resource()
+        shutil.rmtree(self.directory)
+
+    def write(self, scales, num_x=2):
+        # Writes the file like a live run, a new file replaces the old one
+        import h5py
+
+        # The stamp of the file includes its modification time
+        time.sleep(0.01)
+        temp_name = self.filename + ".tmp"
+        nfile = h5py.File(temp_name, "w")
+        entry = nfile.create_group("entry")
+        entry.attrs["NX_class"] = "NXentry"
+        instrument = entry.create_group("instrument")
+        instrument.attrs["NX_class"] = "NXinstrument"
+        name = instrument.create_dataset("name", data=numpy.string_("TST"))
+        name.attrs["short_name"] = "TST"
+
+        for bank in sorted(scales):
+            if bank == "bank2":
+                size = num_x
+            else:
+                size = 2
+            group = entry.create_group(bank)
+            group.attrs["NX_class"] = "NXdata"
+            counts = numpy.arange(size * 3 * 4).reshape(size, 3, 4)
+            data = group.create_dataset("data", data=(counts * scales[bank])
+                                        .astype("u4"))
+            data.attrs["signal"] = 1
+            for (axis, (label, values)) in \
+                    enumerate((("x_pixel_offset", numpy.arange(size) * 0.1),
+                               ("y_pixel_offset", [0.0, 0.1, 0.2]),
+                               ("time_of_flight", EDGES))):
+                dataset = group.create_dataset(label, data=values)
+                dataset.attrs["axis"] = axis + 1
+                dataset.attrs["primary"] = 1
+        nfile.close()
+        os.rename(temp_name, self.filename)
+
+    def read(self, **kwds):
+        return self.dst.getSOM(list(GROUPS), geometry=False, **kwds)
+
+    def refresh(self, som, **kwds):
+        return self.dst.refresh(som, list(GROUPS), geometry=False, **kwds)
+
+    def testUnchanged(self):
+        som = self.read()
+        spectra = list(som)
+        self.assertEqual(self.refresh(som), [])
+        self.failUnless(False not in [left is right
+                                      for (left, right) in zip(som, spectra)])
+
+    def testCounts(self):
+        for (scale, kwds) in ((2.0, {}), (3.0, {"columnar": True})):
+            som = self.read(**kwds)
+            spectra = list(som)
+            self.write({"bank1": 1.0, "bank2": scale})
+            self.assertEqual(self.refresh(som, **kwds), [])
+
+            self.assertEqual(len(som), 12)
+            # The spectra of the unchanged group are kept
+            self.failUnless(False not in [som[i] is spectra[i]
+                                          for i in range(6)])
+            self.failIf(som[6] is spectra[6])
+            counts = [4.0 * scale, 5.0 * scale, 6.0 * scale, 7.0 * scale]
+            self.assertEqual(list(som[7].y), counts)
+            self.assertEqual(list(som[7].var_y), counts)
+            self.assertEqual(list(som[7].axis[0].val), EDGES)
+            if kwds.get("columnar", False):
+                self.assertEqual(len(som.getBlocks()), 2)
+
+    def testOtherDatasets(self):
+        # Every dataset is brought up to date, not only the first one
+        soms = [self.read(), self.read(columnar=True)]
+        self.write({"bank1": 3.0, "bank2": 1.0})
+        self.refresh(soms[0])
+        self.refresh(soms[1], columnar=True)
+        for som in soms:
+            self.assertEqual(list(som[1].y), [12.0, 15.0, 18.0, 21.0])
+            self.assertEqual(list(som[7].y), [4.0, 5.0, 6.0, 7.0])
+
+    def testLayout(self):
+        som = self.read()
+        self.write({"bank1": 1.0, "bank2": 1.0}, num_x=1)
+        self.assertEqual(self.refresh(som), [("/entry/bank2", 1)])
+        self.assertEqual(len(som), 9)
+        self.assertEqual([spectrum.id for spectrum in som[5:7]],
+                         [("bank1", (1, 2)), ("bank2", (0, 0))])
+
+    def testLazy(self):
+        som = self.read(lazy=True)
+        self.assertEqual(list(som[7].y), [4.0, 5.0, 6.0, 7.0])
+        self.write({"bank1": 1.0, "bank2": 2.0})
+        self.refresh(som, lazy=True)
+        self.assertEqual(list(som[7].y), [8.0, 10.0, 12.0, 14.0])
+
+if __name__ == "__main__":
+    unittest.main()
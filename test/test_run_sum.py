@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+import DST
+
+GROUP = ("/entry/bank1", 1)
+
+class SumRunsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, scale=1, distance=2.0, polar=0.5):
+        # Writes a run with one 2x3 bank and its geometry
+        import h5py
+
+        filename = os.path.join(self.directory, name)
+        nfile = h5py.File(filename, "w")
+        entry = nfile.create_group("entry")
+        entry.attrs["NX_class"] = "NXentry"
+        charge = entry.create_dataset("proton_charge", data=[2.5])
+        charge.attrs["units"] = "picoCoulomb"
+
+        group = entry.create_group("bank1")
+        group.attrs["NX_class"] = "NXdata"
+        data = group.create_dataset("data", data=numpy.arange(24, dtype="u4")
+                                    .reshape(2, 3, 4) * scale)
+        data.attrs["signal"] = 1
+        for (axis, (label, values)) in \
+                enumerate((("x_pixel_offset", [0.0, 0.1]),
+                           ("y_pixel_offset", [0.0, 0.1, 0.2]),
+                           ("time_of_flight", [0.0, 10.0, 20.0, 30.0, 40.0]))):
+            dataset = group.create_dataset(label, data=values)
+            dataset.attrs["axis"] = axis + 1
+            dataset.attrs["primary"] = 1
+            dataset.attrs["units"] = "microsecond"
+
+        instrument = entry.create_group("instrument")
+        instrument.attrs["NX_class"] = "NXinstrument"
+        dataset = instrument.create_dataset("name", data=numpy.string_("TST"))
+        dataset.attrs["short_name"] = "TST"
+        moderator = instrument.create_group("moderator")
+        moderator.attrs["NX_class"] = "NXmoderator"
+        dataset = moderator.create_dataset("distance", data=[-20.0])
+        dataset.attrs["units"] = "metre"
+        detector = instrument.create_group("bank1")
+        detector.attrs["NX_class"] = "NXdetector"
+        for (label, value) in (("distance", distance), ("polar_angle", polar),
+                               ("azimuthal_angle", 0.0)):
+            dataset = detector.create_dataset(label,
+                                              data=numpy.zeros((2, 3)) + value)
+            dataset.attrs["units"] = "metre"
+        for (label, values) in (("x_pixel_offset", [0.0, 0.1]),
+                                ("y_pixel_offset", [0.0, 0.1, 0.2])):
+            dataset = detector.create_dataset(label, data=values)
+            dataset.attrs["units"] = "metre"
+        origin = detector.create_group("origin")
+        origin.attrs["NX_class"] = "NXgeometry"
+        translation = origin.create_group("translation")
+        translation.attrs["NX_class"] = "NXtranslation"
+        dataset = translation.create_dataset("distance", data=[1.0, 2.0, 2.0])
+        dataset.attrs["units"] = "metre"
+        nfile.close()
+        return filename
+
+    def testSum(self):
+        filenames = [self.write("run1.nxs"), self.write("run2.nxs", scale=2)]
+        som = DST.sumRuns(filenames, GROUP, backend="hdf5")
+        self.assertEqual(len(som), 6)
+        self.assertEqual(list(som[1].y), [12.0, 15.0, 18.0, 21.0])
+        self.assertEqual(som.attr_list["proton_charge"].getValue(), 5.0)
+
+    def testGeometry(self):
+        filenames = [self.write("run1.nxs"), self.write("run2.nxs")]
+        for (kwds, label) in (({"distance": 2.5}, "secondary flight path"),
+                              ({"polar": 0.7}, "polar angle")):
+            moved = self.write("moved.nxs", **kwds)
+            try:
+                DST.sumRuns(filenames + [moved], GROUP, backend="hdf5")
+            except ValueError, e:
+                self.failUnless(label in str(e))
+                self.failUnless(moved in str(e))
+            else:
+                self.fail("A moved detector was summed")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import numpy
+import unittest
+
+import SOM
+
+class SOBlockTest(unittest.TestCase):
+
+    def makeSOM(self):
+        y = numpy.arange(12, dtype=float).reshape(3, 4)
+        block = SOM.SOBlock(y, y * 2.0, ["a", "b", "c"])
+        som = SOM.SOM()
+        som.appendBlock(block)
+        return (som, block)
+
+    def testRowViews(self):
+        (som, block) = self.makeSOM()
+        self.assertEqual(len(som), 3)
+        self.assertEqual([so.id for so in som], ["a", "b", "c"])
+        self.assertEqual(list(som[1].y), [4.0, 5.0, 6.0, 7.0])
+        self.assertEqual(list(som[1].var_y), [8.0, 10.0, 12.0, 14.0])
+
+        som[1].y[2] = 100.0
+        self.assertEqual(block.y[1, 2], 100.0)
+        block.var_y[2] += 1.0
+        self.assertEqual(list(som[2].var_y), [17.0, 19.0, 21.0, 23.0])
+
+    def testSingleSpectrum(self):
+        block = SOM.SOBlock([1.0, 2.0])
+        self.assertEqual(len(block), 1)
+        self.assertEqual(block.ids, [0])
+        self.assertEqual(list(block.var_y[0]), [1.0, 2.0])
+        self.failIf(block.var_y is block.y)
+
+    def testBadIds(self):
+        self.assertRaises(ValueError, SOM.SOBlock, numpy.zeros((2, 3)),
+                          None, ["a"])
+
+    def testBlocks(self):
+        (som, block) = self.makeSOM()
+        self.assertEqual(len(som.getBlocks()), 1)
+        self.failUnless(som.getBlocks()[0] is block)
+
+    def testBlocksAfterChanges(self):
+        changes = [lambda som: som.pop(),
+                   lambda som: som.reverse(),
+                   lambda som: som.insert(0, som[0]),
+                   lambda som: som.__delitem__(0),
+                   lambda som: som.__setitem__(1, som[0]),
+                   lambda som: som.append(SOM.SO()),
+                   lambda som: setattr(som[0], "y", som[0].y.copy())]
+        for change in changes:
+            (som, block) = self.makeSOM()
+            change(som)
+            self.assertEqual(som.getBlocks(), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+#                        Data Object Model
+#           A part of the SNS Analysis Software Suite.
+#
+#                  Spallation Neutron Source
+#          Oak Ridge National Laboratory, Oak Ridge TN.
+#
+#
+#                             NOTICE
+#
+# For this software and its associated documentation, permission is granted
+# to reproduce, prepare derivative works, and distribute copies to the public
+# for any purpose and without fee.
+#
+# This material was prepared as an account of work sponsored by an agency of
+# the United States Government.  Neither the United States Government nor the
+# United States Department of Energy, nor any of their employees, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness of any
+# information, apparatus, product, or process disclosed, or represents that
+# its use would not infringe privately owned rights.
+#
+
+# $Id$
+
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+import nessi_list
+import DST
+import SOM
+
+def make_list(values):
+    result = nessi_list.NessiList()
+    result.extend(values)
+    return result
+
+class SomCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # The cache only needs the data file for its key
+        self.filename = os.path.join(self.directory, "data.nxs")
+        ofile = open(self.filename, "wb")
+        ofile.write("data")
+        ofile.close()
+        self.cache = DST.SomCache(os.path.join(self.directory, "cache"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def roundTrip(self, som):
+        self.cache.put(self.filename, som)
+        result = self.cache.get(self.filename)
+        self.failIf(result is None)
+        self.assertEqual(len(result), len(som))
+        self.assertEqual([so.id for so in result], [so.id for so in som])
+        for (left, right) in zip(som, result):
+            self.assertEqual(list(left.y), list(right.y))
+            self.assertEqual(list(left.var_y), list(right.var_y))
+            self.assertEqual(list(left.axis[0].val), list(right.axis[0].val))
+            if left.axis[0].var is None:
+                self.failUnless(right.axis[0].var is None)
+            else:
+                self.assertEqual(list(left.axis[0].var),
+                                 list(right.axis[0].var))
+        return result
+
+    def makeBank(self, som, ids, axis):
+        # Spectra sharing one independent axis like a bank from getSOM
+        for so_id in ids:
+            spectrum = SOM.SO(id=so_id)
+            spectrum.y = make_list([1.0 + so_id, 2.0 + so_id])
+            spectrum.var_y = make_list([1.0, 2.0 * so_id])
+            spectrum.axis[0].share(axis)
+            som.append(spectrum)
+
+    def testMixedAxes(self):
+        bank1 = make_list([0.0, 10.0, 20.0])
+        bank2 = make_list([5.0, 15.0, 25.0])
+        som = SOM.SOM()
+        self.makeBank(som, [0, 1], bank1)
+        self.makeBank(som, [2, 3], bank2)
+
+        result = self.roundTrip(som)
+        self.assertEqual(list(result[1].axis[0].val), [0.0, 10.0, 20.0])
+        self.assertEqual(list(result[2].axis[0].val), [5.0, 15.0, 25.0])
+        # Shared axes stay shared within a bank
+        self.failUnless(result[0].axis[0].val.getValue() is
+                        result[1].axis[0].val.getValue())
+        self.failIf(result[1].axis[0].val.getValue() is
+                    result[2].axis[0].val.getValue())
+
+    def testEqualAxes(self):
+        som = SOM.SOM()
+        self.makeBank(som, [0, 1], make_list([0.0, 10.0, 20.0]))
+        self.makeBank(som, [2], make_list([0.0, 10.0, 20.0]))
+        self.roundTrip(som)
+
+    def testAxisVariance(self):
+        som = SOM.SOM()
+        for (so_id, var) in ((0, [1.0, 1.0, 1.0]), (1, [2.0, 2.0, 2.0])):
+            spectrum = SOM.SO(id=so_id)
+            spectrum.y = make_list([1.0, 2.0])
+            spectrum.var_y = make_list([1.0, 2.0])
+            spectrum.axis[0].val = make_list([0.0, 10.0, 20.0])
+            spectrum.axis[0].var = make_list(var)
+            som.append(spectrum)
+        self.roundTrip(som)
+
+    def testSharedVariance(self):
+        som = SOM.SOM()
+        self.makeBank(som, [0, 1, 2], make_list([0.0, 10.0, 20.0]))
+        som[1].shareVariance()
+
+        result = self.roundTrip(som)
+        self.failUnless(result[1].isVarianceShared())
+        self.failIf(result[0].isVarianceShared())
+        self.failIf(result[2].isVarianceShared())
+        self.failUnless(isinstance(result[2].var_y, nessi_list.NessiList))
+        self.assertEqual(list(result[2].var_y), [1.0, 4.0])
+
+        som[0].shareVariance()
+        som[2].shareVariance()
+        self.roundTrip(som)
+
+    def testMixedBlockAxes(self):
+        som = SOM.SOM()
+        for (ids, axis) in (([0, 1], [0.0, 10.0, 20.0]),
+                            ([2, 3], [5.0, 15.0, 25.0])):
+            y = numpy.arange(4, dtype=float).reshape(2, 2) + ids[0]
+            som.appendBlock(SOM.SOBlock(y, y * 2.0, ids,
+                                        [make_list(axis)]))
+
+        result = self.roundTrip(som)
+        self.assertEqual(len(result.getBlocks()), 2)
+        self.assertEqual(list(result[1].axis[0].val), [0.0, 10.0, 20.0])
+        self.assertEqual(list(result[3].axis[0].val), [5.0, 15.0, 25.0])
+
+    def testChangedBlockAxis(self):
+        y = numpy.arange(4, dtype=float).reshape(2, 2)
+        som = SOM.SOM()
+        som.appendBlock(SOM.SOBlock(y, y * 2.0, [0, 1],
+                                    [make_list([0.0, 10.0, 20.0])]))
+        som[1].axis[0].val = make_list([5.0, 15.0, 25.0])
+
+        result = self.roundTrip(som)
+        self.assertEqual(list(result[0].axis[0].val), [0.0, 10.0, 20.0])
+        self.assertEqual(list(result[1].axis[0].val), [5.0, 15.0, 25.0])
+
+    def testStats(self):
+        som = SOM.SOM()
+        self.makeBank(som, [0], make_list([0.0, 10.0, 20.0]))
+        self.failUnless(self.cache.get(self.filename) is None)
+        self.roundTrip(som)
+        stats = self.cache.getStats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["stores"]),
+                         (1, 1, 1))
+
+if __name__ == "__main__":
+    unittest.main()